@@ -0,0 +1,98 @@
+"""
+Admin pieces for tables too big to count.
+
+The stock change list runs SELECT COUNT(*) twice per page view: once for
+the filtered result and once for the whole table ("5 of 3,000,000
+selected"). On PostgreSQL both are full scans. LargeTableAdmin drops the
+second (show_full_result_count = False) and pages with
+EstimatedCountPaginator, which:
+
+  * reads an unfiltered table's size from the planner statistics
+    (pg_class.reltuples, kept fresh by autovacuum), or on SQLite from the
+    largest id (an index lookup; deleted rows make it an overestimate), and
+  * counts a filtered list only up to COUNT_LIMIT rows, so a broad filter
+    costs a bounded scan. Pages beyond the limit need a narrower filter.
+
+Admin search is icontains on every search field, another full scan. Set
+exact_search_field to search one indexed column by equality instead.
+
+    from config.admin import LargeTableAdmin
+
+    @admin.register(Listing)
+    class ListingAdmin(LargeTableAdmin):
+        ...
+"""
+from django.contrib import admin
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# Filtered change lists are counted up to this many rows
+COUNT_LIMIT = 10_000
+
+
+def estimated_rows(model, using: str = "default") -> int | None:
+    """The planner's row estimate for model's table, or None where there isn't one."""
+    connection = connections[using]
+    if connection.vendor == "sqlite":
+        return _max_id(model, connection)
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+            [connection.ops.quote_name(model._meta.db_table)],
+        )
+        row = cursor.fetchone()
+    # -1 (or 0 on older servers) until the table has been analysed
+    return row[0] if row and row[0] > 0 else None
+
+
+def _max_id(model, connection) -> int | None:
+    """MAX(id) for an auto-increment primary key: no statistics on SQLite, but the
+    rowid makes this a single B-tree lookup where COUNT(*) walks the table."""
+    pk = model._meta.pk
+    if pk.get_internal_type() not in ("AutoField", "BigAutoField", "SmallAutoField"):
+        return None
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MAX({qn(pk.column)}) FROM {qn(model._meta.db_table)}")
+        row = cursor.fetchone()
+    return row[0] if row and row[0] else None
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        if not hasattr(qs, "query"):
+            return super().count
+        if not qs.query.has_filters():
+            estimate = estimated_rows(qs.model, qs.db)
+            if estimate is not None and estimate > COUNT_LIMIT:
+                return estimate
+        return qs.order_by()[:COUNT_LIMIT].count()
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+    exact_search_field = None
+
+    def get_search_fields(self, request):
+        if self.exact_search_field:
+            return (f"={self.exact_search_field}",)
+        return super().get_search_fields(request)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not self.exact_search_field:
+            return super().get_search_results(request, queryset, search_term)
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        try:
+            return queryset.filter(**{self.exact_search_field: search_term}), False
+        except (ValueError, ValidationError):
+            return queryset.none(), False
@@ -0,0 +1,260 @@
+"""
+Two-tier cache: a small per-process LRU in front of the shared Django cache.
+
+Every gunicorn worker has its own LRU, so hot keys cost a dict lookup. The
+shared tier (settings.CACHES, file-based by default) lets workers reuse each
+other's work and survives worker restarts. Keys are namespaced, and each
+namespace has its own TTL in settings.TIERED_CACHE["NAMESPACES"].
+
+get_or_set() protects against stampedes. Threads in one worker wait on a
+lock, and workers coordinate through an add()-based lock key in the shared
+tier. Only one caller recomputes an expired value; the rest wait briefly for
+it, and compute it themselves if it never arrives. Callers that can't
+hand over a compute function (a streamed response) take the same lock with
+lock()/unlock() and wait() for a value another caller is computing.
+
+    from config.cache import tiered
+    results = tiered("scrape").get_or_set(("ealing", address), lambda: scrape(address))
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+_MISSING = object()
+
+DEFAULTS = {
+    "BACKEND_ALIAS": "default",
+    "LOCAL_MAX_ENTRIES": 512,
+    "LOCAL_TTL": 30,      # seconds a value may live in a worker before re-reading the shared tier
+    "LOCK_TIMEOUT": 30,   # upper bound on how long one recompute can hold the shared lock
+    "LOCK_WAIT": 10,      # how long other callers wait for that recompute
+    "NAMESPACES": {},
+}
+
+
+def _config() -> dict:
+    return {**DEFAULTS, **getattr(settings, "TIERED_CACHE", {})}
+
+
+class _LRU:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _MISSING
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class Namespace:
+    def __init__(self, name: str, ttl: int, shared: bool = True):
+        conf = _config()
+        self.name = name
+        self.ttl = ttl
+        self.shared = caches[conf["BACKEND_ALIAS"]] if shared else None
+        self.local_ttl = min(ttl, conf["LOCAL_TTL"]) if shared else ttl
+        self.lock_timeout = conf["LOCK_TIMEOUT"]
+        self.lock_wait = conf["LOCK_WAIT"]
+        self._local = _LRU(conf["LOCAL_MAX_ENTRIES"])
+        self._stripes = [threading.Lock() for _ in range(64)]
+        self.counters = {"local_hits": 0, "shared_hits": 0, "misses": 0, "lock_waits": 0}
+
+    def _key(self, key) -> str:
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return f"{self.name}:{digest}"
+
+    def _count(self, counter: str):
+        self.counters[counter] += 1
+
+    def get(self, key, default=None):
+        k = self._key(key)
+        value = self._local.get(k)
+        if value is not _MISSING:
+            self._count("local_hits")
+            return value
+        if self.shared is not None:
+            value = self.shared.get(k, _MISSING)
+            if value is not _MISSING:
+                self._count("shared_hits")
+                self._local.set(k, value, self.local_ttl)
+                return value
+        self._count("misses")
+        return default
+
+    def set(self, key, value, ttl: int | None = None):
+        k = self._key(key)
+        ttl = self.ttl if ttl is None else ttl
+        self._local.set(k, value, min(ttl, self.local_ttl))
+        if self.shared is not None:
+            self.shared.set(k, value, ttl)
+
+    def delete(self, key):
+        k = self._key(key)
+        self._local.delete(k)
+        if self.shared is not None:
+            self.shared.delete(k)
+
+    def _key_lock(self, k: str) -> threading.Lock:
+        # Striped so the lock table stays bounded however many keys we see.
+        return self._stripes[hash(k) % len(self._stripes)]
+
+    def get_or_set(self, key, compute, ttl: int | None = None):
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        k = self._key(key)
+        with self._key_lock(k):
+            # Another thread in this worker may have filled it while we waited.
+            value = self._local.get(k)
+            if value is not _MISSING:
+                return value
+            if self.shared is None:
+                value = compute()
+                self.set(key, value, ttl)
+                return value
+
+            lock_key = self._lock_key(k)
+            locked = self.shared.add(lock_key, 1, self.lock_timeout)
+            if not locked:
+                value = self._wait_for(k)
+                if value is not _MISSING:
+                    self._local.set(k, value, self.local_ttl)
+                    return value
+            try:
+                value = compute()
+                self.set(key, value, ttl)
+            finally:
+                # after a wait timeout the lock is another worker's to release
+                if locked:
+                    self.shared.delete(lock_key)
+            return value
+
+    def _lock_key(self, k: str) -> str:
+        return f"{k}:lock"
+
+    def lock(self, key) -> bool:
+        """Take get_or_set's shared lock for key; False if another caller is computing it."""
+        if self.shared is None:
+            return True
+        return self.shared.add(self._lock_key(self._key(key)), 1, self.lock_timeout)
+
+    def unlock(self, key):
+        """Release a lock taken with lock() (only call this after it returned True)."""
+        if self.shared is not None:
+            self.shared.delete(self._lock_key(self._key(key)))
+
+    def wait(self, key, default=None):
+        """Wait up to lock_wait for another caller to fill key; default if it doesn't."""
+        if self.shared is None:
+            return default
+        k = self._key(key)
+        value = self._wait_for(k)
+        if value is _MISSING:
+            return default
+        self._local.set(k, value, self.local_ttl)
+        return value
+
+    def _wait_for(self, k: str):
+        self._count("lock_waits")
+        deadline = time.monotonic() + self.lock_wait
+        delay = 0.05
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            value = self.shared.get(k, _MISSING)
+            if value is not _MISSING:
+                return value
+            delay = min(delay * 2, 0.5)
+        return _MISSING
+
+    def clear_local(self):
+        self._local.clear()
+
+
+_namespaces = {}
+_namespaces_lock = threading.Lock()
+
+
+def tiered(name: str) -> Namespace:
+    """Return the cache namespace configured under TIERED_CACHE["NAMESPACES"][name]."""
+    ns = _namespaces.get(name)
+    if ns is None:
+        with _namespaces_lock:
+            ns = _namespaces.get(name)
+            if ns is None:
+                conf = _config()["NAMESPACES"].get(name, {})
+                ns = Namespace(name, ttl=conf.get("ttl", 300), shared=conf.get("shared", True))
+                _namespaces[name] = ns
+    return ns
+
+
+@receiver(setting_changed)
+def _reset_namespaces(*, setting, **kwargs):
+    # namespaces hold the backend they were built with; rebuild them against
+    # the new one (override_settings in tests)
+    if setting in ("CACHES", "TIERED_CACHE"):
+        with _namespaces_lock:
+            _namespaces.clear()
+
+
+def _shared():
+    return caches[_config()["BACKEND_ALIAS"]]
+
+
+def data_version(name: str) -> int:
+    """
+    Current version (a nanosecond timestamp) of a named data set, for ETags,
+    Last-Modified and fragment keys. Read from the shared tier so every
+    worker agrees; an evicted version simply starts a new one.
+    """
+    key = f"version:{name}"
+    version = _shared().get(key)
+    if version is None:
+        _shared().add(key, time.time_ns(), None)
+        version = _shared().get(key) or time.time_ns()
+    return version
+
+
+def bump_version(name: str) -> None:
+    """Mark a named data set as changed."""
+    _shared().set(f"version:{name}", time.time_ns(), None)
+
+
+def etag(*parts) -> str:
+    """Opaque ETag built from versions and request parameters."""
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+def stats() -> dict:
+    """Hit/miss counters for every namespace used by this process."""
+    return {name: dict(ns.counters) for name, ns in _namespaces.items()}
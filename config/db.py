@@ -0,0 +1,43 @@
+"""
+Write transactions for SQLite.
+
+SQLite starts a plain BEGIN as a reader and upgrades it to a writer at the
+first write. If another connection has written in the meantime the upgrade
+fails with "database is locked" straight away: busy_timeout can't help,
+because retrying would read a stale snapshot. Transactions that read and
+then write (claiming a queue batch, archiving rows) should therefore take the
+write lock up front with BEGIN IMMEDIATE. Read-only transactions should not,
+as that would queue them behind every writer, so this is opt-in per block
+rather than the connection's transaction_mode:
+
+    from config.db import write_atomic
+
+    with write_atomic():
+        batch = list(InboundEmail.objects.filter(...)[:50])
+        ...
+
+On other databases, and when already inside a transaction, it is
+transaction.atomic().
+"""
+from contextlib import contextmanager
+
+from django.db import transaction
+
+
+@contextmanager
+def write_atomic(using=None):
+    connection = transaction.get_connection(using)
+    if connection.vendor != "sqlite" or connection.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+    connection.ensure_connection()
+    mode = connection.transaction_mode
+    connection.transaction_mode = "IMMEDIATE"
+    try:
+        with transaction.atomic(using=using):
+            # BEGIN has run; nested blocks are savepoints
+            connection.transaction_mode = mode
+            yield
+    finally:
+        connection.transaction_mode = mode
@@ -50,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "pages.profiling.ProfilingMiddleware",
     'django.middleware.security.SecurityMiddleware',
     "whitenoise.middleware.WhiteNoiseMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -92,6 +93,67 @@ DATABASES = {
     )
 }
 
+# SQLite production profile: several gunicorn workers plus the watchlist and
+# ingest commands share one file. busy_timeout waits for the write lock
+# instead of failing with "database is locked"; transactions that read then
+# write take that lock up front with config.db.write_atomic.
+#
+# WAL lets readers run alongside the writer. The journal mode is stored in
+# the database file, so it is switched on only where SQLITE_WAL is set (the
+# deployed database) and not in a checkout's db.sqlite3. synchronous=NORMAL
+# goes with it: durable under WAL (a power cut loses at most the last commits),
+# but able to corrupt the file with a rollback journal.
+SQLITE_WAL = os.environ.get("SQLITE_WAL", "").lower() in ("1", "true", "yes")
+SQLITE_WAL_PRAGMAS = ["PRAGMA journal_mode=WAL", "PRAGMA synchronous=NORMAL"]
+SQLITE_PRAGMAS = [
+    f"PRAGMA busy_timeout={int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}",
+    f"PRAGMA mmap_size={int(os.environ.get('SQLITE_MMAP_BYTES', 256 * 1024 * 1024))}",
+    f"PRAGMA cache_size=-{int(os.environ.get('SQLITE_CACHE_KB', 20000))}",
+    "PRAGMA temp_store=MEMORY",
+]
+if SQLITE_WAL:
+    SQLITE_PRAGMAS[:0] = SQLITE_WAL_PRAGMAS
+
+if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+    # ssl_require adds sslmode, which sqlite3.connect() rejects.
+    DATABASES["default"]["OPTIONS"].pop("sslmode", None)
+    DATABASES["default"]["OPTIONS"].update(
+        {
+            "init_command": "; ".join(SQLITE_PRAGMAS),
+            "timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)) / 1000,
+        }
+    )
+
+
+# Caches
+# A file-based shared tier needs no external service and is shared by every
+# gunicorn worker on the instance; config.cache layers a per-process LRU on top.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get("CACHE_DIR", str(BASE_DIR / ".cache")),
+        "TIMEOUT": 300,
+        "OPTIONS": {"MAX_ENTRIES": 20000},
+    }
+}
+
+# the test suite swaps this for a LocMemCache (config/test_runner.py)
+TEST_RUNNER = "config.test_runner.TestRunner"
+
+TIERED_CACHE = {
+    "LOCAL_MAX_ENTRIES": 512,
+    "LOCAL_TTL": 30,
+    "NAMESPACES": {
+        # council search results, keyed by (borough, normalised query)
+        "scrape": {"ttl": int(os.environ.get("SCRAPE_CACHE_TTL", 900))},
+        # postcode -> borough is pure, so per-process only
+        "borough": {"ttl": 86400, "shared": False},
+        # rendered results tables; keys embed the data version
+        "fragments": {"ttl": 600},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -166,6 +228,58 @@ DEFAULT_FROM_EMAIL = os.environ.get(
     "admin@astorholdings.com.au",
 )
 
+# Opt-in request/command profiling (see pages/profiling.py). Off by default;
+# when off the middleware removes itself at startup.
+PROFILING = {
+    "ENABLED": os.environ.get("PROFILING_ENABLED", "False") == "True",
+    "SAMPLE_RATE": float(os.environ.get("PROFILING_SAMPLE_RATE", 0)),
+    "TOKEN": os.environ.get("PROFILING_TOKEN", ""),
+    "DIR": os.environ.get("PROFILING_DIR", str(BASE_DIR / ".profiles")),
+    "KEEP": int(os.environ.get("PROFILING_KEEP", 200)),
+    "MIN_DURATION_MS": int(os.environ.get("PROFILING_MIN_DURATION_MS", 250)),
+}
+
+# Shared secret sent by the inbound-email provider (X-Inbound-Secret)
+INBOUND_EMAIL_SECRET = os.environ.get("INBOUND_EMAIL_SECRET", "")
+
+# Keep every fetched council results page (compressed, deduplicated) so
+# parsers can be re-run offline with reparse_archive
+PLANNING_ARCHIVE_PAGES = os.environ.get("PLANNING_ARCHIVE_PAGES", "False") == "True"
+
+# Each watch learns its own polling interval within these bounds: halved
+# when a check finds new applications, stretched after quiet checks
+# (see planning/polling.py). The watchlist command only checks due watches.
+PLANNING_POLL_MIN_HOURS = float(os.environ.get("PLANNING_POLL_MIN_HOURS", 6))
+PLANNING_POLL_MAX_HOURS = float(os.environ.get("PLANNING_POLL_MAX_HOURS", 24 * 14))
+PLANNING_POLL_BACKOFF = float(os.environ.get("PLANNING_POLL_BACKOFF", 1.5))
+
+# Planning boroughs
+# Each entry drives postcode detection, labels and which scraper runs.
+# "scraper" is a dotted path, imported lazily on first search; leave it out
+# to use a "planning_checker.scrapers" entry point with the same name.
+# "scraper_options" are passed to it as keyword arguments, so Idox councils
+# need only a base_url for planning.scrapers.idox.
+# An outward code listed under several boroughs is searched in all of them
+# at once (see registry.scrape_many).
+# "manual_url" marks councils that block automated access.
+
+PLANNING_BOROUGHS = {
+    "ealing": {
+        "label": "London Borough of Ealing",
+        "outward_codes": ["UB1", "UB2", "UB5", "UB6", "W3", "W5", "W7", "W13"],
+        "scraper": "planning.scrapers.idox",
+        "scraper_options": {"base_url": "https://pam.ealing.gov.uk", "first_page": "get"},
+        "alerts": True,
+    },
+    "croydon": {
+        "label": "London Borough of Croydon",
+        "outward_codes": ["CR0", "CR2", "CR4", "CR7", "CR8"],
+        "scraper": "planning.scrapers.idox",
+        "scraper_options": {"base_url": "https://publicaccess3.croydon.gov.uk", "first_page": "post", "warmup": True},
+        "manual_url": "https://publicaccess3.croydon.gov.uk/online-applications/",
+    },
+}
+
 # Login settings
 
 LOGIN_URL = "/admin/login/"
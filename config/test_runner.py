@@ -0,0 +1,22 @@
+"""
+Test runner that keeps the suite out of the file cache.
+
+CACHES points at BASE_DIR/.cache, shared with runserver and the management
+commands. Tests run against a LocMemCache instead, so they neither write
+version and scrape keys into it nor read stale ones back.
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+TEST_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests"}}
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._caches = override_settings(CACHES=TEST_CACHES)
+        self._caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,24 @@
 from django.contrib import admin
+from django.utils.html import format_html
 
-# Register your models here.
+from .models import ProfileCapture
+
+
+@admin.register(ProfileCapture)
+class ProfileCaptureAdmin(admin.ModelAdmin):
+    list_display = ("label", "kind", "duration_ms", "status_code", "created_at")
+    list_filter = ("kind", "status_code")
+    search_fields = ("label",)
+    ordering = ("-duration_ms",)
+    readonly_fields = ("kind", "label", "status_code", "duration_ms", "file", "created_at", "summary_text")
+    exclude = ("summary",)
+
+    @admin.display(description="Top functions (cumulative)")
+    def summary_text(self, obj):
+        return format_html("<pre style='white-space: pre; overflow-x: auto'>{}</pre>", obj.summary)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -1,3 +1,23 @@
 from django.db import models
 
-# Create your models here.
+
+class ProfileCapture(models.Model):
+    """A cProfile dump written by pages.profiling (the file lives in PROFILING["DIR"])."""
+
+    class Kind(models.TextChoices):
+        REQUEST = "request", "Request"
+        COMMAND = "command", "Command"
+
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    label = models.CharField(max_length=255)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    duration_ms = models.FloatField()
+    file = models.CharField(max_length=255, unique=True)
+    summary = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["-duration_ms"], name="profilecapture_slowest_idx")]
+
+    def __str__(self):
+        return f"{self.label} ({self.duration_ms:.0f} ms)"
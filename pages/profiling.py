@@ -0,0 +1,163 @@
+"""
+Opt-in cProfile captures for slow requests and management commands.
+
+With settings.PROFILING["ENABLED"] off the middleware removes itself at
+startup (MiddlewareNotUsed), so normal requests pay nothing. When on, it
+profiles a random SAMPLE_RATE of requests, plus any request that sends the
+configured token in the X-Profile header:
+
+    curl -H "X-Profile: $PROFILING_TOKEN" https://.../planning/?q=...
+
+Each capture is written as a gzipped marshal of the pstats data to
+PROFILING["DIR"], recorded as a ProfileCapture row (listed slowest-first in
+the admin), and the oldest files beyond PROFILING["KEEP"] are rotated away.
+
+Commands use the same machinery through capture():
+
+    with capture("check_planning_watchlist"):
+        ...
+
+To dig into a dump: pstats.Stats(load(path)).sort_stats("cumulative").print_stats(30)
+"""
+import cProfile
+import gzip
+import io
+import logging
+import marshal
+import pstats
+import random
+import re
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": False,
+    "SAMPLE_RATE": 0.0,      # fraction of requests profiled at random
+    "HEADER": "X-Profile",   # request header that asks for a capture...
+    "TOKEN": "",             # ...when it carries this value (empty disables the header)
+    "DIR": "",
+    "KEEP": 200,             # dump files kept on disk
+    "MIN_DURATION_MS": 0,    # sampled captures faster than this are discarded
+    "SUMMARY_LINES": 30,
+}
+
+
+def _config() -> dict:
+    return {**DEFAULTS, **getattr(settings, "PROFILING", {})}
+
+
+def _summary(profiler: cProfile.Profile, lines: int) -> str:
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(lines)
+    return out.getvalue()
+
+
+def _rotate(directory: Path, keep: int):
+    from .models import ProfileCapture
+
+    dumps = sorted(directory.glob("*.prof.gz"))
+    stale = dumps[: max(0, len(dumps) - keep)]
+    for path in stale:
+        path.unlink(missing_ok=True)
+    if stale:
+        ProfileCapture.objects.filter(file__in=[p.name for p in stale]).delete()
+
+
+def save(profiler: cProfile.Profile, *, kind: str, label: str, duration_ms: float, status_code=None):
+    """Write a finished profile to disk and record it; never raises."""
+    from .models import ProfileCapture
+
+    conf = _config()
+    try:
+        directory = Path(conf["DIR"] or Path(settings.BASE_DIR) / ".profiles")
+        directory.mkdir(parents=True, exist_ok=True)
+        profiler.create_stats()
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", label).strip("-")[:60]
+        name = f"{timezone.now():%Y%m%dT%H%M%S%f}-{kind}-{slug}.prof.gz"
+        with gzip.open(directory / name, "wb") as fh:
+            fh.write(marshal.dumps(profiler.stats))
+
+        ProfileCapture.objects.create(
+            kind=kind,
+            label=label[:255],
+            status_code=status_code,
+            duration_ms=round(duration_ms, 1),
+            file=name,
+            summary=_summary(profiler, conf["SUMMARY_LINES"]),
+        )
+        _rotate(directory, conf["KEEP"])
+    except Exception:
+        logger.exception("Could not save profile for %s", label)
+
+
+class _Dump:
+    """What pstats.Stats() needs to read a dump written by save()."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def load(path) -> _Dump:
+    with gzip.open(path, "rb") as fh:
+        return _Dump(marshal.loads(fh.read()))
+
+
+@contextmanager
+def capture(label: str, kind: str = "command"):
+    """Profile the enclosed block and save it, whatever PROFILING["ENABLED"] says."""
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        save(profiler, kind=kind, label=label, duration_ms=(time.perf_counter() - started) * 1000)
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        conf = _config()
+        if not conf["ENABLED"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = conf["SAMPLE_RATE"]
+        self.header = conf["HEADER"]
+        self.token = conf["TOKEN"]
+        self.min_duration_ms = conf["MIN_DURATION_MS"]
+
+    def __call__(self, request):
+        requested = bool(self.token) and constant_time_compare(request.headers.get(self.header, ""), self.token)
+        if not requested and (not self.sample_rate or random.random() >= self.sample_rate):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        # explicit requests are always kept; samples only when slow enough to matter
+        if requested or duration_ms >= self.min_duration_ms:
+            save(
+                profiler,
+                kind="request",
+                label=f"{request.method} {request.get_full_path()}",
+                duration_ms=duration_ms,
+                status_code=response.status_code,
+            )
+        return response
@@ -1,8 +1,153 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib import admin
-from .models import PlanningWatch
+from django.db.models import Avg, Count, Max, Sum
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+
+from config.admin import LargeTableAdmin
+
+from .models import CheckRun, CheckRunItem, FetchedPage, PlanningWatch
+
+# Days of run history summarised above the CheckRun change list
+TREND_DAYS = 30
+
+
+class BoroughFilter(admin.SimpleListFilter):
+    """Boroughs from settings, instead of a SELECT DISTINCT over the whole table."""
+
+    title = "borough"
+    parameter_name = "borough_code"
+
+    def lookups(self, request, model_admin):
+        return [(code, b.get("label", code)) for code, b in settings.PLANNING_BOROUGHS.items()]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(borough_code=self.value())
+        return queryset
+
+
+class FetchStatusFilter(admin.SimpleListFilter):
+    title = "status"
+    parameter_name = "failed"
+
+    def lookups(self, request, model_admin):
+        return [("0", "200 OK"), ("1", "Failed")]
+
+    def queryset(self, request, queryset):
+        if self.value() == "0":
+            return queryset.filter(status_code=200)
+        if self.value() == "1":
+            return queryset.exclude(status_code=200)
+        return queryset
+
 
 @admin.register(PlanningWatch)
-class PlanningWatchAdmin(admin.ModelAdmin):
-    list_display = ("email", "query", "borough_code", "active", "created_at")
-    list_filter = ("borough_code", "active", "created_at")
+class PlanningWatchAdmin(LargeTableAdmin):
+    list_display = (
+        "email", "query", "borough_code", "active",
+        "poll_interval_hours", "next_check_at", "last_changed_at", "created_at",
+    )
+    list_filter = (BoroughFilter, "active", "created_at")
     search_fields = ("email", "query")
+    ordering = ("-created_at",)
+    actions = ["check_now"]
+
+    @admin.action(description="Check now (at the next watchlist run)")
+    def check_now(self, request, queryset):
+        updated = queryset.update(next_check_at=timezone.now())
+        self.message_user(
+            request,
+            f"{updated} watch(es) will be checked on the next run. "
+            "To check straight away: manage.py check_planning_watchlist --watch <id>",
+        )
+
+
+class CheckRunItemInline(admin.TabularInline):
+    model = CheckRunItem
+    fields = ("query", "borough_code", "duration_ms", "pages_fetched", "bytes_downloaded", "results", "new_items", "retries", "error")
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    ordering = ("-duration_ms",)
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(CheckRun)
+class CheckRunAdmin(admin.ModelAdmin):
+    list_display = (
+        "started_at", "duration_ms", "watches_checked", "pages_fetched",
+        "bytes_downloaded", "new_items", "emails_sent", "errors", "retries",
+    )
+    list_filter = ("started_at",)
+    date_hierarchy = "started_at"
+    readonly_fields = [f.name for f in CheckRun._meta.fields]
+    inlines = [CheckRunItemInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        since = timezone.now() - timedelta(days=TREND_DAYS)
+        trend = list(
+            CheckRun.objects.filter(started_at__gte=since)
+            .annotate(day=TruncDay("started_at"))
+            .values("day")
+            .annotate(
+                runs=Count("id"),
+                avg_duration_ms=Avg("duration_ms"),
+                max_duration_ms=Max("duration_ms"),
+                watches=Max("watches_checked"),
+                pages=Sum("pages_fetched"),
+                bytes=Sum("bytes_downloaded"),
+                new_items=Sum("new_items"),
+                errors=Sum("errors"),
+                retries=Sum("retries"),
+            )
+            .order_by("-day")
+        )
+        peak = max((row["avg_duration_ms"] or 0 for row in trend), default=0) or 1
+        for row in trend:
+            row["bar_pct"] = round(100 * (row["avg_duration_ms"] or 0) / peak)
+
+        slowest = (
+            CheckRunItem.objects.filter(run__started_at__gte=since)
+            .values("query", "borough_code")
+            .annotate(avg_duration_ms=Avg("duration_ms"), avg_pages=Avg("pages_fetched"), checks=Count("id"))
+            .order_by("-avg_duration_ms")[:10]
+        )
+        extra_context = {**(extra_context or {}), "trend": trend, "slowest_watches": slowest, "trend_days": TREND_DAYS}
+        return super().changelist_view(request, extra_context=extra_context)
+
+
+@admin.register(CheckRunItem)
+class CheckRunItemAdmin(LargeTableAdmin):
+    list_display = ("query", "borough_code", "run", "duration_ms", "pages_fetched", "bytes_downloaded", "new_items", "retries", "error")
+    list_filter = (BoroughFilter, "run__started_at")
+    search_fields = ("query",)
+    list_select_related = ("run",)
+    raw_id_fields = ("run", "watch")
+    readonly_fields = [f.name for f in CheckRunItem._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(FetchedPage)
+class FetchedPageAdmin(LargeTableAdmin):
+    # blob_id, not blob: the FK would join in every page body
+    list_display = ("url", "borough_code", "query", "page", "status_code", "fetched_at", "blob_id")
+    # a date range filter on the indexed fetched_at; date_hierarchy would
+    # SELECT DISTINCT dates across the whole archive
+    list_filter = (BoroughFilter, FetchStatusFilter, "fetched_at")
+    exact_search_field = "url"
+    search_help_text = "Exact page URL."
+    ordering = ("-fetched_at",)
+    raw_id_fields = ("blob",)
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,81 @@
+"""
+Content-addressed archive of raw council results pages.
+
+With settings.PLANNING_ARCHIVE_PAGES on, scrapers that take an archive list
+(planning.scrapers.idox does) hand back every page they fetch, and store()
+saves it: the body once per distinct sha256 in PageBlob, zlib-compressed,
+and a FetchedPage row per fetch indexed by URL, query and time. Unchanged
+pages - most of them, between two watchlist runs - cost one small row.
+
+reparse_archive re-reads the stored pages with the current parsers, so a
+parser fix or a new field can be backfilled without touching the network.
+Its --prune-days drops fetches older than that with prune(), and the bodies
+no remaining fetch points at.
+"""
+import hashlib
+import logging
+import uuid
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import FetchedPage, PageBlob
+
+logger = logging.getLogger(__name__)
+
+COMPRESS_LEVEL = 6
+
+
+def enabled() -> bool:
+    return getattr(settings, "PLANNING_ARCHIVE_PAGES", False)
+
+
+def store(pages, *, borough_code: str, query: str) -> int:
+    """Archive one scrape's pages (dicts from the scraper); returns rows written. Never raises."""
+    if not pages:
+        return 0
+    try:
+        digests = [hashlib.sha256(p["body"]).hexdigest() for p in pages]
+        known = set(PageBlob.objects.filter(digest__in=set(digests)).values_list("digest", flat=True))
+
+        blobs = {}
+        for page, digest in zip(pages, digests):
+            if digest not in known and digest not in blobs:
+                blobs[digest] = PageBlob(
+                    digest=digest,
+                    data=zlib.compress(page["body"], COMPRESS_LEVEL),
+                    size=len(page["body"]),
+                )
+        PageBlob.objects.bulk_create(blobs.values(), ignore_conflicts=True)
+
+        fetch_id = uuid.uuid4().hex
+        FetchedPage.objects.bulk_create(
+            FetchedPage(
+                fetch_id=fetch_id,
+                borough_code=borough_code,
+                query=query[:255],
+                url=page["url"][:2000],
+                page=page["page"],
+                status_code=page["status_code"],
+                blob_id=digest,
+                fetched_at=page["fetched_at"],
+            )
+            for page, digest in zip(pages, digests)
+        )
+        return len(pages)
+    except Exception:
+        logger.exception("Could not archive %d page(s) for %s", len(pages), query)
+        return 0
+
+
+def prune(days: int) -> tuple[int, int]:
+    """Delete fetches older than days and the blobs left unreferenced; returns (pages, blobs) deleted."""
+    pages, _ = FetchedPage.objects.filter(fetched_at__lt=timezone.now() - timedelta(days=days)).delete()
+    blobs, _ = PageBlob.objects.filter(fetches__isnull=True).only("digest").delete()
+    return pages, blobs
+
+
+def body(blob: PageBlob) -> str:
+    return zlib.decompress(bytes(blob.data)).decode("utf-8", errors="replace")
@@ -1,11 +1,5 @@
 from django import forms
 
-BOROUGH_CHOICES = [
-    ("ealing", "Ealing"),
-    ("croydon", "Croydon"),
-    # add more later
-]
-
 
 class AddressSearchForm(forms.Form):
     address = forms.CharField(
@@ -0,0 +1,165 @@
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Connection setups to compare. "default" is what Django does with no OPTIONS
+# (rollback journal, deferred transactions, 5s timeout); "production" is the
+# profile from settings.SQLITE_PRAGMAS with WAL, and writes in IMMEDIATE
+# transactions as config.db.write_atomic does.
+PROFILES = {
+    "default": {"pragmas": [], "begin": "DEFERRED", "timeout": 5.0},
+    "production": {
+        "pragmas": settings.SQLITE_WAL_PRAGMAS + [p for p in settings.SQLITE_PRAGMAS if p not in settings.SQLITE_WAL_PRAGMAS],
+        "begin": "IMMEDIATE",
+        "timeout": 5.0,
+    },
+}
+
+SCHEMA = """
+CREATE TABLE watch (id INTEGER PRIMARY KEY, query TEXT, last_seen_urls TEXT, last_checked_at REAL);
+CREATE TABLE listing (id INTEGER PRIMARY KEY, portal TEXT, price INTEGER, title TEXT, first_seen REAL);
+CREATE INDEX listing_first_seen ON listing (first_seen DESC, id DESC);
+"""
+
+
+def _seed(path: str, watches: int, listings: int):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany(
+        "INSERT INTO watch (query, last_seen_urls, last_checked_at) VALUES (?, '[]', 0)",
+        [(f"W5 {i}AA",) for i in range(watches)],
+    )
+    conn.executemany(
+        "INSERT INTO listing (portal, price, title, first_seen) VALUES (?, ?, ?, ?)",
+        [("rightmove", 200_000 + i, f"Flat {i}", time.time() - i) for i in range(listings)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _worker(path, profile, role, seconds, watches, results):
+    """One process hammering the file as a reader (inbox page) or a writer (watch check)."""
+    conn = sqlite3.connect(path, timeout=profile["timeout"], isolation_level=None)
+    for pragma in profile["pragmas"]:
+        conn.execute(pragma)
+
+    rng = random.Random(os.getpid())
+    latencies = []
+    ops = locked = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            if role == "write":
+                # check_planning_watchlist: read a watch, then store the URLs it saw
+                watch_id = rng.randint(1, watches)
+                conn.execute(f"BEGIN {profile['begin']}")
+                row = conn.execute("SELECT last_seen_urls FROM watch WHERE id = ?", (watch_id,)).fetchone()
+                seen = json.loads(row[0])[-50:] + [f"https://example.org/app/{rng.random()}"]
+                conn.execute(
+                    "UPDATE watch SET last_seen_urls = ?, last_checked_at = ? WHERE id = ?",
+                    (json.dumps(seen), time.time(), watch_id),
+                )
+                conn.execute("COMMIT")
+            else:
+                conn.execute(
+                    "SELECT id, price, title FROM listing WHERE portal = ? ORDER BY first_seen DESC, id DESC LIMIT 200",
+                    ("rightmove",),
+                ).fetchall()
+                conn.execute("SELECT count(*) FROM watch WHERE last_checked_at > ?", (time.time() - 60,)).fetchone()
+        except sqlite3.OperationalError:
+            locked += 1
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            continue
+        latencies.append(time.perf_counter() - started)
+        ops += 1
+    conn.close()
+    results.put({"role": role, "ops": ops, "locked": locked, "latencies": latencies})
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = "Runs concurrent SQLite readers and writers against a scratch file and compares connection profiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--writers", type=int, default=2)
+        parser.add_argument("--seconds", type=float, default=5.0, help="Duration of each profile's run.")
+        parser.add_argument("--profile", choices=[*PROFILES, "both"], default="both")
+        parser.add_argument("--watches", type=int, default=500)
+        parser.add_argument("--listings", type=int, default=20_000)
+        parser.add_argument("--json", dest="json_path", default="", help="Also write results to this file.")
+
+    def _run(self, name, options):
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Queue()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.sqlite3")
+            _seed(path, options["watches"], options["listings"])
+
+            roles = ["read"] * options["readers"] + ["write"] * options["writers"]
+            procs = [
+                ctx.Process(
+                    target=_worker,
+                    args=(path, PROFILES[name], role, options["seconds"], options["watches"], results),
+                )
+                for role in roles
+            ]
+            for proc in procs:
+                proc.start()
+            reports = [results.get() for _ in procs]
+            for proc in procs:
+                proc.join()
+
+        summary = {}
+        for role in ("read", "write"):
+            mine = [r for r in reports if r["role"] == role]
+            latencies = [lat for r in mine for lat in r["latencies"]]
+            ops = sum(r["ops"] for r in mine)
+            summary[role] = {
+                "processes": len(mine),
+                "ops": ops,
+                "ops_per_second": round(ops / options["seconds"], 1),
+                "locked_errors": sum(r["locked"] for r in mine),
+                "p50_ms": round(statistics.median(latencies) * 1000, 2) if latencies else None,
+                "p99_ms": round(_percentile(latencies, 99) * 1000, 2) if latencies else None,
+            }
+        return summary
+
+    def handle(self, *args, **options):
+        if options["readers"] + options["writers"] < 1:
+            raise CommandError("Need at least one reader or writer.")
+
+        names = list(PROFILES) if options["profile"] == "both" else [options["profile"]]
+        result = {}
+        for name in names:
+            result[name] = summary = self._run(name, options)
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{name} profile"))
+            for role, stats in summary.items():
+                if not stats["processes"]:
+                    continue
+                line = (
+                    f"  {role:<5} {stats['ops_per_second']:>9.1f} ops/s  "
+                    f"p50 {stats['p50_ms']} ms  p99 {stats['p99_ms']} ms  "
+                    f"locked {stats['locked_errors']}"
+                )
+                self.stdout.write(self.style.WARNING(line) if stats["locked_errors"] else line)
+
+        if options["json_path"]:
+            with open(options["json_path"], "w") as fh:
+                json.dump(result, fh, indent=2)
@@ -0,0 +1,94 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# What a gunicorn worker does before serving: build the WSGI app and load the URLconf
+# (which imports every view module).
+BOOT_SNIPPET = "import config.wsgi, config.urls; from django.urls import get_resolver; get_resolver().url_patterns"
+
+# Imports that should only happen when a borough is first searched.
+LAZY_MODULES = ("requests", "bs4", "planning.scrapers.idox")
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Module -> (self_us, cumulative_us) from `python -X importtime` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+class Command(BaseCommand):
+    help = "Measures worker boot time with `python -X importtime` and reports the slowest imports."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5, help="Boots to time (the median is reported).")
+        parser.add_argument("--top", type=int, default=15, help="Slowest imports (by self time) to list.")
+        parser.add_argument("--command", default="", help="Time `manage.py <command> --help` instead of a web worker boot.")
+        parser.add_argument("--json", dest="json_path", default="", help="Also write results to this file.")
+
+    def _boot(self, snippet: str) -> tuple[float, str]:
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "config.settings")}
+        started = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", snippet],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        elapsed = time.perf_counter() - started
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+        return elapsed, proc.stderr
+
+    def handle(self, *args, **options):
+        snippet = BOOT_SNIPPET
+        if options["command"]:
+            snippet = (
+                "import sys, django; django.setup(); "
+                f"sys.argv = ['manage.py', {options['command']!r}, '--help']; "
+                "from django.core.management import execute_from_command_line; "
+                "\ntry:\n    execute_from_command_line(sys.argv)\nexcept SystemExit:\n    pass"
+            )
+
+        timings = []
+        stderr = ""
+        for _ in range(options["repeat"]):
+            elapsed, stderr = self._boot(snippet)
+            timings.append(elapsed)
+
+        modules = parse_importtime(stderr)
+        slowest = sorted(modules.items(), key=lambda kv: kv[1][0], reverse=True)[: options["top"]]
+        eager = [m for m in LAZY_MODULES if m in modules]
+
+        result = {
+            "boot_seconds_median": round(statistics.median(timings), 4),
+            "boot_seconds_min": round(min(timings), 4),
+            "import_seconds": round(sum(self_us for self_us, _ in modules.values()) / 1e6, 4),
+            "modules_imported": len(modules),
+            "eagerly_imported_scrapers": eager,
+            "slowest_imports_ms": {name: round(self_us / 1000, 1) for name, (self_us, _) in slowest},
+        }
+
+        self.stdout.write(f"Boot: median {result['boot_seconds_median']}s, min {result['boot_seconds_min']}s")
+        self.stdout.write(f"Imports: {result['modules_imported']} modules, {result['import_seconds']}s")
+        for name, ms in result["slowest_imports_ms"].items():
+            self.stdout.write(f"  {ms:>8.1f} ms  {name}")
+        if eager:
+            self.stdout.write(self.style.WARNING(f"Scraper modules imported at boot: {', '.join(eager)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("No scraper modules imported at boot."))
+
+        if options["json_path"]:
+            with open(options["json_path"], "w") as fh:
+                json.dump(result, fh, indent=2)
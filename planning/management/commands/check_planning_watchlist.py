@@ -1,10 +1,20 @@
+import logging
+import time
+
 from django.core.management.base import BaseCommand
 from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
 
-from planning.models import PlanningWatch
-from planning.scrapers import ealing  # Croydon blocked, so we only monitor Ealing safely
+from pages.profiling import capture
+from planning import archive, pipeline, polling, subsumption
+from planning.models import CheckRun, CheckRunItem, PlanningWatch
+from planning.scrapers import registry
+
+logger = logging.getLogger(__name__)
+
+# A page fetch that raises is retried this many times in total, with 2s, 4s... between tries.
+SCRAPE_ATTEMPTS = 3
 
 
 class Command(BaseCommand):
@@ -16,84 +26,266 @@ class Command(BaseCommand):
             action="store_true",
             help="If last_seen is empty, still email results (default is NO email on first run).",
         )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Check every active watch, not only those whose polling interval is up.",
+        )
+        parser.add_argument(
+            "--watch",
+            type=int,
+            action="append",
+            default=[],
+            help="Check this watch id now, whatever its schedule (repeatable).",
+        )
+        parser.add_argument(
+            "--fetchers", type=int, default=8, help="Concurrent council requests (fetch threads)."
+        )
+        parser.add_argument(
+            "--parsers",
+            type=int,
+            default=None,
+            help="Processes parsing result pages (default: one per core; 0 parses in this process).",
+        )
+        parser.add_argument(
+            "--profile",
+            action="store_true",
+            help="Profile the run and save it with the request captures (admin > Profile captures).",
+        )
 
     def handle(self, *args, **options):
+        if options["profile"]:
+            with capture("check_planning_watchlist"):
+                self._check(options)
+        else:
+            self._check(options)
+
+    def _check(self, options):
         force_email_first_run = options["force_email_first_run"]
 
         qs = PlanningWatch.objects.filter(active=True).order_by("created_at")
-        self.stdout.write(f"Checking {qs.count()} active watch(es)...")
+        if options["watch"]:
+            qs = qs.filter(id__in=options["watch"])
+        elif not options["all"]:
+            qs = polling.due(qs)
+        self.stdout.write(f"Checking {qs.count()} due watch(es)...")
+
+        run = CheckRun(started_at=timezone.now())
+        items = []
+        checked = []  # watches whose schedule moves on, saved with the run
+        started = time.perf_counter()
+        try:
+            supported = []
+            for watch in qs:
+                # Only boroughs flagged for alerts are monitored (e.g. Croydon blocks scraping)
+                borough = registry.get_borough(watch.borough_code)
+                if not borough or not borough.get("alerts"):
+                    self.stdout.write(f"Skip {watch.id} ({watch.borough_code}) - not supported for monitoring.")
+                    continue
+                supported.append(watch)
+
+            # Watches sharing a postcode unit are answered from one postcode search
+            batches = subsumption.plan(supported)
+            while batches:
+                batches = self._run_batches(batches, options, run, items, checked, force_email_first_run)
+        finally:
+            # One write for the whole run, even if it was interrupted
+            run.finished_at = timezone.now()
+            run.duration_ms = round((time.perf_counter() - started) * 1000, 1)
+            run.watches_checked = len(items)
+            run.pages_fetched = sum(i.pages_fetched for i in items)
+            run.bytes_downloaded = sum(i.bytes_downloaded for i in items)
+            run.new_items = sum(i.new_items for i in items)
+            run.errors = sum(1 for i in items if i.error)
+            run.retries = sum(i.retries for i in items)
+            run.save()
+            for item in items:
+                item.run = run
+            CheckRunItem.objects.bulk_create(items)
+            PlanningWatch.objects.bulk_update(checked, polling.SCHEDULE_FIELDS)
+
+        self.stdout.write(
+            f"\nChecked {run.watches_checked} watch(es) in {run.duration_ms / 1000:.1f}s: "
+            f"{run.pages_fetched} page(s), {run.bytes_downloaded} bytes, "
+            f"{run.new_items} new, {run.errors} error(s), {run.retries} retr(ies)."
+        )
 
-        for watch in qs:
-            if watch.borough_code != "ealing":
-                self.stdout.write(f"Skip {watch.id} ({watch.borough_code}) - not supported for monitoring.")
+    def _run_batches(self, batches, options, run, items, checked, force_email_first_run) -> list:
+        """
+        Search for each batch and check its watches. Returns the batches to
+        run again: postcode searches that hit the page cap, split back into
+        one search per watch.
+        """
+        searches = [
+            (watches[0].borough_code, scrape_query or watches[0].query.strip())
+            for scrape_query, watches in batches
+        ]
+        batch_items = []
+        for _, watches in batches:
+            group_items = [
+                CheckRunItem(watch=watch, query=watch.query.strip()[:255], borough_code=watch.borough_code)
+                for watch in watches
+            ]
+            batch_items.append(group_items)
+
+        retry = []
+        # Searches are fetched and parsed concurrently and handled here as each finishes
+        jobs = pipeline.run(
+            searches,
+            fetchers=options["fetchers"],
+            parsers=options["parsers"],
+            attempts=SCRAPE_ATTEMPTS,
+            archive=archive.enabled(),
+        )
+        for job in jobs:
+            watches, group_items = batches[job.index][1], batch_items[job.index]
+            if job.archive:
+                archive.store(job.archive, borough_code=job.borough_code, query=job.query)
+            if job.truncated and len(watches) > 1:
+                # The postcode's results were cut short, so a watch's own
+                # applications may be missing; search for each watch instead.
+                logger.warning(
+                    "Postcode search %s (%s) stopped at the page cap; searching its %d watches separately.",
+                    job.query, job.borough_code, len(watches),
+                )
+                self.stdout.write(
+                    self.style.WARNING(f"\nPostcode {job.query}: too many pages; searching each watch instead")
+                )
+                retry.extend((None, [watch]) for watch in watches)
                 continue
+            items.extend(group_items)
 
-            query = watch.query.strip()
-            self.stdout.write(f"\nWatch #{watch.id}: {query}")
+            # the lead item carries the search's pages, bytes and time
+            lead = group_items[0]
+            lead.pages_fetched = job.stats.get("pages", 0)
+            lead.bytes_downloaded = job.stats.get("bytes", 0)
+            lead.retries = job.stats.get("retries", 0)
+            lead.duration_ms = job.duration_ms
 
-            # 1) Scrape current results
-            results = ealing.scrape(query)
+            if len(watches) > 1:
+                self.stdout.write(f"\nPostcode {job.query}: one search for {len(watches)} watch(es)")
+            if job.error is not None:
+                logger.error("Search %s (%s) failed: %r", job.query, job.borough_code, job.error)
+                self.stdout.write(self.style.ERROR(f"\n{job.query}: failed: {job.error!r}"))
+                for watch, item in zip(watches, group_items):
+                    item.error = repr(job.error)
+                    polling.reschedule(watch, failed=True)
+                    checked.append(watch)
+                continue
 
-            # Use URL as stable unique ID for now
-            seen_now = [r.get("url") for r in results if r.get("url")]
-            seen_now_set = set(seen_now)
+            for watch, item in zip(watches, group_items):
+                item_started = time.perf_counter()
+                try:
+                    if self._check_watch(watch, item, force_email_first_run, job.query, job.results):
+                        run.emails_sent += 1
+                except Exception as exc:
+                    logger.exception("Watch #%s failed", watch.id)
+                    item.error = repr(exc)
+                    self.stdout.write(self.style.ERROR(f"Failed: {exc!r}"))
+                item.duration_ms += round((time.perf_counter() - item_started) * 1000, 1)
+                # Learn the watch's next check from what this one found
+                polling.reschedule(watch, changed=item.new_items > 0, failed=bool(item.error))
+                checked.append(watch)
+        return retry
 
-            seen_before = watch.last_seen_urls or []
-            seen_before_set = set(seen_before)
+    def _check_watch(self, watch, run_item, force_email_first_run, scrape_query, results) -> bool:
+        """
+        Check one watch against the results of scrape_query, filling in
+        run_item; True if an email went out. scrape_query is the watch's own
+        query or a postcode search that covers it.
+        """
+        query = watch.query.strip()
+        self.stdout.write(f"\nWatch #{watch.id}: {query}")
 
-            new_urls = list(seen_now_set - seen_before_set)
+        # 1) Current results (ours picked out of a postcode search)
+        if scrape_query != query:
+            results = [r for r in results if subsumption.covers(query, r.get("address", ""))]
+        run_item.results = len(results)
 
-            # Update last checked
-            watch.last_checked_at = timezone.now()
+        # Use URL as stable unique ID for now
+        seen_now = [r.get("url") for r in results if r.get("url")]
+        seen_now_set = set(seen_now)
 
-            # First run behaviour:
-            # If we have no history yet, we store what exists and DO NOT email
-            # (unless --force-email-first-run was provided)
-            if not seen_before and not force_email_first_run:
-                watch.last_seen_urls = list(seen_now_set)
-                watch.save(update_fields=["last_seen_urls", "last_checked_at"])
-                self.stdout.write("First run: stored baseline (no email sent).")
-                continue
+        seen_before = watch.last_seen_urls or []
+        seen_before_set = set(seen_before)
 
-            if not new_urls:
-                watch.last_seen_urls = list(seen_now_set)
-                watch.save(update_fields=["last_seen_urls", "last_checked_at"])
-                self.stdout.write("No new applications found.")
-                continue
+        new_urls = list(seen_now_set - seen_before_set)
 
-            # 2) Build email content for new applications only
-            new_items = [r for r in results if r.get("url") in new_urls]
+        # Update last checked
+        watch.last_checked_at = timezone.now()
 
-            lines = [
-                f"New planning applications found for: {query}",
-                "",
-                f"Count: {len(new_items)}",
-                "",
-            ]
+        # First run behaviour:
+        # If we have no history yet, we store what exists and DO NOT email
+        # (unless --force-email-first-run was provided)
+        if not seen_before and not force_email_first_run:
+            watch.last_seen_urls = list(seen_now_set)
+            watch.baseline_query = scrape_query
+            watch.save(update_fields=["last_seen_urls", "baseline_query", "last_checked_at"])
+            self.stdout.write("First run: stored baseline (no email sent).")
+            return False
 
-            for item in new_items:
-                title = item.get("title", "Untitled")
-                addr = item.get("address", "")
-                url = item.get("url", "")
-                lines.append(f"- {title}")
-                if addr:
-                    lines.append(f"  {addr}")
-                if url:
-                    lines.append(f"  {url}")
-                lines.append("")
-
-            subject = f"New planning applications: {query}"
-
-            send_mail(
-                subject=subject,
-                message="\n".join(lines),
-                from_email=getattr(settings, "DEFAULT_FROM_EMAIL", "admin@astorholdings.com.au"),
-                recipient_list=[watch.email],
-                fail_silently=False,
-            )
-
-            # 3) Save updated snapshot so we don’t re-email the same items
+        if (watch.baseline_query or query) != scrape_query:
+            if scrape_query == query:
+                # Back on its own search (the postcode group broke up or hit
+                # the page cap). That can return applications covers() left
+                # out of the postcode results, which aren't new, so take a new
+                # baseline; log what it absorbed.
+                if new_urls:
+                    logger.warning(
+                        "Watch #%s: %d URL(s) absorbed into the new baseline unannounced: %s",
+                        watch.id, len(new_urls), ", ".join(sorted(new_urls)),
+                    )
+                watch.last_seen_urls = list(seen_now_set)
+                watch.baseline_query = scrape_query
+                watch.save(update_fields=["last_seen_urls", "baseline_query", "last_checked_at"])
+                self.stdout.write(f"Now searched via {scrape_query!r}: stored new baseline (no email sent).")
+                return False
+            # Onto a postcode search: its covers() results are this address's
+            # applications, so they are compared with the old baseline as usual.
+            self.stdout.write(f"Now searched via postcode {scrape_query!r}.")
+            watch.baseline_query = scrape_query
+
+        if not new_urls:
             watch.last_seen_urls = list(seen_now_set)
-            watch.save(update_fields=["last_seen_urls", "last_checked_at"])
+            watch.save(update_fields=["last_seen_urls", "baseline_query", "last_checked_at"])
+            self.stdout.write("No new applications found.")
+            return False
+
+        # 2) Build email content for new applications only
+        new_items = [r for r in results if r.get("url") in new_urls]
+        run_item.new_items = len(new_items)
+
+        lines = [
+            f"New planning applications found for: {query}",
+            "",
+            f"Count: {len(new_items)}",
+            "",
+        ]
+
+        for item in new_items:
+            title = item.get("title", "Untitled")
+            addr = item.get("address", "")
+            url = item.get("url", "")
+            lines.append(f"- {title}")
+            if addr:
+                lines.append(f"  {addr}")
+            if url:
+                lines.append(f"  {url}")
+            lines.append("")
+
+        subject = f"New planning applications: {query}"
+
+        send_mail(
+            subject=subject,
+            message="\n".join(lines),
+            from_email=getattr(settings, "DEFAULT_FROM_EMAIL", "admin@astorholdings.com.au"),
+            recipient_list=[watch.email],
+            fail_silently=False,
+        )
+
+        # 3) Save updated snapshot so we don’t re-email the same items
+        watch.last_seen_urls = list(seen_now_set)
+        watch.save(update_fields=["last_seen_urls", "baseline_query", "last_checked_at"])
 
-            self.stdout.write(f"Emailed {watch.email} about {len(new_items)} new application(s).")
+        self.stdout.write(f"Emailed {watch.email} about {len(new_items)} new application(s).")
+        return True
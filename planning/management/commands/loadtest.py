@@ -0,0 +1,324 @@
+import http.client
+import json
+import os
+import random
+import secrets
+import statistics
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core import mail
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from planning.models import PlanningWatch
+from property.models import InboundEmail, Listing, Portal
+
+ENDPOINTS = ("search", "page", "inbox", "alert", "webhook")
+DEFAULT_MIX = "search=40,page=20,inbox=15,alert=5,webhook=20"
+WEBHOOK_SECRET = "loadtest"
+
+# Stub scraper behaviour; set from the command line before the server starts.
+STUB = {"latency": 0.0, "results": 60}
+
+
+def stub_scrape(address: str, stats: dict | None = None, on_page=None, **options):
+    """Stands in for a council site: a fixed delay per results page of ten."""
+    slug = abs(hash(address)) % 10**8
+    results = [
+        {
+            "title": f"Application {i} near {address}",
+            "url": f"https://planning.example.org/{slug}/{i}",
+            "address": address,
+        }
+        for i in range(STUB["results"])
+    ]
+    for start in range(0, max(len(results), 1), 10):
+        time.sleep(STUB["latency"])
+        if stats is not None:
+            stats["pages"] = stats.get("pages", 0) + 1
+        if on_page is not None:
+            on_page(results[start:start + 10])
+    return results
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise CommandError(f"Unknown endpoint {name!r} in --mix (expected {', '.join(ENDPOINTS)}).")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Traffic:
+    """Builds one request per endpoint kind against the seeded data."""
+
+    def __init__(self, queries, alert_queries, cursors, session_key):
+        self.queries = queries
+        self.alert_queries = alert_queries
+        self.cursors = cursors
+        self.session_cookie = f"{settings.SESSION_COOKIE_NAME}={session_key}"
+        self.csrf = secrets.token_hex(16)  # 32 chars: a valid unmasked token
+        self.counter = 0
+        self.lock = threading.Lock()
+
+    def _next(self) -> int:
+        with self.lock:
+            self.counter += 1
+            return self.counter
+
+    def search(self, rng):
+        return "GET", "/planning/?" + urlencode({"q": rng.choice(self.queries)}), None, {}
+
+    def page(self, rng):
+        params = {"q": rng.choice(self.queries), "page": rng.randint(2, 3)}
+        return "GET", "/planning/?" + urlencode(params), None, {}
+
+    def inbox(self, rng):
+        cursor = rng.choice(self.cursors)
+        path = "/property/listings/" + ("?" + urlencode({"cursor": cursor}) if cursor else "")
+        return "GET", path, None, {"Cookie": self.session_cookie}
+
+    def alert(self, rng):
+        body = urlencode({"address": rng.choice(self.alert_queries), "email": f"load{self._next()}@example.org"})
+        headers = {
+            "Content-Type": "application/x-www-form-urlencoded",
+            "Cookie": f"{settings.CSRF_COOKIE_NAME}={self.csrf}",
+            "X-CSRFToken": self.csrf,
+        }
+        return "POST", "/planning/alert/", body, headers
+
+    def webhook(self, rng):
+        n = self._next()
+        body = urlencode(
+            {
+                "subject": f"New listing {n}",
+                "body-plain": f"See https://www.rightmove.co.uk/properties/{900000000 + n}",
+                "Message-Id": f"<loadtest-{n}-{rng.random()}@example.org>",
+            }
+        )
+        headers = {"Content-Type": "application/x-www-form-urlencoded", "X-Inbound-Secret": WEBHOOK_SECRET}
+        return "POST", "/property/webhooks/inbound-email/", body, headers
+
+
+class Command(BaseCommand):
+    help = (
+        "Serves the app in-process (stub scrapers, in-memory mail, a throwaway database) and replays a mix "
+        "of searches, paginated GETs, alert creation and inbound-email webhooks at a target rate. Latency is "
+        "measured from each request's scheduled start, so queueing shows up once the app falls behind."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rate", type=float, default=20.0, help="Target requests per second.")
+        parser.add_argument("--duration", type=float, default=30.0, help="Seconds of traffic.")
+        parser.add_argument("--concurrency", type=int, default=32, help="Client threads.")
+        parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Endpoint weights (default {DEFAULT_MIX}).")
+        parser.add_argument("--queries", type=int, default=200, help="Distinct addresses searched (cache hit rate).")
+        parser.add_argument("--scraper-latency", type=float, default=300.0, help="Stub delay per council page, in ms.")
+        parser.add_argument("--scraper-results", type=int, default=60)
+        parser.add_argument("--listings", type=int, default=2000, help="Listings seeded for the inbox.")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--json", dest="json_path", default="", help="Also write results to this file.")
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options["mix"])
+        if options["rate"] <= 0 or options["duration"] <= 0:
+            raise CommandError("--rate and --duration must be positive.")
+        STUB["latency"] = options["scraper_latency"] / 1000
+        STUB["results"] = options["scraper_results"]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            boroughs = {
+                code: {**borough, "scraper": f"{__name__}:stub_scrape", "scraper_options": {}}
+                for code, borough in settings.PLANNING_BOROUGHS.items()
+            }
+            caches = {**settings.CACHES, "default": {**settings.CACHES["default"], "LOCATION": os.path.join(tmp, "cache")}}
+            if connection.vendor == "sqlite":
+                # a file, not the shared in-memory database, so server threads get their own connections
+                connection.settings_dict["TEST"]["NAME"] = os.path.join(tmp, "loadtest.sqlite3")
+
+            with override_settings(
+                DEBUG=False,
+                ALLOWED_HOSTS=["127.0.0.1", "localhost"],
+                EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+                PLANNING_BOROUGHS=boroughs,
+                CACHES=caches,
+                INBOUND_EMAIL_SECRET=WEBHOOK_SECRET,
+            ):
+                old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+                try:
+                    result = self._run(mix, options)
+                finally:
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self._report(result)
+        if options["json_path"]:
+            with open(options["json_path"], "w") as fh:
+                json.dump(result, fh, indent=2)
+
+    def _seed(self, options, rng) -> Traffic:
+        now = timezone.now()
+        Listing.objects.bulk_create(
+            [
+                Listing(
+                    portal=rng.choice(Portal.values),
+                    canonical_url=f"https://www.rightmove.co.uk/properties/{100000000 + i}",
+                    title=f"{rng.randint(1, 5)} bed flat",
+                    address=f"{i} Example Road",
+                    price=rng.randrange(200_000, 1_500_000, 5000),
+                    bedrooms=rng.randint(1, 5),
+                    first_seen=now - timedelta(minutes=i),
+                )
+                for i in range(options["listings"])
+            ],
+            batch_size=1000,
+        )
+        # cursors for the first few inbox pages ("" is the first page)
+        rows = list(Listing.objects.order_by("-first_seen", "-id").values_list("first_seen", "id")[:1000])
+        cursors = [""] + [f"{ts.isoformat()}_{pk}" for ts, pk in rows[199::200]]
+
+        user = get_user_model().objects.create_user("loadtest", password=secrets.token_hex(8))
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+
+        outward = [(code, oc) for code, b in settings.PLANNING_BOROUGHS.items() for oc in b["outward_codes"]]
+        queries = []
+        for i in range(options["queries"]):
+            code, oc = rng.choice(outward)
+            queries.append(f"{i} High Street, {oc} {rng.randint(1, 9)}{rng.choice('ABDEFG')}{rng.choice('HJLNPQ')}")
+        alert_queries = [
+            q for q in queries
+            if settings.PLANNING_BOROUGHS[self._borough_of(q, outward)].get("alerts")
+        ] or queries
+        return Traffic(queries, alert_queries, cursors, session.session_key)
+
+    @staticmethod
+    def _borough_of(query, outward):
+        postcode = query.rsplit(",", 1)[1].split()[0]
+        return next(code for code, oc in outward if oc == postcode)
+
+    def _run(self, mix, options) -> dict:
+        rng = random.Random(options["seed"])
+        traffic = self._seed(options, rng)
+
+        httpd = ThreadedWSGIServer(("127.0.0.1", 0), _QuietHandler, allow_reuse_address=False)
+        httpd.set_app(get_wsgi_application())
+        port = httpd.server_address[1]
+        server = threading.Thread(target=httpd.serve_forever, daemon=True)
+        server.start()
+
+        samples = defaultdict(list)
+        errors = defaultdict(int)
+        statuses = defaultdict(lambda: defaultdict(int))
+        record = threading.Lock()
+
+        def fire(kind, scheduled, request_rng):
+            method, path, body, headers = getattr(traffic, kind)(request_rng)
+            status = None
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+                conn.close()
+            except OSError:
+                pass
+            elapsed = time.perf_counter() - scheduled
+            with record:
+                samples[kind].append(elapsed)
+                statuses[kind][status or "error"] += 1
+                if status is None or status >= 400:
+                    errors[kind] += 1
+
+        kinds, weights = list(mix), list(mix.values())
+        total = int(options["rate"] * options["duration"])
+        interval = 1 / options["rate"]
+        mail.outbox = []
+
+        self.stdout.write(f"Serving on 127.0.0.1:{port}; sending {total} requests at {options['rate']}/s ...")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            for i in range(total):
+                scheduled = started + i * interval
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                kind = rng.choices(kinds, weights)[0]
+                pool.submit(fire, kind, scheduled, random.Random(rng.random()))
+        wall = time.perf_counter() - started
+
+        httpd.shutdown()
+        httpd.server_close()
+
+        endpoints = {}
+        for kind in kinds:
+            latencies = samples.get(kind)
+            if not latencies:
+                continue
+            endpoints[kind] = {
+                "requests": len(latencies),
+                "errors": errors[kind],
+                "statuses": {str(k): v for k, v in statuses[kind].items()},
+                "throughput_rps": round(len(latencies) / wall, 2),
+                "p50_ms": round(statistics.median(latencies) * 1000, 1),
+                "p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+                "p99_ms": round(_percentile(latencies, 99) * 1000, 1),
+                "max_ms": round(max(latencies) * 1000, 1),
+            }
+        done = sum(len(v) for v in samples.values())
+        return {
+            "target_rps": options["rate"],
+            "achieved_rps": round(done / wall, 2),
+            "wall_seconds": round(wall, 2),
+            "requests": done,
+            "errors": sum(errors.values()),
+            "endpoints": endpoints,
+            "emails_sent": len(mail.outbox),
+            "alerts_created": PlanningWatch.objects.count(),
+            "inbound_queued": InboundEmail.objects.count(),
+        }
+
+    def _report(self, result):
+        self.stdout.write(
+            f"{result['requests']} requests in {result['wall_seconds']}s "
+            f"({result['achieved_rps']}/s, target {result['target_rps']}/s), {result['errors']} error(s)"
+        )
+        self.stdout.write(f"{'endpoint':<10}{'reqs':>7}{'err':>6}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+        for kind, s in result["endpoints"].items():
+            line = (
+                f"{kind:<10}{s['requests']:>7}{s['errors']:>6}{s['throughput_rps']:>8}"
+                f"{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}{s['max_ms']:>9}"
+            )
+            self.stdout.write(self.style.WARNING(line) if s["errors"] else line)
+        self.stdout.write(
+            f"Mail sink: {result['emails_sent']} email(s); {result['alerts_created']} alert(s); "
+            f"{result['inbound_queued']} inbound email(s) queued."
+        )
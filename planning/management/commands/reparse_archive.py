@@ -0,0 +1,190 @@
+import json
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from planning import archive, pipeline, subsumption
+from planning.archive import body
+from planning.models import FetchedPage, PageBlob, PlanningWatch
+from planning.scrapers import registry
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-parses archived council pages with the current parsers, without touching the network. "
+        "Writes the results per scrape as JSON lines and/or rebuilds each watch's last seen URLs, "
+        "and can prune old pages from the archive."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--borough", default="", help="Only this borough code.")
+        parser.add_argument("--query", default="", help="Only pages fetched for this exact query.")
+        parser.add_argument("--since-days", type=int, default=0, help="Only pages fetched in the last N days.")
+        parser.add_argument("--output", default="", help="Write one JSON line per archived scrape to this file.")
+        parser.add_argument(
+            "--update-watches",
+            action="store_true",
+            help="Set each active watch's last_seen_urls from its most recent archived scrape.",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="With --update-watches, only report changes.")
+        parser.add_argument(
+            "--prune-days",
+            type=int,
+            default=0,
+            help="Afterwards, delete archived pages fetched more than N days ago and their unshared bodies.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--parsers",
+            type=int,
+            default=None,
+            help="Processes parsing pages (default: one per core; 0 parses in this process).",
+        )
+
+    def handle(self, *args, **options):
+        if not options["output"] and not options["update_watches"] and not options["prune_days"]:
+            raise CommandError("Nothing to do: pass --output, --update-watches and/or --prune-days.")
+        if options["output"] or options["update_watches"]:
+            self._reparse_archive(options)
+        if options["prune_days"]:
+            pages, blobs = archive.prune(options["prune_days"])
+            self.stdout.write(f"Pruned {pages} page(s) and {blobs} unreferenced body(ies).")
+
+    def _reparse_archive(self, options):
+        pages = FetchedPage.objects.filter(status_code=200)
+        if options["borough"]:
+            pages = pages.filter(borough_code=options["borough"])
+        if options["query"]:
+            pages = pages.filter(query=options["query"])
+        if options["since_days"]:
+            pages = pages.filter(fetched_at__gte=timezone.now() - timedelta(days=options["since_days"]))
+
+        parsers = pipeline.default_parsers(options["batch_size"]) if options["parsers"] is None else options["parsers"]
+        pool = pipeline.parse_pool(parsers)
+        self.output = open(options["output"], "w") if options["output"] else None
+        self.keep_latest = options["update_watches"]
+        started = time.perf_counter()
+        try:
+            latest = self._reparse(pages, options["batch_size"], pool)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            if self.output is not None:
+                self.output.close()
+        elapsed = time.perf_counter() - started
+
+        if options["update_watches"]:
+            self._update_watches(latest, options["dry_run"])
+
+        self.stdout.write(
+            f"Re-parsed {self.page_count} page(s) from {self.fetch_count} scrape(s) in {elapsed:.2f}s "
+            f"({self.page_count / elapsed if elapsed else 0:.0f} pages/s, {self.parsed_blobs} distinct bodies parsed)."
+        )
+
+    def _reparse(self, pages, batch_size: int, pool=None) -> dict:
+        """
+        Re-parses pages one scrape at a time, writing each to --output as soon
+        as it is complete. Returns the most recent scrape per (borough_code,
+        query) as {fetch_id, borough_code, query, fetched_at, pages, results}
+        when --update-watches needs it, else an empty dict.
+        """
+        parsers = {}
+        parsed = {}  # (borough_code, digest) -> results; unchanged pages are parsed once
+        self.latest = {}
+        self.fetch = None
+        self.parsed_blobs = self.page_count = self.fetch_count = 0
+
+        # a scrape's pages are contiguous in fetch_id order, so only the one
+        # being read is held in memory
+        rows = pages.order_by("fetch_id", "page").values(
+            "fetch_id", "borough_code", "query", "url", "page", "fetched_at", "blob_id"
+        )
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                self._parse_batch(batch, parsers, parsed, pool)
+                self._collect(batch, parsed)
+                batch = []
+        if batch:
+            self._parse_batch(batch, parsers, parsed, pool)
+            self._collect(batch, parsed)
+        self._finish_fetch()
+        return self.latest
+
+    def _parse_batch(self, batch, parsers, parsed, pool=None):
+        wanted = {(r["borough_code"], r["blob_id"]) for r in batch} - parsed.keys()
+        if not wanted:
+            return
+        blobs = PageBlob.objects.in_bulk({digest for _, digest in wanted})
+        todo = []
+        for code, digest in wanted:
+            if code not in parsers:
+                parsers[code] = registry.get_parser(code)
+                if parsers[code] is None:
+                    self.stdout.write(self.style.WARNING(f"No parser for {code}; its pages are skipped."))
+            if parsers[code] is None:
+                parsed[(code, digest)] = None
+            else:
+                todo.append((code, digest))
+        # the batch's pages are parsed across the pool (see planning.pipeline)
+        results = pipeline.map_parse(pool, [parsers[code] for code, _ in todo], [body(blobs[d]) for _, d in todo])
+        parsed.update(zip(todo, results))
+        self.parsed_blobs += len(wanted)
+
+    def _collect(self, batch, parsed):
+        for row in batch:
+            results = parsed[(row["borough_code"], row["blob_id"])]
+            if results is None:
+                continue
+            if self.fetch is None or self.fetch["fetch_id"] != row["fetch_id"]:
+                self._finish_fetch()
+                self.fetch = {
+                    "fetch_id": row["fetch_id"],
+                    "borough_code": row["borough_code"],
+                    "query": row["query"],
+                    "fetched_at": row["fetched_at"],
+                    "pages": [],
+                    "results": [],
+                }
+            self.fetch["pages"].append(row["url"])
+            self.fetch["results"].extend(results)
+
+    def _finish_fetch(self):
+        fetch, self.fetch = self.fetch, None
+        if fetch is None:
+            return
+        self.fetch_count += 1
+        self.page_count += len(fetch["pages"])
+        if self.output is not None:
+            self.output.write(json.dumps(fetch, default=str) + "\n")
+        if self.keep_latest:
+            key = (fetch["borough_code"], fetch["query"])
+            if key not in self.latest or fetch["fetched_at"] > self.latest[key]["fetched_at"]:
+                self.latest[key] = fetch
+
+    def _update_watches(self, latest, dry_run: bool):
+        changed = 0
+        for watch in PlanningWatch.objects.filter(active=True):
+            # last_seen_urls is relative to the search the checker last ran for
+            # the watch: its own query or a postcode search shared with others
+            query = watch.query.strip()
+            scrape_query = watch.baseline_query or query
+            fetch = latest.get((watch.borough_code, scrape_query))
+            if fetch is None:
+                continue
+            results = fetch["results"]
+            if scrape_query != query:
+                results = [r for r in results if subsumption.covers(query, r.get("address", ""))]
+            urls = sorted({r["url"] for r in results if r.get("url")})
+            if set(urls) == set(watch.last_seen_urls or []) and watch.baseline_query == scrape_query:
+                continue
+            changed += 1
+            self.stdout.write(f"Watch #{watch.id}: {len(watch.last_seen_urls or [])} -> {len(urls)} seen URL(s)")
+            if not dry_run:
+                watch.last_seen_urls = urls
+                watch.baseline_query = scrape_query
+                watch.save(update_fields=["last_seen_urls", "baseline_query"])
+        self.stdout.write(f"{changed} watch(es) {'would change' if dry_run else 'updated'}.")
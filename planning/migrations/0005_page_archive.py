@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planning', '0004_checkrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageBlob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('data', models.BinaryField()),
+                ('size', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FetchedPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fetch_id', models.CharField(db_index=True, max_length=32)),
+                ('borough_code', models.CharField(max_length=50)),
+                ('query', models.CharField(max_length=255)),
+                ('url', models.URLField(max_length=2000)),
+                ('page', models.PositiveSmallIntegerField(default=1)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('fetched_at', models.DateTimeField(db_index=True)),
+                ('blob', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='fetches', to='planning.pageblob')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['url', '-fetched_at'], name='fetchedpage_url_idx'), models.Index(fields=['borough_code', 'query', '-fetched_at'], name='fetchedpage_query_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planning', '0005_page_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planningwatch',
+            name='baseline_query',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
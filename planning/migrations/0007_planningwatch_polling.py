@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planning', '0006_planningwatch_baseline_query'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planningwatch',
+            name='last_changed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='planningwatch',
+            name='next_check_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='planningwatch',
+            name='poll_interval_hours',
+            field=models.FloatField(default=24),
+        ),
+        migrations.AddIndex(
+            model_name='planningwatch',
+            index=models.Index(fields=['active', 'next_check_at'], name='planningwatch_due_idx'),
+        ),
+    ]
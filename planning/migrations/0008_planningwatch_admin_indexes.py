@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planning', '0007_planningwatch_polling'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='planningwatch',
+            index=models.Index(fields=['-created_at'], name='planningwatch_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='planningwatch',
+            index=models.Index(fields=['borough_code', '-created_at'], name='planningwatch_borough_idx'),
+        ),
+    ]
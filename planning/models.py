@@ -10,11 +10,104 @@ class PlanningWatch(models.Model):
 
     last_seen_urls = models.JSONField(default=list, blank=True)
     last_checked_at = models.DateTimeField(null=True, blank=True)
+    # the search last_seen_urls came from: the query itself, or a postcode
+    # search shared with nearby watches (blank on older rows means the query)
+    baseline_query = models.CharField(max_length=255, blank=True)
+
+    # adaptive polling (planning/polling.py); a null next_check_at is due now
+    poll_interval_hours = models.FloatField(default=24)
+    next_check_at = models.DateTimeField(null=True, blank=True)
+    last_changed_at = models.DateTimeField(null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["active", "next_check_at"], name="planningwatch_due_idx"),
+            # admin change list: newest first, optionally narrowed to one borough
+            models.Index(fields=["-created_at"], name="planningwatch_created_idx"),
+            models.Index(fields=["borough_code", "-created_at"], name="planningwatch_borough_idx"),
+        ]
 
     def __str__(self):
         return f"{self.query} ({self.borough_code}) → {self.email}"
+
+
+class CheckRun(models.Model):
+    """One check_planning_watchlist run; totals across its CheckRunItems."""
+
+    started_at = models.DateTimeField(default=timezone.now, db_index=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_ms = models.FloatField(default=0)
+
+    watches_checked = models.PositiveIntegerField(default=0)
+    pages_fetched = models.PositiveIntegerField(default=0)
+    bytes_downloaded = models.BigIntegerField(default=0)
+    new_items = models.PositiveIntegerField(default=0)
+    emails_sent = models.PositiveIntegerField(default=0)
+    errors = models.PositiveIntegerField(default=0)
+    retries = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-started_at"]
+
+    def __str__(self):
+        return f"Run {self.started_at:%Y-%m-%d %H:%M} ({self.watches_checked} watches)"
+
+
+class CheckRunItem(models.Model):
+    """How one watch's check went within a run."""
+
+    run = models.ForeignKey(CheckRun, on_delete=models.CASCADE, related_name="items")
+    watch = models.ForeignKey(PlanningWatch, on_delete=models.SET_NULL, null=True, blank=True, related_name="check_items")
+    query = models.CharField(max_length=255)
+    borough_code = models.CharField(max_length=50)
+
+    duration_ms = models.FloatField(default=0)
+    pages_fetched = models.PositiveIntegerField(default=0)
+    bytes_downloaded = models.BigIntegerField(default=0)
+    results = models.PositiveIntegerField(default=0)
+    new_items = models.PositiveIntegerField(default=0)
+    retries = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ["-duration_ms"]
+
+    def __str__(self):
+        return f"{self.query} ({self.duration_ms:.0f} ms)"
+
+
+class PageBlob(models.Model):
+    """A raw council results page, zlib-compressed and stored once per distinct body."""
+
+    digest = models.CharField(max_length=64, primary_key=True)  # sha256 of the uncompressed body
+    data = models.BinaryField()
+    size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.digest[:12]} ({self.size} bytes)"
+
+
+class FetchedPage(models.Model):
+    """One fetch of a council results page; the body lives in PageBlob."""
+
+    fetch_id = models.CharField(max_length=32, db_index=True)  # pages from the same scrape share it
+    borough_code = models.CharField(max_length=50)
+    query = models.CharField(max_length=255)
+    url = models.URLField(max_length=2000)
+    page = models.PositiveSmallIntegerField(default=1)
+    status_code = models.PositiveSmallIntegerField()
+    blob = models.ForeignKey(PageBlob, on_delete=models.PROTECT, related_name="fetches")
+    fetched_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["url", "-fetched_at"], name="fetchedpage_url_idx"),
+            models.Index(fields=["borough_code", "query", "-fetched_at"], name="fetchedpage_query_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.url} @ {self.fetched_at:%Y-%m-%d %H:%M}"
@@ -0,0 +1,234 @@
+"""
+Staged fetch/parse pipeline for batch scraping.
+
+A watchlist run is dozens of council searches. Done one after another,
+each waits on the network and then on BeautifulSoup, with the other
+resource idle. run() overlaps them in two stages:
+
+    fetch   a thread pool doing the HTTP requests (I/O bound)
+    parse   a process pool doing the HTML parsing (CPU bound, so it is not
+            held to one core by the GIL)
+
+An Idox search is a chain of pages, since the next page's URL comes from
+parsing the last one. Each search therefore has one page in the pipeline at
+a time, and different searches overlap. At most `fetchers + backlog`
+searches are admitted at once, which bounds the pages waiting between the
+stages. When parsing is the slower stage, that budget fills up with fetched
+pages and fetching pauses (backpressure). The run's HTML is never all held
+in memory.
+
+Scrapers whose module offers the stages (see registry.get_stages and
+planning.scrapers.idox) are split up; any other scraper runs whole in a
+fetch thread. Jobs come back in the order they finish:
+
+    for job in pipeline.run([("ealing", "UB6 8JF"), ("brent", "NW10 1AA")]):
+        job.index, job.results, job.error, job.stats, job.archive, job.truncated
+
+Database work stays in the calling thread: archived pages are returned on
+the job for the caller to store (planning.archive.store).
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from planning.scrapers import registry
+
+logger = logging.getLogger(__name__)
+
+# Fetched pages allowed to wait for a parser, beyond one per fetch thread
+DEFAULT_BACKLOG = 16
+
+
+class Job:
+    def __init__(self, index: int, borough_code: str, query: str, archive: bool):
+        self.index = index
+        self.borough_code = borough_code
+        self.query = query
+        self.results = []
+        self.error = None
+        self.stats = {"pages": 0, "bytes": 0, "retries": 0}
+        self.archive = [] if archive else None
+        self.duration_ms = 0.0
+        self.truncated = False  # stopped at the scraper's page cap with more pages left
+
+        self.stages = None
+        self.session = None
+        self.url = None
+        self.page_num = 0
+        self.started = None
+
+
+def parse_pool(workers: int):
+    """A process pool for the parse stage; None (parse in-process) for workers=0."""
+    if not workers:
+        return None
+    # not fork: the pool starts while fetch threads are running
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(method))
+
+
+def default_parsers(tasks: int) -> int:
+    """One parse process per core, no more than there is work for; none on a single core."""
+    cores = os.cpu_count() or 1
+    return min(cores, tasks) if cores > 1 and tasks > 1 else 0
+
+
+def _call(fn, arg):
+    return fn(arg)
+
+
+def map_parse(pool, fns, bodies, chunksize: int = 8) -> list:
+    """[fn(body), ...] on the pool, or in-process without one (used by reparse_archive)."""
+    if pool is None:
+        return [fn(body) for fn, body in zip(fns, bodies)]
+    return list(pool.map(_call, fns, bodies, chunksize=chunksize))
+
+
+class _Result:
+    """A settled future, for parsing in-process through the same event path."""
+
+    def __init__(self, value=None, exc=None):
+        self.value, self.exc = value, exc
+
+    def result(self):
+        if self.exc is not None:
+            raise self.exc
+        return self.value
+
+
+def _done(fn, arg) -> _Result:
+    try:
+        return _Result(fn(arg))
+    except Exception as exc:
+        return _Result(exc=exc)
+
+
+def _retrying(job: Job, attempts: int, fn, *args, **kwargs):
+    """fn(*args, **kwargs), retried attempts times in all with 2s, 4s... between tries."""
+    for attempt in range(1, attempts + 1):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as exc:
+            if attempt == attempts:
+                raise
+            job.stats["retries"] += 1
+            logger.warning("%s %r failed (%r); retrying.", job.borough_code, job.query, exc)
+            time.sleep(2 ** attempt)
+
+
+def _fetch(job: Job, attempts: int) -> str:
+    open_session, fetch_page, _, _ = job.stages
+
+    def attempt():
+        if job.session is None:
+            job.session = open_session()
+        return fetch_page(job.session, job.query, job.url, job.page_num, stats=job.stats, archive=job.archive)
+
+    return _retrying(job, attempts, attempt)
+
+
+def _scrape_whole(job: Job, attempts: int):
+    scrape = registry.get_scraper(job.borough_code)
+    if scrape is None:
+        raise RuntimeError(f"No scraper for {job.borough_code}")
+    kwargs = {"stats": job.stats}
+    if job.archive is not None and registry.accepts(scrape, "archive"):
+        kwargs["archive"] = job.archive
+    return _retrying(job, attempts, scrape, job.query, **kwargs)
+
+
+def run(searches, *, fetchers: int = 8, parsers: int | None = None, backlog: int = DEFAULT_BACKLOG,
+        attempts: int = 3, archive: bool = False):
+    """
+    Run (borough_code, query) searches through the pipeline, yielding each
+    Job as it finishes. parsers defaults to default_parsers(); 0 parses in
+    this process.
+    """
+    jobs = deque(Job(i, code, query, archive) for i, (code, query) in enumerate(searches))
+    if parsers is None:
+        parsers = default_parsers(len(jobs))
+    events = queue.Queue()
+    to_parse = deque()  # fetched (job, html) waiting for a parse slot
+    parsing = 0
+    active = 0
+    pool = parse_pool(parsers)
+
+    def notify(kind, job):
+        return lambda future: events.put((kind, job, future))
+
+    def fetch(job):
+        fetch_pool.submit(_fetch, job, attempts).add_done_callback(notify("fetched", job))
+
+    try:
+        with ThreadPoolExecutor(fetchers, thread_name_prefix="planning-fetch") as fetch_pool:
+            while jobs or active:
+                # admit new searches while there is room in the pipeline
+                while jobs and active < fetchers + backlog:
+                    job = jobs.popleft()
+                    active += 1
+                    job.started = time.perf_counter()
+                    job.stages = registry.get_stages(job.borough_code)
+                    if job.stages is None:
+                        fetch_pool.submit(_scrape_whole, job, attempts).add_done_callback(notify("scraped", job))
+                    else:
+                        fetch(job)
+
+                kind, job, future = events.get()
+                finished = False
+
+                if kind == "scraped":
+                    try:
+                        job.results = future.result()
+                    except Exception as exc:
+                        job.error = exc
+                    finished = True
+
+                elif kind == "fetched":
+                    try:
+                        to_parse.append((job, future.result()))
+                    except Exception as exc:
+                        job.error = exc
+                        finished = True
+
+                elif kind == "parsed":
+                    parsing -= 1
+                    try:
+                        page_results, next_url = future.result()
+                    except Exception as exc:
+                        job.error = exc
+                        finished = True
+                    else:
+                        job.results.extend(page_results)
+                        job.page_num += 1
+                        job.url = next_url
+                        if next_url and job.page_num < job.stages[3]:
+                            fetch(job)
+                        else:
+                            job.truncated = bool(next_url)
+                            finished = True
+
+                # feed the parsers; pages beyond their capacity wait in to_parse
+                while to_parse and (pool is None or parsing < 2 * parsers):
+                    waiting, html = to_parse.popleft()
+                    parse_page = waiting.stages[2]
+                    if pool is None:
+                        future = _done(parse_page, html)
+                        events.put(("parsed", waiting, future))
+                    else:
+                        pool.submit(parse_page, html).add_done_callback(notify("parsed", waiting))
+                    parsing += 1
+
+                if finished:
+                    active -= 1
+                    job.duration_ms = round((time.perf_counter() - job.started) * 1000, 1)
+                    if job.session is not None:
+                        job.session.close()
+                    yield job
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
@@ -0,0 +1,47 @@
+"""
+Adaptive polling for planning watches.
+
+Each watch keeps its own interval between checks. A check that finds new
+applications halves it, so a busy site is looked at more often; a quiet
+check stretches it by PLANNING_POLL_BACKOFF, so an address with nothing
+happening drifts out towards PLANNING_POLL_MAX_HOURS. Intervals stay within
+PLANNING_POLL_MIN_HOURS and PLANNING_POLL_MAX_HOURS, and a failed check is
+retried after the minimum.
+
+Setting next_check_at to now (admin "Check now", or
+check_planning_watchlist --watch) puts a watch at the front of the queue.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+SCHEDULE_FIELDS = ["poll_interval_hours", "next_check_at", "last_changed_at"]
+
+
+def _bounds() -> tuple[float, float]:
+    return settings.PLANNING_POLL_MIN_HOURS, settings.PLANNING_POLL_MAX_HOURS
+
+
+def next_interval(hours: float, changed: bool) -> float:
+    low, high = _bounds()
+    hours = hours / 2 if changed else hours * settings.PLANNING_POLL_BACKOFF
+    return min(high, max(low, hours))
+
+
+def reschedule(watch, *, changed: bool = False, failed: bool = False, now=None):
+    """Update the watch's schedule fields in memory (saved in bulk by the caller)."""
+    now = now or timezone.now()
+    if failed:
+        watch.next_check_at = now + timedelta(hours=_bounds()[0])
+        return
+    if changed:
+        watch.last_changed_at = now
+    watch.poll_interval_hours = next_interval(watch.poll_interval_hours, changed)
+    watch.next_check_at = now + timedelta(hours=watch.poll_interval_hours)
+
+
+def due(queryset, now=None):
+    now = now or timezone.now()
+    return queryset.filter(Q(next_check_at__isnull=True) | Q(next_check_at__lte=now))
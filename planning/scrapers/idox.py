@@ -0,0 +1,189 @@
+"""
+Generic scraper for Idox "Public Access" planning sites.
+
+Most London boroughs run the same Idox front end; they differ only in the
+host and in how the first results page must be requested. A borough is
+added by configuration alone:
+
+    "barnet": {
+        "label": "London Borough of Barnet",
+        "outward_codes": [...],
+        "scraper": "planning.scrapers.idox",
+        "scraper_options": {"base_url": "https://...", "first_page": "post", "warmup": True},
+    }
+
+The registry binds scraper_options to scrape() (see registry.get_scraper)
+and to parse(), which reparse_archive uses on archived pages.
+
+scrape() is also available as separate stages - open_session(),
+fetch_page() and parse_page() - which planning.pipeline runs on a thread
+pool and a process pool respectively when checking many searches at once.
+"""
+from datetime import datetime, timezone
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup
+
+SEARCH_PATH = "/online-applications/"
+RESULTS_PATH = "/online-applications/simpleSearchResults.do"
+
+# Results pages followed per search, unless a borough's scraper_options say otherwise
+MAX_PAGES = 10
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/129.0 Safari/537.36"
+    )
+}
+
+
+def parse_results(html: str, base_url: str):
+    """(results, next_url) from one simpleSearchResults page."""
+    soup = BeautifulSoup(html, "html.parser")
+
+    results = []
+    for li in soup.select("li.searchresult"):
+        a = li.select_one("a")
+        if not a:
+            continue
+
+        addr_el = li.select_one(".address")
+        results.append(
+            {
+                "title": a.get_text(strip=True),
+                "url": urljoin(base_url, a.get("href", "")),
+                "address": addr_el.get_text(strip=True) if addr_el else "",
+            }
+        )
+
+    # pagination: <a class="next" href="...">
+    next_link = soup.select_one("a.next")
+    next_url = urljoin(base_url, next_link["href"]) if next_link and next_link.get("href") else None
+    return results, next_url
+
+
+def parse(html: str, *, base_url: str, **options):
+    """Results on one archived page (the scrape options other than base_url don't matter here)."""
+    return parse_results(html, base_url)[0]
+
+
+def parse_page(html: str, *, base_url: str, **options):
+    """(results, next_url): the parse stage when planning.pipeline drives this scraper."""
+    return parse_results(html, base_url)
+
+
+def open_session(*, base_url: str, warmup: bool = False, headers: dict | None = None, timeout: float = 10, **options):
+    """A session for one search; warmup fetches the search page first for the session cookies some councils insist on."""
+    session = requests.Session()
+    session.headers.update(HEADERS if headers is None else headers)
+    if warmup:
+        try:
+            session.get(urljoin(base_url, SEARCH_PATH), timeout=timeout)
+        except Exception as e:
+            raise RuntimeError(f"{base_url} initial page request failed: {e}") from e
+    return session
+
+
+def fetch_page(
+    session,
+    address: str,
+    url: str | None,
+    page_num: int,
+    *,
+    base_url: str,
+    first_page: str = "get",
+    timeout: float = 10,
+    stats: dict | None = None,
+    archive: list | None = None,
+    **options,
+) -> str:
+    """
+    HTML of one results page: the first (url=None, requested as first_page
+    says) or a 'Next' link. page_num counts from 0. Raises on a failed
+    request or a non-200 response, after counting and archiving it.
+    """
+    payload = {
+        "action": "firstPage",
+        "searchType": "Application",
+        "searchCriteria.caseStatus": "",
+        "searchCriteria.simpleSearchString": address,
+        "searchCriteria.simpleSearch": "true",
+    }
+    try:
+        if url is None and first_page == "post":
+            resp = session.post(urljoin(base_url, RESULTS_PATH), data=payload, timeout=timeout)
+        elif url is None:
+            resp = session.get(urljoin(base_url, RESULTS_PATH), params=payload, timeout=timeout)
+        else:
+            resp = session.get(url, timeout=timeout)
+    except Exception as e:
+        raise RuntimeError(f"{base_url} request failed on page {page_num+1}: {e}") from e
+
+    if stats is not None:
+        stats["pages"] = stats.get("pages", 0) + 1
+        stats["bytes"] = stats.get("bytes", 0) + len(resp.content)
+
+    if archive is not None:
+        archive.append(
+            {
+                "url": resp.url,
+                "page": page_num + 1,
+                "status_code": resp.status_code,
+                "body": resp.content,
+                "fetched_at": datetime.now(timezone.utc),
+            }
+        )
+
+    if resp.status_code != 200:
+        raise RuntimeError(f"{base_url} returned HTTP {resp.status_code} on page {page_num+1}")
+    return resp.text
+
+
+def scrape(
+    address: str,
+    *,
+    base_url: str,
+    first_page: str = "get",
+    warmup: bool = False,
+    headers: dict | None = None,
+    max_pages: int = MAX_PAGES,
+    timeout: float = 10,
+    stats: dict | None = None,
+    on_page=None,
+    archive: list | None = None,
+):
+    """
+    Fetch ALL planning applications for an address from an Idox site,
+    following the 'Next' link up to max_pages.
+
+    first_page is "get" (query string) or "post" (form data); warmup fetches
+    the search page first for the session cookies some councils insist on.
+    If a stats dict is passed, "pages" and "bytes" are added to it; on_page,
+    if given, is called with each page's results as soon as it is parsed.
+    Raw results pages are appended to archive, if given (see planning.archive).
+
+    Returns list of dicts: {title, url, address}
+    """
+    session = open_session(base_url=base_url, warmup=warmup, headers=headers, timeout=timeout)
+
+    results = []
+    url = None
+    page_num = 0
+
+    while page_num < max_pages:
+        html = fetch_page(
+            session, address, url, page_num,
+            base_url=base_url, first_page=first_page, timeout=timeout, stats=stats, archive=archive,
+        )
+        page_results, url = parse_results(html, base_url)
+        results.extend(page_results)
+        if on_page is not None:
+            on_page(page_results)
+        page_num += 1
+        if not url:
+            break
+
+    return results
@@ -0,0 +1,221 @@
+"""
+Borough registry.
+
+Boroughs are described in settings.PLANNING_BOROUGHS (label, outward codes,
+and where their scraper lives). Scraper modules - and with them requests and
+BeautifulSoup - are only imported the first time a borough is actually
+searched, so worker boot time does not grow with the number of boroughs.
+
+A borough's scraper is either a dotted path in its settings entry
+("planning.scrapers.idox" or "pkg.module:function") or, for boroughs
+shipped in another package, an entry point of the same name in the
+"planning_checker.scrapers" group.
+
+The borough's "scraper_options" are bound as keyword arguments, which is
+how one engine (planning.scrapers.idox) serves every Idox council.
+
+Scrapers are called as scrape(address, stats=None) and return a list of
+{title, url, address} dicts. When given a stats dict they add the "pages"
+and "bytes" they fetched, which check_planning_watchlist records per run.
+Scrapers that also take on_page=callback report each results page as it is
+parsed, which lets the search page stream (see stream_many). Modules that
+also offer the scrape as stages are run by planning.pipeline (get_stages).
+"""
+import inspect
+import logging
+import queue
+import threading
+from functools import partial
+from importlib import import_module
+from importlib.metadata import entry_points
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+ENTRY_POINT_GROUP = "planning_checker.scrapers"
+
+logger = logging.getLogger(__name__)
+
+_scrapers = {}
+_lock = threading.Lock()
+
+
+def boroughs() -> dict:
+    return settings.PLANNING_BOROUGHS
+
+
+def get_borough(code: str) -> dict | None:
+    return boroughs().get(code) if code else None
+
+
+def borough_label(code: str) -> str | None:
+    borough = get_borough(code)
+    return borough["label"] if borough else None
+
+
+def outward_code_map() -> dict:
+    """Outward code (e.g. "UB6") -> borough code (the first listed, if several share it)."""
+    mapping = {}
+    for code, borough in boroughs().items():
+        for outward in borough.get("outward_codes", ()):
+            mapping.setdefault(outward, code)
+    return mapping
+
+
+def candidates(outward: str) -> list[str]:
+    """Every borough listing this outward code; postcodes near a boundary can be in several."""
+    return [code for code, borough in boroughs().items() if outward in borough.get("outward_codes", ())]
+
+
+def _load(path: str):
+    module_path, _, attr = path.partition(":")
+    return getattr(import_module(module_path), attr or "scrape")
+
+
+def get_scraper(code: str):
+    """The borough's scrape(address) callable, imported on first use; None if it has none."""
+    scrape = _scrapers.get(code)
+    if scrape is not None:
+        return scrape
+
+    borough = get_borough(code)
+    if borough is None:
+        return None
+
+    with _lock:
+        if code not in _scrapers:
+            if borough.get("scraper"):
+                scrape = _load(borough["scraper"])
+            else:
+                eps = entry_points(group=ENTRY_POINT_GROUP, name=code)
+                scrape = next(iter(eps)).load() if eps else None
+            if scrape is not None and borough.get("scraper_options"):
+                scrape = partial(scrape, **borough["scraper_options"])
+            _scrapers[code] = scrape
+        return _scrapers[code]
+
+
+def get_parser(code: str):
+    """
+    The parse(html) function of the borough's scraper module, with its
+    scraper_options bound, for re-reading archived pages; None if the
+    scraper has none.
+    """
+    borough = get_borough(code)
+    if not borough or not borough.get("scraper"):
+        return None
+    module_path = borough["scraper"].partition(":")[0]
+    parse = getattr(import_module(module_path), "parse", None)
+    if parse is not None and borough.get("scraper_options"):
+        parse = partial(parse, **borough["scraper_options"])
+    return parse
+
+
+def get_stages(code: str):
+    """
+    The borough's scraper split into stages for planning.pipeline, as
+    (open_session, fetch_page, parse_page, max_pages) with its
+    scraper_options bound; None if its module doesn't offer them.
+    """
+    borough = get_borough(code)
+    if not borough or not borough.get("scraper"):
+        return None
+    module_path, _, attr = borough["scraper"].partition(":")
+    if attr not in ("", "scrape"):
+        return None
+    module = import_module(module_path)
+    names = ("open_session", "fetch_page", "parse_page")
+    if not all(hasattr(module, name) for name in names):
+        return None
+    options = borough.get("scraper_options", {})
+    stages = tuple(partial(getattr(module, name), **options) for name in names)
+    return (*stages, options.get("max_pages", getattr(module, "MAX_PAGES", 10)))
+
+
+def accepts(fn, name: str) -> bool:
+    """Whether a scraper takes an optional keyword such as on_page or archive."""
+    try:
+        return name in inspect.signature(fn).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def stream_many(codes, address: str, stats: dict | None = None):
+    """
+    Search several boroughs concurrently, yielding lists of results as each
+    council page is parsed (scrapers that take an on_page callback report
+    page by page; others deliver everything when they finish). Duplicate
+    URLs are dropped and, when searching more than one borough, results are
+    tagged with its label. Raises only if every borough failed.
+    """
+    from planning import archive
+
+    scrapers = [(code, get_scraper(code)) for code in codes]
+    scrapers = [(code, scrape) for code, scrape in scrapers if scrape is not None]
+    events = queue.Queue()
+    archiving = archive.enabled()
+
+    def run(code, scrape):
+        own = {}
+        kwargs = {"stats": own}
+        if accepts(scrape, "on_page"):
+            kwargs["on_page"] = lambda results: events.put(("page", code, results))
+        if archiving and accepts(scrape, "archive"):
+            kwargs["archive"] = []
+        try:
+            results = scrape(address, **kwargs)
+            if "on_page" not in kwargs:
+                events.put(("page", code, results))
+            events.put(("done", code, (own, None, kwargs.get("archive"))))
+        except Exception as exc:
+            events.put(("done", code, (own, exc, kwargs.get("archive"))))
+
+    # daemon threads rather than a pool: a client hanging up mid-stream
+    # must not block the worker until the councils answer
+    for code, scrape in scrapers:
+        threading.Thread(target=run, args=(code, scrape), daemon=True).start()
+
+    seen, failures, remaining = set(), [], len(scrapers)
+    while remaining:
+        kind, code, payload = events.get()
+        if kind == "page":
+            page = []
+            for result in payload:
+                if result.get("url") in seen:
+                    continue
+                seen.add(result.get("url"))
+                page.append({**result, "borough": borough_label(code)} if len(scrapers) > 1 else result)
+            if page:
+                yield page
+            continue
+
+        remaining -= 1
+        own, exc, pages = payload
+        # written here, not in the scraper threads, so no thread opens its own DB connection
+        archive.store(pages, borough_code=code, query=address)
+        if stats is not None:
+            for key, value in own.items():
+                stats[key] = stats.get(key, 0) + value
+        if exc is not None:
+            logger.warning("Scrape of %s failed: %r", code, exc)
+            failures.append(exc)
+
+    if failures and len(failures) == len(scrapers):
+        raise failures[0]
+
+
+def scrape_many(codes, address: str, stats: dict | None = None):
+    """
+    Search several boroughs concurrently and merge the results (see
+    stream_many). The search costs the slowest council's time rather than
+    the sum of them.
+    """
+    return [result for page in stream_many(codes, address, stats=stats) for result in page]
+
+
+@receiver(setting_changed)
+def _reset(setting, **kwargs):
+    # override_settings(PLANNING_BOROUGHS=...) swaps scrapers (load tests, stubs)
+    if setting == "PLANNING_BOROUGHS":
+        _scrapers.clear()
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from config.cache import bump_version
+
+from .models import PlanningWatch
+
+
+@receiver(post_save, sender=PlanningWatch)
+@receiver(post_delete, sender=PlanningWatch)
+def planning_watch_changed(sender, instance, **kwargs):
+    bump_version("planning_watch")
@@ -0,0 +1,103 @@
+"""
+Answer several address watches from one postcode-level council search.
+
+A council's search for a full postcode ("UB6 8JF") returns every application
+in that postcode unit, a superset of what a search for one house in it
+returns. When several watches in a borough share a postcode unit, the
+watchlist checker searches the postcode once and hands each watch the
+results whose address matches its own (house number and street):
+
+    for scrape_query, watches in plan(watches):
+        results = scrape(scrape_query)
+        for watch in watches:
+            mine = [r for r in results if covers(watch.query, r["address"])]
+"""
+import re
+from collections import defaultdict
+
+POSTCODE_RE = re.compile(r"\b([A-Z]{1,2}\d[A-Z\d]?)\s*(\d[A-Z]{2})\b")
+
+# Street-type abbreviations councils and users write either way
+ABBREVIATIONS = {
+    "RD": "ROAD",
+    "ST": "STREET",
+    "AVE": "AVENUE",
+    "AV": "AVENUE",
+    "CRES": "CRESCENT",
+    "CRESC": "CRESCENT",
+    "LN": "LANE",
+    "DR": "DRIVE",
+    "CL": "CLOSE",
+    "GDNS": "GARDENS",
+    "GRN": "GREEN",
+    "PL": "PLACE",
+    "SQ": "SQUARE",
+    "TER": "TERRACE",
+    "TCE": "TERRACE",
+    "CT": "COURT",
+}
+
+# "Flat 2" names a unit, not a street
+UNIT_WORDS = {"FLAT", "UNIT", "APARTMENT", "APT", "ROOM", "FLOOR", "MAISONETTE"}
+
+
+def postcode_unit(text: str) -> str | None:
+    """ "249 Conway Crescent, ub6 8jf" -> "UB6 8JF"; None if there is no full postcode."""
+    m = POSTCODE_RE.search((text or "").upper())
+    return f"{m.group(1)} {m.group(2)}" if m else None
+
+
+def _is_number(token: str) -> bool:
+    return any(c.isdigit() for c in token)
+
+
+def _tokens(text: str) -> list[str]:
+    words = re.findall(r"[A-Z0-9]+", POSTCODE_RE.sub(" ", (text or "").upper()))
+    return [ABBREVIATIONS.get(w, w) for w in words]
+
+
+def required_tokens(query: str) -> set[str]:
+    """
+    What a result's address must contain to belong to a watch: its house
+    and flat numbers plus the street words next to a house number
+    ("Flat 2, 249 Conway Crescent, Greenford" -> {2, 249, CONWAY, CRESCENT}).
+    A bare postcode needs nothing, so it keeps every result.
+    """
+    segments = [_tokens(s) for s in (query or "").split(",")]
+    segments = [s for s in segments if s]
+    if not segments:
+        return set()
+    numbers = {t for s in segments for t in s if _is_number(t)}
+    street = next(
+        (s for s in segments if any(_is_number(t) for t in s) and any(t not in UNIT_WORDS and not _is_number(t) for t in s)),
+        segments[0],
+    )
+    return numbers | {t for t in street if t not in UNIT_WORDS}
+
+
+def covers(query: str, address: str) -> bool:
+    return required_tokens(query) <= set(_tokens(address))
+
+
+def plan(watches) -> list[tuple[str | None, list]]:
+    """
+    Split watches into scrapes: (postcode, [watches]) for two or more
+    watches in the same borough and postcode unit, (None, [watch]) for a
+    watch that keeps its own search.
+    """
+    groups = defaultdict(list)
+    singles = []
+    for watch in watches:
+        unit = postcode_unit(watch.query)
+        if unit:
+            groups[(watch.borough_code, unit)].append(watch)
+        else:
+            singles.append(watch)
+
+    batches = [(None, [watch]) for watch in singles]
+    for (_, unit), members in groups.items():
+        if len(members) > 1:
+            batches.append((unit, members))
+        else:
+            batches.append((None, members))
+    return batches
@@ -1,3 +1,323 @@
-from django.test import TestCase
+import json
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from planning import pipeline, polling, subsumption
+from planning.models import CheckRun, FetchedPage, PageBlob, PlanningWatch
+
+# A fake council for the tests below, used as a scraper module
+# ("scraper": "planning.tests"): query -> pages of results. Pages are JSON
+# so parse_page can find the next page the way a real parser would.
+COUNCIL = {}
+FAIL_ONCE = set()
+
+
+def _results(query: str, page: int, count: int = 3, address: str = "") -> list[dict]:
+    return [
+        {"url": f"https://council.example/{query}/{page}/{i}", "address": address.format(i=i) or f"{i} {query}"}
+        for i in range(count)
+    ]
+
+
+class _Session:
+    def close(self):
+        pass
+
+
+def open_session(**options):
+    return _Session()
+
+
+def fetch_page(session, address, url, page_num, *, stats=None, archive=None, **options):
+    if address in FAIL_ONCE:
+        FAIL_ONCE.discard(address)
+        raise ConnectionError("council busy")
+    pages = COUNCIL.get(address, [[]])
+    body = json.dumps({"results": pages[page_num], "next": f"page{page_num + 2}" if page_num + 1 < len(pages) else None})
+    url = url or f"https://council.example/search?q={address}"
+    if stats is not None:
+        stats["pages"] += 1
+        stats["bytes"] += len(body)
+    if archive is not None:
+        archive.append(
+            {"url": url, "page": page_num + 1, "status_code": 200, "body": body.encode(), "fetched_at": timezone.now()}
+        )
+    return body
+
+
+def parse_page(html, **options):
+    page = json.loads(html)
+    return page["results"], page["next"]
+
+
+def parse(html, **options):
+    return parse_page(html)[0]
+
+
+def scrape(address, stats=None, **options):
+    """The whole-search scraper the stages add up to."""
+    return [result for page in COUNCIL.get(address, [[]]) for result in page]
+
+
+def whole_scrape(address, stats=None, **options):
+    """A scraper without stages, run whole by the pipeline."""
+    return scrape(address)
+
+
+BOROUGHS = {
+    "staged": {"label": "Staged", "outward_codes": ["UB6"], "scraper": "planning.tests", "alerts": True},
+    "capped": {
+        "label": "Capped",
+        "outward_codes": ["W5"],
+        "scraper": "planning.tests",
+        "scraper_options": {"max_pages": 2},
+        "alerts": True,
+    },
+    "whole": {"label": "Whole", "outward_codes": ["W7"], "scraper": "planning.tests:whole_scrape", "alerts": True},
+}
+
+
+class FakeCouncilMixin:
+    def setUp(self):
+        super().setUp()
+        COUNCIL.clear()
+        FAIL_ONCE.clear()
+        settings = override_settings(PLANNING_BOROUGHS=BOROUGHS)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # retries back off with time.sleep
+        sleep = mock.patch.object(pipeline.time, "sleep")
+        sleep.start()
+        self.addCleanup(sleep.stop)
+
+
+class SubsumptionTests(SimpleTestCase):
+    def test_postcode_unit(self):
+        self.assertEqual(subsumption.postcode_unit("249 Conway Crescent, ub6 8jf"), "UB6 8JF")
+        self.assertEqual(subsumption.postcode_unit("UB68JF"), "UB6 8JF")
+        self.assertIsNone(subsumption.postcode_unit("249 Conway Crescent, UB6"))
+
+    def test_covers(self):
+        query = "Flat 2, 249 Conway Cres, UB6 8JF"
+        self.assertTrue(subsumption.covers(query, "Flat 2 249 Conway Crescent Greenford UB6 8JF"))
+        self.assertFalse(subsumption.covers(query, "Flat 3 249 Conway Crescent Greenford UB6 8JF"))
+        self.assertFalse(subsumption.covers(query, "251 Conway Crescent Greenford UB6 8JF"))
+        # a bare postcode keeps every result
+        self.assertTrue(subsumption.covers("UB6 8JF", "1 Anywhere Road"))
+
+    def test_plan_groups_by_borough_and_postcode_unit(self):
+        def watch(query, borough="ealing"):
+            return SimpleNamespace(query=query, borough_code=borough)
+
+        a, b = watch("1 Conway Crescent, UB6 8JF"), watch("2 Conway Crescent, ub6 8jf")
+        other_borough = watch("3 Conway Crescent, UB6 8JF", borough="brent")
+        no_postcode = watch("4 Conway Crescent")
+        other_unit = watch("5 Conway Crescent, UB6 8JG")
+
+        batches = subsumption.plan([a, b, other_borough, no_postcode, other_unit])
+
+        self.assertIn(("UB6 8JF", [a, b]), batches)
+        for single in (other_borough, no_postcode, other_unit):
+            self.assertIn((None, [single]), batches)
+        self.assertEqual(len(batches), 4)
+
+
+@override_settings(PLANNING_POLL_MIN_HOURS=6, PLANNING_POLL_MAX_HOURS=336, PLANNING_POLL_BACKOFF=1.5)
+class PollingTests(TestCase):
+    def test_reschedule(self):
+        now = timezone.now()
+        watch = PlanningWatch(email="a@example.com", query="UB6 8JF", borough_code="ealing", poll_interval_hours=24)
+
+        polling.reschedule(watch, now=now)
+        self.assertEqual(watch.poll_interval_hours, 36)
+        self.assertEqual(watch.next_check_at, now + timedelta(hours=36))
+        self.assertIsNone(watch.last_changed_at)
+
+        polling.reschedule(watch, changed=True, now=now)
+        self.assertEqual(watch.poll_interval_hours, 18)
+        self.assertEqual(watch.last_changed_at, now)
+
+        # a failure retries soon without touching the learned interval
+        polling.reschedule(watch, failed=True, now=now)
+        self.assertEqual(watch.poll_interval_hours, 18)
+        self.assertEqual(watch.next_check_at, now + timedelta(hours=6))
+
+    def test_interval_is_clamped(self):
+        self.assertEqual(polling.next_interval(8, changed=True), 6)
+        self.assertEqual(polling.next_interval(300, changed=False), 336)
+
+    def test_due(self):
+        now = timezone.now()
+        never = PlanningWatch.objects.create(email="a@example.com", query="a", borough_code="ealing")
+        overdue = PlanningWatch.objects.create(
+            email="a@example.com", query="b", borough_code="ealing", next_check_at=now - timedelta(minutes=1)
+        )
+        PlanningWatch.objects.create(
+            email="a@example.com", query="c", borough_code="ealing", next_check_at=now + timedelta(hours=1)
+        )
+        self.assertEqual(set(polling.due(PlanningWatch.objects.all(), now=now)), {never, overdue})
+
+
+class PipelineTests(FakeCouncilMixin, SimpleTestCase):
+    def test_results_match_whole_scrape(self):
+        for n in range(12):
+            COUNCIL[f"Q{n}"] = [_results(f"Q{n}", page) for page in range(n % 4 + 1)]
+        searches = [("staged", query) for query in COUNCIL] + [("whole", "Q5")]
+
+        jobs = list(pipeline.run(searches, fetchers=3, parsers=0, backlog=2, archive=True))
+
+        self.assertEqual(sorted(job.index for job in jobs), list(range(len(searches))))
+        for job in jobs:
+            self.assertIsNone(job.error)
+            self.assertEqual(job.results, scrape(job.query))
+            self.assertFalse(job.truncated)
+            if job.borough_code == "staged":
+                pages = len(COUNCIL[job.query])
+                self.assertEqual(job.stats["pages"], pages)
+                self.assertEqual([p["page"] for p in job.archive], list(range(1, pages + 1)))
+
+    def test_retry_and_errors(self):
+        COUNCIL["FLAKY"] = [_results("FLAKY", 0)]
+        FAIL_ONCE.add("FLAKY")
+
+        with self.assertLogs("planning.pipeline", "WARNING"):
+            jobs = {job.query: job for job in pipeline.run([("staged", "FLAKY"), ("nowhere", "X")], parsers=0)}
+
+        self.assertIsNone(jobs["FLAKY"].error)
+        self.assertEqual(jobs["FLAKY"].stats["retries"], 1)
+        self.assertEqual(jobs["FLAKY"].results, scrape("FLAKY"))
+        self.assertIsInstance(jobs["X"].error, RuntimeError)
+
+    def test_page_cap(self):
+        COUNCIL["LONG"] = [_results("LONG", page) for page in range(3)]
+        COUNCIL["SHORT"] = [_results("SHORT", page) for page in range(2)]
+
+        jobs = {job.query: job for job in pipeline.run([("capped", "LONG"), ("capped", "SHORT")], parsers=0)}
+
+        self.assertTrue(jobs["LONG"].truncated)
+        self.assertEqual(jobs["LONG"].results, scrape("LONG")[:6])
+        self.assertFalse(jobs["SHORT"].truncated)
+
+
+class WatchlistTests(FakeCouncilMixin, TestCase):
+    def _watch(self, query, borough="staged"):
+        return PlanningWatch.objects.create(email="a@example.com", query=query, borough_code=borough)
+
+    def _check(self):
+        call_command("check_planning_watchlist", "--all", "--parsers", "0", stdout=StringIO())
+
+    def test_grouped_watches_match_separate_searches(self):
+        COUNCIL["UB6 8JF"] = [
+            _results("UB6 8JF", 0, address="{i} Conway Crescent UB6 8JF"),
+            _results("UB6 8JF", 1, address="{i} Conway Crescent UB6 8JF"),
+        ]
+        first, second = self._watch("1 Conway Crescent, UB6 8JF"), self._watch("2 Conway Crescent, UB6 8JF")
+        self._check()
+
+        for watch in (first, second):
+            watch.refresh_from_db()
+            expected = {r["url"] for r in scrape("UB6 8JF") if subsumption.covers(watch.query, r["address"])}
+            self.assertEqual(set(watch.last_seen_urls), expected)
+            self.assertEqual(len(expected), 2)
+            self.assertEqual(watch.baseline_query, "UB6 8JF")
+        self.assertEqual(CheckRun.objects.get().pages_fetched, 2)
+
+        # a new application for the first address emails only its watcher
+        COUNCIL["UB6 8JF"][1].append({"url": "https://council.example/new", "address": "1 Conway Crescent UB6 8JF"})
+        self._check()
+        self.assertEqual(len(mail.outbox), 1)
+        first.refresh_from_db()
+        self.assertIn("https://council.example/new", first.last_seen_urls)
+
+    def test_moving_onto_a_postcode_search_emails_new_applications(self):
+        query = "1 Conway Crescent, UB6 8JF"
+        COUNCIL[query] = [[{"url": "https://council.example/old", "address": "1 Conway Crescent UB6 8JF"}]]
+        first = self._watch(query)
+        self._check()
+
+        # a neighbour's watch moves the first onto the postcode search, on
+        # the same run as a new application for its address
+        COUNCIL["UB6 8JF"] = [
+            [
+                {"url": "https://council.example/old", "address": "1 Conway Crescent UB6 8JF"},
+                {"url": "https://council.example/new", "address": "1 Conway Crescent UB6 8JF"},
+                {"url": "https://council.example/next-door", "address": "2 Conway Crescent UB6 8JF"},
+            ]
+        ]
+        self._watch("2 Conway Crescent, UB6 8JF")
+        self._check()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("https://council.example/new", mail.outbox[0].body)
+        first.refresh_from_db()
+        self.assertEqual(first.baseline_query, "UB6 8JF")
+        self.assertEqual(set(first.last_seen_urls), {"https://council.example/old", "https://council.example/new"})
+
+    def test_capped_postcode_search_falls_back_to_each_watch(self):
+        COUNCIL["W5 1AA"] = [_results("W5 1AA", page, address="{i} High Street W5 1AA") for page in range(3)]
+        for n in (1, 2):
+            COUNCIL[f"{n} High Street, W5 1AA"] = [_results(f"own{n}", 0)]
+        watches = [self._watch(f"{n} High Street, W5 1AA", borough="capped") for n in (1, 2)]
+
+        with self.assertLogs("planning", "WARNING"):
+            self._check()
+
+        for watch in watches:
+            watch.refresh_from_db()
+            self.assertEqual(watch.baseline_query, watch.query)
+            self.assertEqual(set(watch.last_seen_urls), {r["url"] for r in scrape(watch.query)})
+
+    @override_settings(PLANNING_ARCHIVE_PAGES=True)
+    def test_reparse_archive_rebuilds_watches(self):
+        COUNCIL["UB6 8JF"] = [_results("UB6 8JF", 0, address="{i} Conway Crescent UB6 8JF")]
+        COUNCIL["10 Other Road"] = [_results("other", 0), _results("other", 1)]
+        watches = [
+            self._watch("1 Conway Crescent, UB6 8JF"),
+            self._watch("2 Conway Crescent, UB6 8JF"),
+            self._watch("10 Other Road"),
+        ]
+        self._check()
+        self.assertEqual(FetchedPage.objects.count(), 3)
+        live = {w.pk: (set(w.last_seen_urls), w.baseline_query) for w in PlanningWatch.objects.all()}
+
+        PlanningWatch.objects.update(last_seen_urls=[], baseline_query="")
+        # the grouped watches' baseline is what tells reparse which search they came from
+        PlanningWatch.objects.filter(pk__in=[watches[0].pk, watches[1].pk]).update(baseline_query="UB6 8JF")
+        call_command("reparse_archive", "--update-watches", "--parsers", "0", stdout=StringIO())
+
+        rebuilt = {w.pk: (set(w.last_seen_urls), w.baseline_query) for w in PlanningWatch.objects.all()}
+        self.assertEqual(rebuilt, live)
+
+    @override_settings(PLANNING_ARCHIVE_PAGES=True)
+    def test_reparse_archive_uses_latest_scrape_and_prunes(self):
+        COUNCIL["10 Other Road"] = [_results("old", 0)]
+        watch = self._watch("10 Other Road")
+        self._check()
+        old_fetch = FetchedPage.objects.get().fetch_id
+        COUNCIL["10 Other Road"] = [_results("other", 0), _results("other", 1)]
+        self._check()
+        FetchedPage.objects.filter(fetch_id=old_fetch).update(fetched_at=timezone.now() - timedelta(days=30))
+        watch.refresh_from_db()
+        latest = set(watch.last_seen_urls)
+
+        PlanningWatch.objects.update(last_seen_urls=[])
+        output = self.enterContext(tempfile.NamedTemporaryFile("r", suffix=".jsonl"))
+        call_command(
+            "reparse_archive", "--update-watches", "--output", output.name, "--parsers", "0", stdout=StringIO()
+        )
+        watch.refresh_from_db()
+        self.assertEqual(set(watch.last_seen_urls), latest)
+        self.assertEqual(sorted(len(json.loads(line)["pages"]) for line in output), [1, 2])
+
+        call_command("reparse_archive", "--prune-days", "7", stdout=StringIO())
+        self.assertEqual(FetchedPage.objects.filter(fetch_id=old_fetch).count(), 0)
+        self.assertEqual(FetchedPage.objects.count(), 2)
+        self.assertEqual(PageBlob.objects.count(), 2)  # the old scrape's body went with it
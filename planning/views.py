@@ -1,82 +1,75 @@
 import re
 import logging
+from datetime import datetime, timezone as dt_timezone
 
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.shortcuts import render
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.http import JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
+from django.views.decorators.vary import vary_on_cookie
 from django.db import transaction
 from django.core.mail import send_mail
 
+from config.cache import data_version, etag, tiered
+
 from .forms import AddressSearchForm
 from .models import PlanningWatch
-from .scrapers import ealing, croydon
+from .scrapers import registry
 from .tasks import send_planning_alert_email
 
 
 
 logger = logging.getLogger(__name__)
 
-SCRAPERS = {
-    "ealing": ealing.scrape,
-    "croydon": croydon.scrape,
-}
-
-BOROUGH_LABELS = {
-    "ealing": "London Borough of Ealing",
-    "croydon": "London Borough of Croydon",
-}
-
 
 def detect_borough_from_text(text: str):
     """
-    Very simple postcode-based borough detection.
-    Currently supports common outward codes for Ealing and Croydon.
+    Very simple postcode-based borough detection, driven by the outward
+    codes listed in settings.PLANNING_BOROUGHS.
     """
     t = (text or "").upper()
+    return tiered("borough").get_or_set(t, lambda: _detect_borough(t))
+
 
+def _outward_code(t: str):
     # basic UK postcode regex – we only care about the outward code (first bit)
     m = re.search(r"\b([A-Z]{1,2}\d[A-Z\d]?)\s*\d[A-Z]{2}\b", t)
-    if not m:
+    return m.group(1) if m else None  # e.g. UB6, W5, CR0, CR7
+
+
+def _detect_borough(t: str):
+    outward = _outward_code(t)
+    if not outward:
         return None, None
 
-    outward = m.group(1)  # e.g. UB6, W5, CR0, CR7
-
-    outward_to_borough = {
-        # Ealing postcodes
-        "UB1": "ealing",
-        "UB2": "ealing",
-        "UB5": "ealing",
-        "UB6": "ealing",
-        "W3": "ealing",
-        "W5": "ealing",
-        "W7": "ealing",
-        "W13": "ealing",
-        # Croydon postcodes
-        "CR0": "croydon",
-        "CR2": "croydon",
-        "CR4": "croydon",
-        "CR7": "croydon",
-        "CR8": "croydon",
-    }
-
-    borough_code = outward_to_borough.get(outward)
-    borough_label = BOROUGH_LABELS.get(borough_code)
+    borough_code = registry.outward_code_map().get(outward)
+    borough_label = registry.borough_label(borough_code)
     return borough_code, borough_label
 
 
-def _run_search(address: str):
+def _supported_boroughs_text() -> str:
+    return " and ".join(
+        f"{b['label']} ({', '.join(b['outward_codes'])})"
+        for b in registry.boroughs().values()
+    )
+
+
+def _alerts_supported(borough_code) -> bool:
+    borough = registry.get_borough(borough_code)
+    return bool(borough and borough.get("alerts"))
+
+
+def _resolve_search(address: str):
     """
-    Shared search logic used by planning_search (GET+POST).
+    Which councils to search for an address.
     Returns:
-        (all_results, borough_code, borough_label, error_message, croydon_manual_url)
+        (codes, borough_code, borough_label, error_message, manual_url)
     """
-    all_results = []
-    error = None
-    croydon_manual_url = None
-
     borough_code, borough_label = detect_borough_from_text(address)
 
     if not borough_code:
@@ -86,28 +79,33 @@ def _run_search(address: str):
             None,
             (
                 "Couldn't determine the borough from that postcode. "
-                "Right now this tool supports Ealing (UB1, UB2, UB5, UB6, "
-                "W3, W5, W7, W13) and Croydon (CR0, CR2, CR4, CR7, CR8)."
+                f"Right now this tool supports {_supported_boroughs_text()}."
             ),
             None,
         )
 
-    # Croydon blocks automated access
-    if borough_code == "croydon":
+    # Postcodes near a boundary can belong to several councils; search every
+    # one that allows it (some councils block automated access)
+    codes = [
+        code for code in registry.candidates(_outward_code((address or "").upper()))
+        if not registry.get_borough(code).get("manual_url")
+    ]
+    borough = registry.get_borough(borough_code)
+    if not codes:
         return (
             [],
-            "croydon",
+            borough_code,
             borough_label,
             (
-                "The Croydon planning website blocks automated access, "
+                f"The {borough_label} planning website blocks automated access, "
                 "so results can't be shown here. "
-                "Please use the Croydon public access site directly."
+                "Please use the council's public access site directly."
             ),
-            "https://publicaccess3.croydon.gov.uk/online-applications/",
+            borough["manual_url"],
         )
 
-    scrape_fn = SCRAPERS.get(borough_code)
-    if not scrape_fn:
+    borough_label = " and ".join(registry.borough_label(code) for code in codes)
+    if not any(registry.get_scraper(code) for code in codes):
         return (
             [],
             borough_code,
@@ -116,8 +114,25 @@ def _run_search(address: str):
             None,
         )
 
+    return codes, borough_code, borough_label, None, None
+
+
+def _run_search(address: str):
+    """
+    Shared search logic used by planning_search (GET+POST).
+    Returns:
+        (all_results, borough_code, borough_label, error_message, manual_url)
+    """
+    codes, borough_code, borough_label, error, manual_url = _resolve_search(address)
+    if error:
+        return [], borough_code, borough_label, error, manual_url
+
     try:
-        all_results = scrape_fn(address)
+        entry = tiered("scrape").get_or_set(
+            _scrape_key(borough_code, address),
+            lambda: {"fetched_at": timezone.now(), "results": registry.scrape_many(codes, address)},
+        )
+        all_results = entry["results"]
     except Exception as exc:
         logger.exception("SCRAPER ERROR: %r", exc)
         return (
@@ -131,13 +146,114 @@ def _run_search(address: str):
     return all_results, borough_code, borough_label, None, None
 
 
+# Stands in for the results card while search.html is split for streaming
+_STREAM_MARKER = "__PLANNING_RESULTS_STREAM__"
+
+
+def _stream_search(request, form, address: str):
+    """
+    A StreamingHttpResponse for a search that isn't cached yet: the page
+    shell goes out at once and results follow as each council page is
+    parsed, instead of after the whole scrape. None when the results are
+    already cached or the address can't be searched (the normal render then
+    shows the results or the error).
+    """
+    codes, borough_code, borough_label, error, _ = _resolve_search(address)
+    if error:
+        return None
+    key = _scrape_key(borough_code, address)
+    if tiered("scrape").get(key) is not None:
+        return None
+
+    context = {"borough_label": borough_label, "last_query": address}
+    page = render_to_string(
+        "planning/search.html",
+        {"form": form, "results_html": _STREAM_MARKER, **context},
+        request=request,
+    )
+    head, tail = page.split(_STREAM_MARKER, 1)
+
+    def chunks():
+        yield head
+        yield render_to_string("planning/_results_stream_head.html", context)
+
+        # the same lock as get_or_set, so concurrent requests and double
+        # submits for an address scrape the council once
+        scrapes = tiered("scrape")
+        locked = scrapes.lock(key)
+        results, failed = [], False
+        try:
+            entry = None if locked else scrapes.wait(key)
+            if entry is not None:
+                results = entry["results"]
+                yield "".join(render_to_string("planning/_result_item.html", {"r": r}) for r in results)
+            else:
+                for batch in registry.stream_many(codes, address):
+                    results.extend(batch)
+                    yield "".join(render_to_string("planning/_result_item.html", {"r": r}) for r in batch)
+                scrapes.set(key, {"fetched_at": timezone.now(), "results": results})
+        except Exception as exc:
+            logger.exception("SCRAPER ERROR: %r", exc)
+            failed = True
+        finally:
+            if locked:
+                scrapes.unlock(key)
+
+        yield render_to_string(
+            "planning/_results_stream_foot.html",
+            {**context, "count": len(results), "failed": failed},
+        )
+        yield tail
+
+    response = StreamingHttpResponse(chunks(), content_type="text/html; charset=utf-8")
+    response["X-Accel-Buffering"] = "no"  # let nginx-style proxies pass chunks straight through
+    return response
+
+
+def _scrape_key(borough_code: str, address: str):
+    return borough_code, " ".join(address.lower().split())
+
+
+def _cached_scrape(request):
+    """The cached scrape behind a GET results page, if there is one."""
+    q = request.GET.get("q")
+    if request.method not in ("GET", "HEAD") or not q:
+        return None
+    borough_code, _ = detect_borough_from_text(q)
+    if not borough_code:
+        return None
+    return tiered("scrape").get(_scrape_key(borough_code, q))
+
+
+def _search_etag(request):
+    entry = _cached_scrape(request)
+    if entry is None:
+        return None
+    return etag(
+        _scrape_key("", request.GET["q"]),
+        request.GET.get("page", "1"),
+        entry["fetched_at"].isoformat(),
+        # the page embeds a CSRF token; a new cookie needs a fresh render
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ""),
+    )
+
+
+def _search_last_modified(request):
+    entry = _cached_scrape(request)
+    return entry["fetched_at"] if entry else None
+
+
+@vary_on_cookie
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_search_etag, last_modified_func=_search_last_modified)
 def planning_search(request):
     results_page = None
+    results_html = None
     error = None
     success = None
     borough_label = None
     last_query = None
-    croydon_manual_url = None
+    manual_url = None
 
     # -----------------------------
     # POST: search OR create alert
@@ -154,8 +270,8 @@ def planning_search(request):
 
             # ---- CREATE ALERT ----
             if action == "create_alert":
-                if borough_code != "ealing":
-                    error = "Alerts are currently only supported for Ealing postcodes."
+                if not _alerts_supported(borough_code):
+                    error = "Alerts are not yet supported for this borough."
                 else:
                     # 1) DB write FIRST
                     PlanningWatch.objects.get_or_create(
@@ -180,7 +296,7 @@ def planning_search(request):
                         logger.exception("Email send failed (non-fatal): %r", exc)
 
                 # After creating alert, keep results visible by running search too
-                all_results, _, borough_label, search_error, croydon_manual_url = _run_search(address)
+                all_results, _, borough_label, search_error, manual_url = _run_search(address)
                 if search_error:
                     error = search_error
                 elif all_results:
@@ -189,7 +305,10 @@ def planning_search(request):
 
             # ---- SEARCH ----
             else:
-                all_results, _, borough_label, error, croydon_manual_url = _run_search(address)
+                streamed = _stream_search(request, form, address)
+                if streamed is not None:
+                    return streamed
+                all_results, _, borough_label, error, manual_url = _run_search(address)
                 if not error and all_results:
                     paginator = Paginator(all_results, 20)
                     results_page = paginator.get_page(1)
@@ -201,12 +320,26 @@ def planning_search(request):
         q = request.GET.get("q")
         page_number = request.GET.get("page", 1)
 
+        if q and page_number in (1, "1"):
+            streamed = _stream_search(request, AddressSearchForm(initial={"address": q}), q)
+            if streamed is not None:
+                return streamed
+
         if q:
             last_query = q
-            all_results, _, borough_label, error, croydon_manual_url = _run_search(q)
+            all_results, _, borough_label, error, manual_url = _run_search(q)
             if not error and all_results:
                 paginator = Paginator(all_results, 20)
                 results_page = paginator.get_page(page_number)
+                entry = _cached_scrape(request)
+                if entry is not None:
+                    results_html = tiered("fragments").get_or_set(
+                        ("planning_results", _scrape_key("", q), entry["fetched_at"], results_page.number, borough_label),
+                        lambda: render_to_string(
+                            "planning/_results.html",
+                            {"results_page": results_page, "borough_label": borough_label, "last_query": q},
+                        ),
+                    )
 
         form = AddressSearchForm(initial={"address": last_query} if last_query else None)
 
@@ -216,16 +349,28 @@ def planning_search(request):
         {
             "form": form,
             "results_page": results_page,
+            "results_html": results_html,
             "error": error,
             "success": success,
             "borough_label": borough_label,
             "last_query": last_query,
-            "croydon_manual_url": croydon_manual_url,
+            "manual_url": manual_url,
         },
     )
 
 
+def _watch_list_etag(request):
+    return etag(request.user.pk, data_version("planning_watch"))
+
+
+def _watch_list_last_modified(request):
+    return datetime.fromtimestamp(data_version("planning_watch") / 1e9, tz=dt_timezone.utc)
+
+
 @login_required
+@vary_on_cookie
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_watch_list_etag, last_modified_func=_watch_list_last_modified)
 def watch_list(request):
     watches = PlanningWatch.objects.order_by("-created_at")
     return render(request, "planning/watch_list.html", {"watches": watches})
@@ -240,8 +385,8 @@ def create_alert(request):
     email = (request.POST.get("email") or "cain@bridgeparkcapital.co.uk").strip()
 
     borough_code, borough_label = detect_borough_from_text(address)
-    if borough_code != "ealing":
-        return JsonResponse({"ok": False, "error": "Alerts are only supported for Ealing postcodes."}, status=400)
+    if not _alerts_supported(borough_code):
+        return JsonResponse({"ok": False, "error": "Alerts are not yet supported for this borough."}, status=400)
 
     PlanningWatch.objects.get_or_create(
         email=email,
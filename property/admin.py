@@ -1,3 +1,92 @@
 from django.contrib import admin
 
-# Register your models here.
+from config.admin import LargeTableAdmin
+
+from .models import ArchivedListing, InboundEmail, Listing, SavedSearch, SearchMatch, ShortlistItem
+
+
+class NotifiedFilter(admin.SimpleListFilter):
+    """Pending digest matches, served by searchmatch_pending_idx."""
+
+    title = "notified"
+    parameter_name = "notified"
+
+    def lookups(self, request, model_admin):
+        return [("0", "Waiting for digest"), ("1", "Notified")]
+
+    def queryset(self, request, queryset):
+        if self.value() in ("0", "1"):
+            return queryset.filter(notified_at__isnull=self.value() == "0")
+        return queryset
+
+
+class ProcessedFilter(admin.SimpleListFilter):
+    """Queued inbound emails, served by inboundemail_queue_idx."""
+
+    title = "processed"
+    parameter_name = "processed"
+
+    def lookups(self, request, model_admin):
+        return [("0", "Queued"), ("1", "Processed")]
+
+    def queryset(self, request, queryset):
+        if self.value() in ("0", "1"):
+            return queryset.filter(processed_at__isnull=self.value() == "0")
+        return queryset
+
+
+@admin.register(SavedSearch)
+class SavedSearchAdmin(LargeTableAdmin):
+    list_display = ("name", "user", "portal", "alert_frequency", "created_at")
+    list_filter = ("portal", "alert_frequency")
+    search_fields = ("name", "user__email")
+    list_select_related = ("user",)
+    autocomplete_fields = ("user",)
+
+
+@admin.register(Listing)
+class ListingAdmin(LargeTableAdmin):
+    list_display = ("title", "portal", "postcode", "price", "bedrooms", "first_seen", "last_seen", "is_active")
+    # portal/is_active with newest-first ordering match the partial inbox indexes
+    list_filter = ("portal", "is_active")
+    ordering = ("-first_seen", "-id")
+    exact_search_field = "canonical_url"
+    search_help_text = "Exact listing URL."
+
+
+@admin.register(ArchivedListing)
+class ArchivedListingAdmin(LargeTableAdmin):
+    list_display = ("title", "portal", "postcode", "price", "listing_id", "last_seen", "archived_at")
+    list_filter = ("portal",)
+    exact_search_field = "listing_id"
+    search_help_text = "Listing id the row had before it was archived."
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(SearchMatch)
+class SearchMatchAdmin(LargeTableAdmin):
+    list_display = ("saved_search", "listing", "matched_at", "notified_at")
+    list_filter = (NotifiedFilter,)
+    list_select_related = ("saved_search", "listing")
+    raw_id_fields = ("saved_search", "listing")
+
+
+@admin.register(ShortlistItem)
+class ShortlistItemAdmin(LargeTableAdmin):
+    list_display = ("listing", "user", "created_at")
+    list_select_related = ("listing", "user")
+    raw_id_fields = ("listing",)
+    autocomplete_fields = ("user",)
+
+
+@admin.register(InboundEmail)
+class InboundEmailAdmin(LargeTableAdmin):
+    list_display = ("idempotency_key", "received_at", "processed_at", "attempts", "next_attempt_at", "last_error")
+    list_filter = (ProcessedFilter,)
+    exact_search_field = "idempotency_key"
+    readonly_fields = ("idempotency_key", "payload", "received_at")
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,225 @@
+"""
+Postcode centroids and radius matching for saved searches.
+
+Centroids are bundled per outward code (data/outcode_centroids.csv) and
+loaded once into NumPy arrays. Saved-search circles are registered in a
+lat/lon grid, so a batch of listings is matched by looking up each listing's
+cell and computing distances to that cell's circles in one vectorised step.
+
+NumPy is imported where it is used: web workers import this module (for
+outward_code and the services) long before they match anything.
+"""
+import csv
+import math
+import re
+from collections import defaultdict
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+CENTROIDS_CSV = Path(__file__).resolve().parent / "data" / "outcode_centroids.csv"
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEG_LAT = 69.0
+CELL_DEG = 0.05   # grid cell edge, roughly 3.5 miles north-south
+MAX_CELLS = 400   # circles wider than this are checked against every listing
+
+_OUTWARD_RE = re.compile(r"[A-Z]{1,2}\d[A-Z\d]?")
+
+
+def outward_code(postcode: str) -> str:
+    pc = re.sub(r"\s+", "", (postcode or "").upper())
+    outward = pc[:-3] if len(pc) >= 5 else pc
+    return outward if _OUTWARD_RE.fullmatch(outward) else ""
+
+
+def haversine_miles(lat1, lon1, lat2, lon2):
+    """Great-circle distance; arguments in radians, broadcast like NumPy ufuncs."""
+    import numpy as np
+
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(a))
+
+
+class Centroids:
+    def __init__(self, path: Path = CENTROIDS_CSV):
+        import numpy as np
+
+        with open(path, newline="") as fh:
+            rows = list(csv.DictReader(fh))
+        self._row = {r["outcode"]: i for i, r in enumerate(rows)}
+        self.lat = np.radians(np.array([float(r["lat"]) for r in rows]))
+        self.lon = np.radians(np.array([float(r["lon"]) for r in rows]))
+
+    def _lookup(self, postcode: str):
+        outward = outward_code(postcode)
+        i = self._row.get(outward)
+        if i is None and outward[-1:].isalpha():
+            # Central London sub-districts (SW1A, EC1V...) fall back to the district.
+            i = self._row.get(outward[:-1])
+        return i
+
+    def locate(self, postcodes) -> tuple["np.ndarray", "np.ndarray"]:
+        """(lat, lon) in radians for each postcode; NaN where unknown."""
+        import numpy as np
+
+        rows = np.array([self._lookup(pc) if pc else None for pc in postcodes], dtype=object)
+        found = np.array([r is not None for r in rows], dtype=bool)
+        lat = np.full(len(rows), np.nan)
+        lon = np.full(len(rows), np.nan)
+        if found.any():
+            idx = rows[found].astype(np.int64)
+            lat[found] = self.lat[idx]
+            lon[found] = self.lon[idx]
+        return lat, lon
+
+
+_centroids = None
+
+
+def centroids() -> Centroids:
+    global _centroids
+    if _centroids is None:
+        _centroids = Centroids()
+    return _centroids
+
+
+def within_radius(postcodes, centre_postcode: str, radius_miles) -> "np.ndarray":
+    """
+    Boolean mask of postcodes inside the circle. Postcodes we cannot place
+    pass, and so does everything if the centre itself is unknown.
+    """
+    import numpy as np
+
+    lat, lon = centroids().locate(postcodes)
+    clat, clon = centroids().locate([centre_postcode])
+    if radius_miles is None or np.isnan(clat[0]):
+        return np.ones(len(lat), dtype=bool)
+    with np.errstate(invalid="ignore"):
+        inside = haversine_miles(lat, lon, clat[0], clon[0]) <= radius_miles
+    return inside | np.isnan(lat)
+
+
+def _cell(lat_deg: float, lon_deg: float) -> tuple[int, int]:
+    return math.floor(lat_deg / CELL_DEG), math.floor(lon_deg / CELL_DEG)
+
+
+class RadiusIndex:
+    """Saved-search circles bucketed into a lat/lon grid."""
+
+    def __init__(self):
+        self._circles = {}               # search_id -> (lat, lon, radius_miles, cells)
+        self._cells = defaultdict(set)   # (row, col) -> search ids
+        self._wide = set()
+        self._arrays = {}                # (row, col) -> cached candidate arrays
+
+    def __contains__(self, search_id) -> bool:
+        return search_id in self._circles
+
+    def add(self, search_id: int, postcode: str, radius_miles) -> None:
+        import numpy as np
+
+        self.remove(search_id)
+        if not postcode or radius_miles is None:
+            return
+        lat, lon = centroids().locate([postcode])
+        if np.isnan(lat[0]):
+            return
+        lat, lon = float(lat[0]), float(lon[0])
+
+        dlat = radius_miles / MILES_PER_DEG_LAT
+        dlon = dlat / max(math.cos(lat), 0.01)
+        lo = _cell(math.degrees(lat) - dlat, math.degrees(lon) - dlon)
+        hi = _cell(math.degrees(lat) + dlat, math.degrees(lon) + dlon)
+        cells = [(r, c) for r in range(lo[0], hi[0] + 1) for c in range(lo[1], hi[1] + 1)]
+
+        if len(cells) > MAX_CELLS:
+            cells = None
+            self._wide.add(search_id)
+            self._arrays.clear()
+        else:
+            for cell in cells:
+                self._cells[cell].add(search_id)
+                self._arrays.pop(cell, None)
+        self._circles[search_id] = (lat, lon, float(radius_miles), cells)
+
+    def remove(self, search_id: int) -> None:
+        circle = self._circles.pop(search_id, None)
+        if circle is None:
+            return
+        cells = circle[3]
+        if cells is None:
+            self._wide.discard(search_id)
+            self._arrays.clear()
+            return
+        for cell in cells:
+            self._cells[cell].discard(search_id)
+            if not self._cells[cell]:
+                del self._cells[cell]
+            self._arrays.pop(cell, None)
+
+    def _candidates(self, cell):
+        import numpy as np
+
+        arrays = self._arrays.get(cell)
+        if arrays is None:
+            ids = sorted(self._cells.get(cell, set()) | self._wide)
+            arrays = (
+                np.array(ids, dtype=np.int64),
+                np.array([self._circles[i][0] for i in ids]),
+                np.array([self._circles[i][1] for i in ids]),
+                np.array([self._circles[i][2] for i in ids]),
+            )
+            self._arrays[cell] = arrays
+        return arrays
+
+    def within(self, lat: "np.ndarray", lon: "np.ndarray") -> list:
+        """
+        For each point (radians), the set of search ids whose circle contains
+        it, or None where the point is unknown (NaN).
+        """
+        import numpy as np
+
+        result = [None] * len(lat)
+        known = np.nonzero(~np.isnan(lat))[0]
+        if not known.size:
+            return result
+
+        # Listings are placed by postcode centroid, so a batch holds far fewer
+        # distinct points than listings; work per point and share the (read-only) sets.
+        points, point_of = np.unique(np.stack([lat[known], lon[known]], axis=1), axis=0, return_inverse=True)
+        near = self._within_points(points[:, 0], points[:, 1])
+        for i, p in zip(known, point_of.reshape(-1)):
+            result[i] = near[p]
+        return result
+
+    def _within_points(self, lat: "np.ndarray", lon: "np.ndarray") -> list[set]:
+        import numpy as np
+
+        result = [set() for _ in range(len(lat))]
+        if not self._circles:
+            return result
+
+        rows = np.floor(np.degrees(lat) / CELL_DEG).astype(np.int64)
+        cols = np.floor(np.degrees(lon) / CELL_DEG).astype(np.int64)
+        cells, inverse = np.unique(np.stack([rows, cols], axis=1), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.cumsum(np.bincount(inverse, minlength=len(cells)))
+
+        start = 0
+        for k, (r, c) in enumerate(cells):
+            members = order[start:bounds[k]]
+            start = bounds[k]
+            ids, clat, clon, crad = self._candidates((int(r), int(c)))
+            if not ids.size:
+                continue
+            inside = haversine_miles(lat[members, None], lon[members, None], clat[None, :], clon[None, :]) <= crad
+            for i, row in zip(members, inside):
+                result[i] = set(ids[row].tolist())
+        return result
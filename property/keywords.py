@@ -0,0 +1,124 @@
+"""
+Aho-Corasick automaton over saved-search keywords.
+
+Every keyword of every indexed search goes into one trie. Scanning a listing's
+text walks the automaton once and reports each keyword it contains, so the cost
+depends on the text length and the number of hits, not on how many searches
+exist. New keywords are inserted into the trie in place; failure links are
+recomputed lazily on the next scan, and only when the keyword set changed.
+A keyword no search uses any more is dropped; once dropped keywords outnumber
+live ones the trie is rebuilt, so churn doesn't grow it without bound.
+"""
+from collections import Counter, defaultdict, deque
+
+
+class KeywordMatcher:
+    def __init__(self):
+        self._goto = [{}]        # node -> {char: child node}
+        self._fail = [0]
+        self._terminal = [None]  # keyword ending exactly at node
+        self._out = [()]         # keywords ending at node, via failure links
+        self._stale = False
+        self._dropped = 0        # keywords unmarked in the trie since it was built
+
+        self._keywords = {}                  # search_id -> frozenset of keywords
+        self._searches = defaultdict(set)    # keyword -> search ids
+
+    def __contains__(self, search_id) -> bool:
+        """True if the search has keywords (searches without any accept every listing)."""
+        return search_id in self._keywords
+
+    def add(self, search_id: int, keywords) -> None:
+        self.remove(search_id)
+        kws = frozenset(kw.lower() for kw in keywords or [] if kw)
+        if not kws:
+            return
+        self._keywords[search_id] = kws
+        for kw in kws:
+            if kw not in self._searches:
+                self._insert(kw)
+            self._searches[kw].add(search_id)
+
+    def remove(self, search_id: int) -> None:
+        for kw in self._keywords.pop(search_id, ()):
+            self._searches[kw].discard(search_id)
+            if not self._searches[kw]:
+                del self._searches[kw]
+                self._unmark(kw)
+        if self._dropped > len(self._searches):
+            self._rebuild()
+
+    def _unmark(self, kw: str) -> None:
+        # The nodes stay until the next rebuild; the keyword just stops reporting.
+        node = 0
+        for ch in kw:
+            node = self._goto[node][ch]
+        self._terminal[node] = None
+        self._dropped += 1
+        self._stale = True
+
+    def _rebuild(self) -> None:
+        self._goto, self._fail, self._terminal, self._out = [{}], [0], [None], [()]
+        self._dropped = 0
+        for kw in self._searches:
+            self._insert(kw)
+        self._stale = True
+
+    def _insert(self, kw: str) -> None:
+        node = 0
+        for ch in kw:
+            child = self._goto[node].get(ch)
+            if child is None:
+                child = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._terminal.append(None)
+                self._out.append(())
+                self._goto[node][ch] = child
+            node = child
+        self._terminal[node] = kw
+        self._stale = True
+
+    def _link(self) -> None:
+        queue = deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            self._out[child] = (self._terminal[child],) if self._terminal[child] else ()
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[child] = self._goto[f].get(ch, 0)
+                own = (self._terminal[child],) if self._terminal[child] else ()
+                self._out[child] = own + self._out[self._fail[child]]
+                queue.append(child)
+
+        self._stale = False
+
+    def scan(self, text: str) -> set[str]:
+        """Keywords that occur in text (case-insensitive substring match)."""
+        if self._stale:
+            self._link()
+        goto, fail, out = self._goto, self._fail, self._out
+
+        found = set()
+        node = 0
+        for ch in text.lower():
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+    def satisfied(self, text: str) -> set[int]:
+        """Ids of keyword searches whose keywords all occur in text."""
+        hits = Counter()
+        for kw in self.scan(text):
+            for search_id in self._searches.get(kw, ()):
+                hits[search_id] += 1
+        return {sid for sid, n in hits.items() if n == len(self._keywords[sid])}
@@ -0,0 +1,424 @@
+import csv
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from property import geo, matching
+from property.models import AlertFrequency, InboundEmail, Listing, Portal, SavedSearch
+from property.services import listing_matches, notify_instant_matches, process_inbound_queue, queue_inbound_email
+
+WEBHOOK_SECRET = "bench"
+
+KEYWORDS = ["garden", "parking", "garage", "balcony", "freehold", "detached", "period", "chain free", "loft", "station"]
+PROPERTY_TYPES = ["flat", "maisonette", "terraced house", "semi-detached house", "detached house", "bungalow"]
+STREETS = ["High Street", "Station Road", "Church Lane", "Park Avenue", "Victoria Road", "Mill Lane", "The Green"]
+
+
+def _outcodes() -> list[str]:
+    with open(geo.CENTROIDS_CSV, newline="") as fh:
+        return [row["outcode"] for row in csv.DictReader(fh)]
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def _kib(value) -> str:
+    return "n/a" if value is None else f"{value} KiB"
+
+
+def _batch_sizes(value: str) -> list[int]:
+    try:
+        sizes = [int(v) for v in value.split(",") if v.strip()]
+    except ValueError:
+        raise CommandError(f"--batch-sizes must be comma-separated integers, not {value!r}.")
+    if not sizes or min(sizes) < 1:
+        raise CommandError("--batch-sizes needs at least one positive size.")
+    return sizes
+
+
+def _email(n: int, urls: int) -> dict:
+    """Inbound-parse fields for the nth synthetic portal alert, linking `urls` new listings."""
+    links = [f"https://www.rightmove.co.uk/properties/{200_000_000 + n * 100 + i}" for i in range(urls)]
+    return {
+        "subject": f"New properties for you ({n})",
+        "body-plain": "New listings:\n" + "\n".join(links),
+        "Message-Id": f"<bench-{n}@example.com>",
+    }
+
+
+def _price(rng) -> int:
+    # asking prices are roughly log-normal around £450k
+    return int(round(rng.lognormvariate(13.0, 0.5), -3))
+
+
+def _criteria(rng, outcodes) -> dict:
+    """A saved search: mostly a price ceiling and bedrooms, sometimes keywords and an area."""
+    criteria = {}
+    if rng.random() < 0.85:
+        criteria["price_max"] = _price(rng)
+        if rng.random() < 0.3:
+            criteria["price_min"] = int(criteria["price_max"] * rng.uniform(0.5, 0.8))
+    if rng.random() < 0.7:
+        criteria["beds_min"] = rng.choices([1, 2, 3, 4], weights=[2, 4, 3, 1])[0]
+    if rng.random() < 0.2:
+        criteria["baths_min"] = rng.choice([1, 2])
+    if rng.random() < 0.35:
+        criteria["keywords"] = rng.sample(KEYWORDS, rng.choice([1, 1, 2]))
+    if rng.random() < 0.5:
+        criteria["postcode"] = rng.choice(outcodes)
+        criteria["radius_miles"] = rng.choice([0.5, 1, 3, 5, 10])
+    return criteria
+
+
+def _listing(rng, outcodes, n: int, now) -> Listing:
+    portal = rng.choice([Portal.RIGHTMOVE, Portal.ZOOPLA])
+    bedrooms = rng.choices([1, 2, 3, 4, 5], weights=[2, 4, 4, 2, 1])[0]
+    extras = rng.sample(KEYWORDS, rng.choice([0, 1, 2, 3]))
+    title = f"{bedrooms} bedroom {rng.choice(PROPERTY_TYPES)} for sale" + (f" with {' and '.join(extras)}" if extras else "")
+    url = (
+        f"https://www.rightmove.co.uk/properties/{100_000_000 + n}"
+        if portal == Portal.RIGHTMOVE
+        else f"https://www.zoopla.co.uk/for-sale/details/{60_000_000 + n}"
+    )
+    outcode = rng.choice(outcodes)
+    return Listing(
+        portal=portal,
+        canonical_url=url,
+        title=title,
+        address=f"{rng.randint(1, 200)} {rng.choice(STREETS)}, London {outcode}",
+        postcode=f"{outcode} {rng.randint(1, 9)}{rng.choice('ABDEFGHJ')}{rng.choice('LNPQRSTU')}",
+        price=_price(rng),
+        bedrooms=bedrooms,
+        bathrooms=rng.choices([1, 2, 3], weights=[5, 3, 1])[0],
+        first_seen=now,
+        last_seen=now,
+    )
+
+
+class _Measure:
+    def __init__(self):
+        self.seconds = 0.0
+        self.queries = 0
+        self.peak_kb = None
+
+
+@contextmanager
+def measure(memory: bool):
+    """Wall time, SQL statements issued and (with memory) peak traced allocation of the block."""
+    result = _Measure()
+
+    def count(execute, sql, params, many, context):
+        result.queries += 1
+        return execute(sql, params, many, context)
+
+    if memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        with connection.execute_wrapper(count):
+            yield result
+    finally:
+        result.seconds = time.perf_counter() - started
+        if memory:
+            result.peak_kb = round(tracemalloc.get_traced_memory()[1] / 1024)
+            tracemalloc.stop()
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks saved-search matching and inbound-email ingest on a synthetic population, in a throwaway "
+        "database: index build, listing_matches, MatchIndex.match_batch and notify_instant_matches at several "
+        "batch sizes, webhook latency and process_inbound_queue. Reports throughput, SQL queries and peak "
+        "memory, and can write them as JSON to compare runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--searches", type=int, default=10_000)
+        parser.add_argument("--listings", type=int, default=100_000)
+        parser.add_argument("--users", type=int, default=2_000)
+        parser.add_argument("--batch-sizes", default="10,100,1000", help="Comma-separated batch sizes to compare.")
+        parser.add_argument(
+            "--sample", type=int, default=1_000, help="Listings matched/notified per batch size (new ones each time)."
+        )
+        parser.add_argument("--pairs", type=int, default=200_000, help="(listing, search) pairs for listing_matches.")
+        parser.add_argument(
+            "--webhooks", type=int, default=200, help="Webhook requests to time, and emails ingested per batch size."
+        )
+        parser.add_argument("--urls-per-email", type=int, default=5)
+        parser.add_argument(
+            "--memory",
+            action="store_true",
+            help="Also report peak memory per stage (tracemalloc, which slows every stage several-fold; "
+            "only compare timings between runs with the same setting).",
+        )
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--json", dest="json_path", default="", help="Also write results to this file.")
+
+    def handle(self, *args, **options):
+        options["batch_sizes"] = _batch_sizes(options["batch_sizes"])
+        if min(options["searches"], options["listings"], options["users"]) < 1:
+            raise CommandError("--searches, --listings and --users must be positive.")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            caches = {**settings.CACHES, "default": {**settings.CACHES["default"], "LOCATION": os.path.join(tmp, "cache")}}
+            if connection.vendor == "sqlite":
+                connection.settings_dict["TEST"]["NAME"] = os.path.join(tmp, "bench.sqlite3")
+
+            with override_settings(
+                DEBUG=False,
+                ALLOWED_HOSTS=["testserver"],
+                EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+                CACHES=caches,
+                INBOUND_EMAIL_SECRET=WEBHOOK_SECRET,
+            ):
+                old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+                matching.invalidate_index()
+                try:
+                    result = self._run(options)
+                finally:
+                    matching.invalidate_index()
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self._report(result)
+        if options["json_path"]:
+            with open(options["json_path"], "w") as fh:
+                json.dump(result, fh, indent=2)
+
+    def _run(self, options) -> dict:
+        rng = random.Random(options["seed"])
+        memory = options["memory"]
+        result = {
+            "generated_at": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "params": {k: options[k] for k in ("searches", "listings", "users", "batch_sizes", "sample", "pairs", "webhooks", "urls_per_email", "seed")},
+            "tracemalloc": memory,
+        }
+
+        started = time.perf_counter()
+        listings = self._populate(options, rng)
+        result["populate_seconds"] = round(time.perf_counter() - started, 2)
+
+        with measure(memory) as m:
+            index = matching.get_index()
+        result["index_build"] = {
+            "searches_indexed": len(index),
+            "seconds": round(m.seconds, 3),
+            "queries": m.queries,
+            "peak_kb": m.peak_kb,
+        }
+
+        result["listing_matches"] = self._bench_listing_matches(options, rng, listings)
+        result["match_batch"] = self._bench_match_batch(options, index, listings, memory)
+        result["notify_instant_matches"] = self._bench_notify(options, listings, memory)
+        result["webhook"] = self._bench_webhook(options)
+        result["process_inbound_queue"] = self._bench_ingest(options, memory)
+        return result
+
+    def _populate(self, options, rng) -> list[Listing]:
+        outcodes = _outcodes()
+        now = timezone.now()
+        User = get_user_model()
+        User.objects.bulk_create(
+            [User(username=f"bench{i}", email=f"bench{i}@example.com") for i in range(options["users"])],
+            batch_size=2000,
+        )
+        user_ids = list(User.objects.values_list("id", flat=True))
+
+        SavedSearch.objects.bulk_create(
+            [
+                SavedSearch(
+                    user_id=rng.choice(user_ids),
+                    name=f"Search {i}",
+                    portal=rng.choice([Portal.RIGHTMOVE, Portal.ZOOPLA]),
+                    criteria=_criteria(rng, outcodes),
+                    alert_frequency=rng.choices(
+                        [AlertFrequency.INSTANT, AlertFrequency.DAILY, AlertFrequency.OFF], weights=[70, 25, 5]
+                    )[0],
+                )
+                for i in range(options["searches"])
+            ],
+            batch_size=2000,
+        )
+        Listing.objects.bulk_create(
+            [_listing(rng, outcodes, n, now) for n in range(options["listings"])], batch_size=2000
+        )
+        return list(Listing.objects.order_by("id"))
+
+    def _bench_listing_matches(self, options, rng, listings) -> dict:
+        """The per-pair check the index replaces, as a baseline."""
+        criteria = list(SavedSearch.objects.values_list("criteria", flat=True))
+        pairs = [(rng.choice(listings), rng.choice(criteria)) for _ in range(options["pairs"])]
+        started = time.perf_counter()
+        matched = sum(1 for listing, c in pairs if listing_matches(listing, c))
+        seconds = time.perf_counter() - started
+        return {
+            "pairs": len(pairs),
+            "matched": matched,
+            "seconds": round(seconds, 3),
+            "pairs_per_second": round(len(pairs) / seconds) if seconds else None,
+        }
+
+    def _bench_match_batch(self, options, index, listings, memory) -> list[dict]:
+        sample = listings[: options["sample"]]
+        rows = []
+        for size in options["batch_sizes"]:
+            candidates = 0
+            with measure(memory) as m:
+                for start in range(0, len(sample), size):
+                    found = index.match_batch(sample[start : start + size])
+                    candidates += sum(len(ids) for ids in found.values())
+            rows.append(
+                {
+                    "batch_size": size,
+                    "listings": len(sample),
+                    "seconds": round(m.seconds, 3),
+                    "listings_per_second": round(len(sample) / m.seconds) if m.seconds else None,
+                    "candidates_per_listing": round(candidates / len(sample), 2) if sample else 0,
+                    "peak_kb": m.peak_kb,
+                }
+            )
+        return rows
+
+    def _bench_notify(self, options, listings, memory) -> list[dict]:
+        """Each batch size gets listings not matched before, so every run inserts and emails."""
+        rows = []
+        offset = 0
+        for size in options["batch_sizes"]:
+            sample = listings[offset : offset + options["sample"]]
+            offset += len(sample)
+            if not sample:
+                self.stdout.write(self.style.WARNING(f"Not enough listings left to notify at batch size {size}."))
+                continue
+            mail.outbox = []
+            latencies = []
+            with measure(memory) as m:
+                for start in range(0, len(sample), size):
+                    batch_started = time.perf_counter()
+                    notify_instant_matches(sample[start : start + size])
+                    latencies.append(time.perf_counter() - batch_started)
+            rows.append(
+                {
+                    "batch_size": size,
+                    "listings": len(sample),
+                    "batches": len(latencies),
+                    "seconds": round(m.seconds, 3),
+                    "listings_per_second": round(len(sample) / m.seconds) if m.seconds else None,
+                    "queries": m.queries,
+                    "queries_per_batch": round(m.queries / len(latencies), 1),
+                    "p95_batch_ms": round(_percentile(latencies, 95) * 1000, 1),
+                    "emails": len(mail.outbox),
+                    "peak_kb": m.peak_kb,
+                }
+            )
+        return rows
+
+    def _bench_webhook(self, options) -> dict:
+        client = Client()
+        url = reverse("property:inbound_email_webhook")
+        latencies = []
+        with measure(False) as m:
+            for n in range(options["webhooks"]):
+                started = time.perf_counter()
+                response = client.post(url, _email(n, options["urls_per_email"]), headers={"X-Inbound-Secret": WEBHOOK_SECRET})
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 202:
+                    raise CommandError(f"Webhook answered {response.status_code}: {response.content[:200]!r}")
+        # queued only to time the webhook; _bench_ingest queues its own
+        InboundEmail.objects.update(processed_at=timezone.now())
+        if not latencies:
+            return {"requests": 0}
+        return {
+            "requests": len(latencies),
+            "queries_per_request": round(m.queries / len(latencies), 1),
+            "p50_ms": round(statistics.median(latencies) * 1000, 2),
+            "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+            "requests_per_second": round(len(latencies) / m.seconds) if m.seconds else None,
+        }
+
+    def _bench_ingest(self, options, memory) -> list[dict]:
+        """Drain a fresh queue of --webhooks emails at each batch size (upserts plus matching)."""
+        rows = []
+        n = options["webhooks"]  # email numbers the webhook bench used
+        for size in options["batch_sizes"]:
+            emails = [_email(n + i, options["urls_per_email"]) for i in range(options["webhooks"])]
+            n += len(emails)
+            for payload in emails:
+                queue_inbound_email(payload)
+            mail.outbox = []
+            latencies = []
+            with measure(memory) as m:
+                while True:
+                    batch_started = time.perf_counter()
+                    if not process_inbound_queue(batch_size=size):
+                        break
+                    latencies.append(time.perf_counter() - batch_started)
+            if not latencies:
+                continue
+            rows.append(
+                {
+                    "batch_size": size,
+                    "emails": len(emails),
+                    "batches": len(latencies),
+                    "seconds": round(m.seconds, 3),
+                    "emails_per_second": round(len(emails) / m.seconds) if m.seconds else None,
+                    "queries": m.queries,
+                    "queries_per_batch": round(m.queries / len(latencies), 1),
+                    "p95_batch_ms": round(_percentile(latencies, 95) * 1000, 1),
+                    "alert_emails_sent": len(mail.outbox),
+                    "peak_kb": m.peak_kb,
+                }
+            )
+        return rows
+
+    def _report(self, result):
+        build = result["index_build"]
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{result['params']['searches']} searches x {result['params']['listings']} listings "
+            f"({result['database']}, populated in {result['populate_seconds']}s)"
+        ))
+        self.stdout.write(
+            f"  index build          {build['seconds']}s, {build['queries']} queries, "
+            f"{build['searches_indexed']} searches, peak {_kib(build['peak_kb'])}"
+        )
+        lm = result["listing_matches"]
+        self.stdout.write(f"  listing_matches      {lm['pairs_per_second']} pairs/s ({lm['matched']} of {lm['pairs']} matched)")
+        for row in result["match_batch"]:
+            self.stdout.write(
+                f"  match_batch   x{row['batch_size']:<6} {row['listings_per_second']} listings/s, "
+                f"{row['candidates_per_listing']} candidates/listing, peak {_kib(row['peak_kb'])}"
+            )
+        for row in result["notify_instant_matches"]:
+            self.stdout.write(
+                f"  notify        x{row['batch_size']:<6} {row['listings_per_second']} listings/s, "
+                f"{row['queries_per_batch']} queries/batch, p95 {row['p95_batch_ms']} ms/batch, "
+                f"{row['emails']} emails, peak {_kib(row['peak_kb'])}"
+            )
+        hook = result["webhook"]
+        if hook["requests"]:
+            self.stdout.write(
+                f"  webhook              p50 {hook['p50_ms']} ms, p95 {hook['p95_ms']} ms, p99 {hook['p99_ms']} ms, "
+                f"{hook['queries_per_request']} queries/request"
+            )
+        for row in result["process_inbound_queue"]:
+            self.stdout.write(
+                f"  ingest        x{row['batch_size']:<6} {row['emails_per_second']} emails/s, "
+                f"{row['queries_per_batch']} queries/batch, p95 {row['p95_batch_ms']} ms/batch, peak {_kib(row['peak_kb'])}"
+            )
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from property.services import archive_inactive_listings, deactivate_stale_listings
+
+
+class Command(BaseCommand):
+    help = "Retires listings not seen recently and moves long-inactive ones into the archive table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stale-days", type=int, default=30, help="Deactivate listings not seen for this many days.")
+        parser.add_argument(
+            "--archive-days",
+            type=int,
+            default=90,
+            help="Archive inactive listings last seen more than this many days ago.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        retired = deactivate_stale_listings(options["stale_days"], batch_size=options["batch_size"])
+        self.stdout.write(f"Deactivated {retired} stale listing(s).")
+
+        archived = archive_inactive_listings(options["archive_days"], batch_size=options["batch_size"])
+        self.stdout.write(f"Archived {archived} inactive listing(s).")
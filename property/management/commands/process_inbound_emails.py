@@ -0,0 +1,45 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from property.services import process_inbound_queue
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Ingests queued inbound portal emails: upserts listings and sends instant alerts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling the queue instead of exiting once it is empty.",
+        )
+        parser.add_argument("--sleep", type=float, default=2.0, help="Seconds to wait when the queue is empty.")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        total = 0
+
+        while True:
+            try:
+                n = process_inbound_queue(batch_size=batch_size)
+            except Exception:
+                if not options["loop"]:
+                    raise
+                # e.g. "database is locked" during matching; unmatched listings are retried next time
+                logger.exception("Processing the inbound queue failed; retrying in %ss.", options["sleep"])
+                time.sleep(options["sleep"])
+                continue
+            total += n
+            if n:
+                self.stdout.write(f"Processed {n} email(s).")
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["sleep"])
+
+        self.stdout.write(f"Done. {total} email(s) processed.")
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from property.services import send_daily_digests
+
+
+class Command(BaseCommand):
+    help = "Emails the daily digest of unsent matches for saved searches set to 'Daily digest'. Run once a day (cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument(
+            "--urls-per-search",
+            type=int,
+            default=25,
+            help="Listing links shown per saved search before summarising the rest.",
+        )
+
+    def handle(self, *args, **options):
+        digests, matches = send_daily_digests(
+            chunk_size=options["chunk_size"],
+            urls_per_search=options["urls_per_search"],
+        )
+        self.stdout.write(f"Sent {digests} digest(s) covering {matches} match(es).")
@@ -0,0 +1,327 @@
+"""
+In-memory index over saved-search criteria.
+
+Instead of testing every SavedSearch against every new listing, searches are
+bucketed by portal and their numeric bounds (beds_min, baths_min, price_min,
+price_max) are kept in sorted lists. For a listing we bisect each bound to see
+how many searches it satisfies, walk only the most selective one, and check the
+remaining bounds on that short candidate list. Keywords are resolved for all
+searches at once by one scan of the listing text (see keywords.py), and
+postcode radius circles for a whole batch of listings at once (see geo.py).
+"""
+import math
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+from django.db.models import Count, Max
+
+from . import geo
+from .keywords import KeywordMatcher
+from .models import AlertFrequency, Listing, SavedSearch
+
+
+def _listing_text(listing: Listing) -> str:
+    return " ".join([listing.title or "", listing.address or ""]).lower()
+
+
+def within_bounds(listing: Listing, criteria: dict) -> bool:
+    """The numeric part of listing_matches(); unknown listing values pass."""
+    beds_min = criteria.get("beds_min")
+    if beds_min is not None and listing.bedrooms is not None and listing.bedrooms < beds_min:
+        return False
+
+    baths_min = criteria.get("baths_min")
+    if baths_min is not None and listing.bathrooms is not None and listing.bathrooms < baths_min:
+        return False
+
+    price_min = criteria.get("price_min")
+    if price_min is not None and listing.price is not None and listing.price < price_min:
+        return False
+
+    price_max = criteria.get("price_max")
+    if price_max is not None and listing.price is not None and listing.price > price_max:
+        return False
+
+    return True
+
+
+def listing_matches(listing: Listing, criteria: dict) -> bool:
+    if not within_bounds(listing, criteria):
+        return False
+
+    if criteria.get("postcode") and not geo.within_radius(
+        [listing.postcode], criteria["postcode"], _bound(criteria, "radius_miles")
+    )[0]:
+        return False
+
+    keywords = criteria.get("keywords") or []
+    hay = _listing_text(listing)
+    for kw in keywords:
+        if kw and kw.lower() not in hay:
+            return False
+
+    return True
+
+
+def _bound(criteria: dict, key: str):
+    value = criteria.get(key)
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class _Bounds:
+    """
+    Sorted (value, search_id) pairs for one numeric criterion.
+
+    `lower=True` is for minimums (satisfied when bound <= listing value),
+    `lower=False` for maximums (satisfied when bound >= listing value).
+    Searches without the criterion are kept apart - they accept everything.
+    """
+
+    def __init__(self, lower: bool):
+        self.lower = lower
+        self.keys = []
+        self.unbounded = set()
+
+    def add(self, search_id: int, value):
+        if value is None:
+            self.unbounded.add(search_id)
+        else:
+            insort(self.keys, (value, search_id))
+
+    def remove(self, search_id: int, value):
+        if value is None:
+            self.unbounded.discard(search_id)
+            return
+        i = bisect_left(self.keys, (value, search_id))
+        if i < len(self.keys) and self.keys[i] == (value, search_id):
+            del self.keys[i]
+
+    def _span(self, x):
+        if self.lower:
+            return 0, bisect_right(self.keys, (x, math.inf))
+        return bisect_left(self.keys, (x, -math.inf)), len(self.keys)
+
+    def count(self, x) -> int:
+        start, stop = self._span(x)
+        return stop - start + len(self.unbounded)
+
+    def satisfied(self, x):
+        start, stop = self._span(x)
+        for _, search_id in self.keys[start:stop]:
+            yield search_id
+        yield from self.unbounded
+
+
+class _PortalBucket:
+    def __init__(self):
+        self.criteria = {}  # search_id -> criteria dict
+        self.beds_min = _Bounds(lower=True)
+        self.baths_min = _Bounds(lower=True)
+        self.price_min = _Bounds(lower=True)
+        self.price_max = _Bounds(lower=False)
+        self.keywords = KeywordMatcher()
+        self.radius = geo.RadiusIndex()
+
+    def _dimensions(self):
+        return (
+            (self.beds_min, "beds_min", "bedrooms"),
+            (self.baths_min, "baths_min", "bathrooms"),
+            (self.price_min, "price_min", "price"),
+            (self.price_max, "price_max", "price"),
+        )
+
+    def add(self, search_id: int, criteria: dict):
+        self.criteria[search_id] = criteria
+        for bounds, key, _ in self._dimensions():
+            bounds.add(search_id, _bound(criteria, key))
+        self.keywords.add(search_id, criteria.get("keywords"))
+        self.radius.add(search_id, criteria.get("postcode"), _bound(criteria, "radius_miles"))
+
+    def remove(self, search_id: int):
+        criteria = self.criteria.pop(search_id, None)
+        if criteria is None:
+            return
+        for bounds, key, _ in self._dimensions():
+            bounds.remove(search_id, _bound(criteria, key))
+        self.keywords.remove(search_id)
+        self.radius.remove(search_id)
+
+    def candidates(self, listing: Listing, near=None) -> list[int]:
+        """
+        `near` is the set of radius searches whose circle contains the
+        listing, or None if the listing's location is unknown.
+        """
+        best = None
+        best_count = len(self.criteria)
+        for bounds, _, attr in self._dimensions():
+            value = getattr(listing, attr)
+            if value is None:
+                continue
+            n = bounds.count(value)
+            if n < best_count:
+                best, best_count = (bounds, value), n
+
+        pool = best[0].satisfied(best[1]) if best else self.criteria.keys()
+        keywords_ok = self.keywords.satisfied(_listing_text(listing))
+        return sorted(
+            sid
+            for sid in pool
+            if (sid in keywords_ok or sid not in self.keywords)
+            and (near is None or sid in near or sid not in self.radius)
+            and within_bounds(listing, self.criteria[sid])
+        )
+
+
+class MatchIndex:
+    """Saved searches (excluding alerts switched off), bucketed by portal."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._portal_of = {}
+        self.frequency = {}  # search_id -> AlertFrequency
+        self.fingerprint = None
+        self.synced_upto = None  # latest SavedSearch.updated_at applied
+
+    @classmethod
+    def build(cls) -> "MatchIndex":
+        index = cls()
+        index.fingerprint = _current_fingerprint()
+        index._apply(_indexed().values_list(*_ROW).iterator(chunk_size=2000))
+        return index
+
+    def sync(self) -> None:
+        """
+        Catch up with saved-search changes made by any process. Edited rows
+        are found by updated_at; deletions show up as a count mismatch and are
+        resolved against the id list. Costs one query when nothing changed.
+        """
+        fingerprint = _current_fingerprint()
+        if fingerprint == self.fingerprint:
+            return
+
+        if self.synced_upto is not None:
+            changed = SavedSearch.objects.filter(updated_at__gte=self.synced_upto)
+            self._apply(changed.values_list(*_ROW))
+
+        if fingerprint[0] != len(self):
+            live = set(_indexed().values_list("id", flat=True))
+            for search_id in set(self._portal_of) - live:
+                self.remove(search_id)
+            if live - set(self._portal_of):
+                # Rows older than synced_upto we never saw; start over.
+                rebuilt = MatchIndex.build()
+                self.__dict__.update(rebuilt.__dict__)
+                return
+
+        self.fingerprint = fingerprint
+
+    def _apply(self, rows) -> None:
+        for search_id, portal, frequency, criteria, updated_at in rows:
+            if frequency == AlertFrequency.OFF:
+                self.remove(search_id)
+            else:
+                self.add(search_id, portal, frequency, criteria or {})
+            if self.synced_upto is None or updated_at > self.synced_upto:
+                self.synced_upto = updated_at
+
+    def __len__(self):
+        return len(self._portal_of)
+
+    def add(self, search_id: int, portal: str, frequency: str, criteria: dict):
+        self.remove(search_id)
+        self._buckets.setdefault(portal, _PortalBucket()).add(search_id, criteria)
+        self._portal_of[search_id] = portal
+        self.frequency[search_id] = frequency
+
+    def remove(self, search_id: int):
+        portal = self._portal_of.pop(search_id, None)
+        if portal is None:
+            return
+        self._buckets[portal].remove(search_id)
+        self.frequency.pop(search_id, None)
+
+    def candidates(self, listing: Listing) -> list[int]:
+        """Ids of saved searches whose criteria the listing satisfies."""
+        return self.match_batch([listing])[listing.pk]
+
+    def match_batch(self, listings: list[Listing]) -> dict[int, list[int]]:
+        """Candidates for many listings, resolving radius criteria in bulk."""
+        # Signal handlers edit the shared index from other threads, and
+        # scanning fills lazy caches; hold the module lock throughout.
+        with _lock:
+            return self._match_batch(listings)
+
+    def _match_batch(self, listings: list[Listing]) -> dict[int, list[int]]:
+        result = {}
+        by_portal = {}
+        for listing in listings:
+            by_portal.setdefault(listing.portal, []).append(listing)
+
+        for portal, group in by_portal.items():
+            bucket = self._buckets.get(portal)
+            if bucket is None:
+                result.update((listing.pk, []) for listing in group)
+                continue
+            lat, lon = geo.centroids().locate([listing.postcode for listing in group])
+            near = bucket.radius.within(lat, lon)
+            for listing, listing_near in zip(group, near):
+                result[listing.pk] = bucket.candidates(listing, listing_near)
+        return result
+
+
+_ROW = ("id", "portal", "alert_frequency", "criteria", "updated_at")
+
+_lock = threading.Lock()
+_index = None
+
+
+def _indexed():
+    return SavedSearch.objects.exclude(alert_frequency=AlertFrequency.OFF)
+
+
+def _current_fingerprint():
+    agg = _indexed().aggregate(n=Count("id"), latest=Max("updated_at"))
+    return agg["n"], agg["latest"]
+
+
+def get_index() -> MatchIndex:
+    """
+    Return this process's MatchIndex, brought up to date with SavedSearch.
+
+    Local edits are applied straight away via signals; edits made by other
+    workers are picked up incrementally by MatchIndex.sync().
+    """
+    global _index
+    with _lock:
+        if _index is None:
+            _index = MatchIndex.build()
+        else:
+            _index.sync()
+        return _index
+
+
+def search_changed(search: SavedSearch) -> None:
+    with _lock:
+        if _index is None:
+            return
+        if search.alert_frequency == AlertFrequency.OFF:
+            _index.remove(search.pk)
+        else:
+            _index.add(search.pk, search.portal, search.alert_frequency, search.criteria or {})
+
+
+def search_deleted(search_id: int) -> None:
+    with _lock:
+        if _index is not None:
+            _index.remove(search_id)
+
+
+def invalidate_index() -> None:
+    global _index
+    with _lock:
+        _index = None
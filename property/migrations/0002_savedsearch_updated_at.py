@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('property', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='savedsearch',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
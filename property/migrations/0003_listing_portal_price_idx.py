@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('property', '0002_savedsearch_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['portal', 'price'], name='listing_portal_price_idx'),
+        ),
+    ]
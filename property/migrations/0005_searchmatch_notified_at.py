@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:58
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_notified(apps, schema_editor):
+    # Every match recorded before this column was emailed as an instant alert
+    SearchMatch = apps.get_model('property', 'SearchMatch')
+    SearchMatch.objects.update(notified_at=F('matched_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('property', '0004_inboundemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchmatch',
+            name='notified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_existing_notified, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='searchmatch',
+            index=models.Index(fields=['notified_at', 'saved_search'], name='searchmatch_pending_idx'),
+        ),
+    ]
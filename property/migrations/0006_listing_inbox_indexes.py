@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('property', '0005_searchmatch_notified_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['-first_seen', '-id'], name='listing_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['portal', '-first_seen', '-id'], name='listing_portal_inbox_idx'),
+        ),
+    ]
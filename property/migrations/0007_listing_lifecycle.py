@@ -0,0 +1,61 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('property', '0006_listing_inbox_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedListing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('listing_id', models.BigIntegerField(db_index=True)),
+                ('portal', models.CharField(choices=[('rightmove', 'Rightmove'), ('zoopla', 'Zoopla')], max_length=20)),
+                ('canonical_url', models.URLField(db_index=True)),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('address', models.CharField(blank=True, max_length=255)),
+                ('postcode', models.CharField(blank=True, max_length=16)),
+                ('price', models.IntegerField(blank=True, null=True)),
+                ('bedrooms', models.IntegerField(blank=True, null=True)),
+                ('bathrooms', models.IntegerField(blank=True, null=True)),
+                ('first_seen', models.DateTimeField()),
+                ('last_seen', models.DateTimeField()),
+                ('raw_source', models.JSONField(blank=True, default=dict)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='listing',
+            name='listing_portal_price_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='listing',
+            name='listing_inbox_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='listing',
+            name='listing_portal_inbox_idx',
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['portal', 'price'], name='listing_portal_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-first_seen', '-id'], name='listing_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['portal', '-first_seen', '-id'], name='listing_portal_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['is_active', 'last_seen'], name='listing_lifecycle_idx'),
+        ),
+    ]
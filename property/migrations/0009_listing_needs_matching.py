@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('property', '0008_inboundemail_next_attempt_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='needs_matching',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('needs_matching', True)), fields=['id'], name='listing_unmatched_idx'),
+        ),
+    ]
@@ -21,6 +21,10 @@ class SavedSearch(models.Model):
         max_length=20, choices=AlertFrequency.choices, default=AlertFrequency.INSTANT
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.get_portal_display()})"
 
 class Listing(models.Model):
     portal = models.CharField(max_length=20, choices=Portal.choices)
@@ -39,14 +43,68 @@ class Listing(models.Model):
 
     raw_source = models.JSONField(default=dict, blank=True)
     is_active = models.BooleanField(default=True)
+    # Ingested but not yet run through saved-search matching (see match_new_listings)
+    needs_matching = models.BooleanField(default=False)
+
+    class Meta:
+        # Hot-path indexes only cover live inventory (see expire_listings).
+        indexes = [
+            # ingest worker: listings still waiting for matching
+            models.Index(fields=["id"], condition=models.Q(needs_matching=True), name="listing_unmatched_idx"),
+            # saved-search backfill filters on portal, then price range
+            models.Index(
+                fields=["portal", "price"],
+                condition=models.Q(is_active=True),
+                name="listing_portal_price_idx",
+            ),
+            # listings inbox: newest first, optionally narrowed to one portal
+            models.Index(
+                fields=["-first_seen", "-id"],
+                condition=models.Q(is_active=True),
+                name="listing_inbox_idx",
+            ),
+            models.Index(
+                fields=["portal", "-first_seen", "-id"],
+                condition=models.Q(is_active=True),
+                name="listing_portal_inbox_idx",
+            ),
+            # lifecycle job: find stale active listings
+            models.Index(fields=["is_active", "last_seen"], name="listing_lifecycle_idx"),
+        ]
+
+    def __str__(self):
+        return self.title or self.address or self.canonical_url
+
+class ArchivedListing(models.Model):
+    """Cold copy of a retired Listing, including its raw_source."""
+    listing_id = models.BigIntegerField(db_index=True)  # pk the row had in Listing
+    portal = models.CharField(max_length=20, choices=Portal.choices)
+    canonical_url = models.URLField(db_index=True)
+
+    title = models.CharField(max_length=255, blank=True)
+    address = models.CharField(max_length=255, blank=True)
+    postcode = models.CharField(max_length=16, blank=True)
+
+    price = models.IntegerField(null=True, blank=True)
+    bedrooms = models.IntegerField(null=True, blank=True)
+    bathrooms = models.IntegerField(null=True, blank=True)
+
+    first_seen = models.DateTimeField()
+    last_seen = models.DateTimeField()
+    raw_source = models.JSONField(default=dict, blank=True)
+    archived_at = models.DateTimeField(default=timezone.now)
 
 class SearchMatch(models.Model):
     saved_search = models.ForeignKey(SavedSearch, on_delete=models.CASCADE)
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE)
     matched_at = models.DateTimeField(default=timezone.now)
+    notified_at = models.DateTimeField(null=True, blank=True)  # null = waiting for the daily digest
 
     class Meta:
         unique_together = ("saved_search", "listing")
+        indexes = [
+            models.Index(fields=["notified_at", "saved_search"], name="searchmatch_pending_idx"),
+        ]
 
 class ShortlistItem(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -57,3 +115,19 @@ class ShortlistItem(models.Model):
     class Meta:
         unique_together = ("user", "listing")
 
+
+class InboundEmail(models.Model):
+    """Raw portal alert email, queued by the webhook for the ingest worker."""
+    idempotency_key = models.CharField(max_length=64, unique=True)
+    payload = models.JSONField(default=dict)
+    received_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # After a failure, not retried before this time
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["processed_at", "id"], name="inboundemail_queue_idx"),
+        ]
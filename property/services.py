@@ -1,56 +1,471 @@
+import hashlib
+import logging
+import re
+from collections import defaultdict
+from datetime import timedelta
+from itertools import groupby, islice
+
 from django.conf import settings
-from django.core.mail import send_mail
-from .models import Listing, SavedSearch, SearchMatch, AlertFrequency
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q, QuerySet, Value
+from django.db.models.functions import Concat, Lower
+from django.utils import timezone
+
+from config.cache import bump_version
+from config.db import write_atomic
+
+from .geo import within_radius
+from .matching import get_index, listing_matches  # noqa: F401 (listing_matches re-exported)
+from .models import (
+    AlertFrequency,
+    ArchivedListing,
+    InboundEmail,
+    Listing,
+    Portal,
+    SavedSearch,
+    SearchMatch,
+    ShortlistItem,
+)
+
+logger = logging.getLogger(__name__)
 
-def listing_matches(listing: Listing, criteria: dict) -> bool:
-    beds_min = criteria.get("beds_min")
-    if beds_min is not None and listing.bedrooms is not None and listing.bedrooms < beds_min:
-        return False
+RIGHTMOVE_RE = re.compile(r"https?://www\.rightmove\.co\.uk/properties/\d+")
+ZOOPLA_RE = re.compile(r"https?://www\.zoopla\.co\.uk/for-sale/details/\d+")
 
-    baths_min = criteria.get("baths_min")
-    if baths_min is not None and listing.bathrooms is not None and listing.bathrooms < baths_min:
-        return False
+# Fields we keep from Mailgun ("body-plain", "Message-Id") and
+# SendGrid ("text", "html", "headers") inbound-parse posts.
+INBOUND_FIELDS = ("subject", "body-plain", "body-html", "text", "html", "Message-Id", "headers")
 
-    price_min = criteria.get("price_min")
-    if price_min is not None and listing.price is not None and listing.price < price_min:
-        return False
+INGEST_MAX_ATTEMPTS = 5
+# A failed email is retried after 1, 2, 4, 8... minutes
+INGEST_RETRY_SECONDS = 60
 
-    price_max = criteria.get("price_max")
-    if price_max is not None and listing.price is not None and listing.price > price_max:
-        return False
+def _match_email(user, matches: list[SearchMatch]) -> EmailMessage:
+    by_search = defaultdict(list)
+    for m in matches:
+        by_search[m.saved_search].append(m.listing)
 
-    keywords = criteria.get("keywords") or []
-    hay = " ".join([listing.title or "", listing.address or ""]).lower()
-    for kw in keywords:
-        if kw and kw.lower() not in hay:
-            return False
+    if len(by_search) == 1:
+        subject = f"New property match: {next(iter(by_search)).name}"
+    else:
+        subject = f"{len(matches)} new property matches"
+
+    lines = []
+    for search, listings in by_search.items():
+        lines.append(f"{search.name}:")
+        lines.extend(f"  {listing.canonical_url}" for listing in listings)
+        lines.append("")
+
+    return EmailMessage(
+        subject=subject,
+        body="New listings matched:\n" + "\n".join(lines),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[user.email],
+    )
 
-    return True
 
 def notify_instant_matches(listings: list[Listing]) -> None:
-    searches = SavedSearch.objects.select_related("user").all()
+    """
+    Record matches for new listings and email instant-alert users straight away.
+    Instant matches are marked notified once their user's email has gone out;
+    matches for daily searches are left with notified_at unset for the digest.
+    """
+    index = get_index()
+    now = timezone.now()
+    candidates = index.match_batch(listings)
+    new_rows = [
+        SearchMatch(saved_search_id=search_id, listing_id=listing.pk, matched_at=now)
+        for listing in listings
+        for search_id in candidates[listing.pk]
+    ]
+    if not new_rows:
+        return
+
+    SearchMatch.objects.bulk_create(new_rows, ignore_conflicts=True)
+
+    # Rows that already existed keep their old matched_at, so this picks out
+    # exactly the pairs inserted above in a single query.
+    created = (
+        SearchMatch.objects.filter(
+            matched_at=now,
+            saved_search_id__in={r.saved_search_id for r in new_rows},
+            listing_id__in={r.listing_id for r in new_rows},
+        )
+        .select_related("saved_search__user", "listing")
+        .order_by("saved_search__user_id", "saved_search_id", "listing_id")
+    )
 
-    for s in searches:
-        if s.alert_frequency != AlertFrequency.INSTANT:
+    by_user = defaultdict(list)
+    done_ids = []
+    for m in created:
+        if m.saved_search.alert_frequency != AlertFrequency.INSTANT:
             continue
+        if m.saved_search.user.email:
+            by_user[m.saved_search.user].append(m)
+        else:
+            # no address to send to; close the match off
+            done_ids.append(m.pk)
+
+    if by_user:
+        connection = get_connection(fail_silently=True)
+        connection.open()
+        try:
+            for user, matches in by_user.items():
+                # fail_silently: a failed send returns 0 and leaves the matches unnotified
+                if connection.send_messages([_match_email(user, matches)]):
+                    done_ids.extend(m.pk for m in matches)
+                else:
+                    logger.warning("Match email for user %s not sent; %d match(es) unnotified.", user.pk, len(matches))
+        finally:
+            connection.close()
+
+    if done_ids:
+        SearchMatch.objects.filter(pk__in=done_ids).update(notified_at=timezone.now())
+
+
+def _digest_email(user, searches: dict, total: int) -> EmailMessage:
+    lines = [f"{total} new listing{'s' if total != 1 else ''} matched your saved searches today.", ""]
+    for search, (count, urls) in searches.items():
+        lines.append(f"{search.name} ({count}):")
+        lines.extend(f"  {url}" for url in urls)
+        if count > len(urls):
+            lines.append(f"  ...and {count - len(urls)} more")
+        lines.append("")
+
+    return EmailMessage(
+        subject=f"Daily property digest: {total} new match{'es' if total != 1 else ''}",
+        body="\n".join(lines),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[user.email],
+    )
+
+
+def send_daily_digests(chunk_size: int = 2000, urls_per_search: int = 25) -> tuple[int, int]:
+    """
+    Email one digest per user covering their unsent daily-search matches,
+    then mark the matches of each digest that went out as sent. Rows are streamed in (user, search) order
+    and only one user's summary is held at a time, so memory stays flat
+    however many matches are pending. Returns (digests sent, matches sent).
+    """
+    pending = (
+        SearchMatch.objects.filter(
+            notified_at__isnull=True,
+            saved_search__alert_frequency=AlertFrequency.DAILY,
+        )
+        .select_related("saved_search__user", "listing")
+        .only(
+            "saved_search__name",
+            "saved_search__user__email",
+            "listing__canonical_url",
+        )
+        .order_by("saved_search__user_id", "saved_search_id", "id")
+    )
+
+    connection = get_connection(fail_silently=True)
+    connection.open()
+    digests = sent = 0
+    done_ids = []
+
+    def flush():
+        now = timezone.now()
+        for i in range(0, len(done_ids), chunk_size):
+            SearchMatch.objects.filter(pk__in=done_ids[i:i + chunk_size]).update(notified_at=now)
+        done_ids.clear()
+
+    try:
+        for user, matches in groupby(pending.iterator(chunk_size=chunk_size), key=lambda m: m.saved_search.user):
+            searches = {}
+            ids = []
+            for m in matches:
+                entry = searches.setdefault(m.saved_search, [0, []])
+                entry[0] += 1
+                if len(entry[1]) < urls_per_search:
+                    entry[1].append(m.listing.canonical_url)
+                ids.append(m.pk)
+
+            if user.email:
+                # fail_silently: a failed send returns 0 and its matches stay pending for tomorrow
+                if not connection.send_messages([_digest_email(user, searches, len(ids))]):
+                    logger.warning("Digest for user %s not sent; %d match(es) left pending.", user.pk, len(ids))
+                    continue
+                digests += 1
+                sent += len(ids)
+            # users without an address can't be emailed; their matches are closed off
+            done_ids.extend(ids)
+
+            if len(done_ids) >= chunk_size:
+                flush()
+        flush()
+    finally:
+        connection.close()
+
+    return digests, sent
+
+
+def _at_least(field: str, value) -> Q:
+    # Listings with the field unknown still match, as in listing_matches.
+    return Q(**{f"{field}__gte": value}) | Q(**{f"{field}__isnull": True})
+
+
+def _at_most(field: str, value) -> Q:
+    return Q(**{f"{field}__lte": value}) | Q(**{f"{field}__isnull": True})
+
+
+def criteria_queryset(portal: str, criteria: dict) -> QuerySet:
+    """
+    Translate a saved search's criteria into a Listing queryset.
+    Mirrors listing_matches() so the database does the filtering.
+    """
+    qs = Listing.objects.filter(portal=portal, is_active=True)
+
+    if criteria.get("beds_min") is not None:
+        qs = qs.filter(_at_least("bedrooms", criteria["beds_min"]))
+    if criteria.get("baths_min") is not None:
+        qs = qs.filter(_at_least("bathrooms", criteria["baths_min"]))
+    if criteria.get("price_min") is not None:
+        qs = qs.filter(_at_least("price", criteria["price_min"]))
+    if criteria.get("price_max") is not None:
+        qs = qs.filter(_at_most("price", criteria["price_max"]))
+
+    keywords = [kw.lower() for kw in (criteria.get("keywords") or []) if kw]
+    if keywords:
+        qs = qs.annotate(hay=Lower(Concat("title", Value(" "), "address")))
+        for kw in keywords:
+            qs = qs.filter(hay__contains=kw)
+
+    return qs
+
+
+def backfill_search_matches(search: SavedSearch, batch_size: int = 2000) -> int:
+    """
+    Record SearchMatch rows for existing listings that fit a new or edited search.
+    Returns the number of matching listings (including ones already recorded).
+    """
+    if search.alert_frequency == AlertFrequency.OFF:
+        return 0
+
+    criteria = search.criteria or {}
+    rows = (
+        criteria_queryset(search.portal, criteria)
+        .values_list("id", "postcode")
+        .iterator(chunk_size=batch_size)
+    )
+
+    now = timezone.now()
+    total = 0
+    while chunk := list(islice(rows, batch_size)):
+        if criteria.get("postcode"):
+            # Radius can't be pushed into SQL; filter each chunk vectorised.
+            inside = within_radius([pc for _, pc in chunk], criteria["postcode"], criteria.get("radius_miles"))
+            chunk = [row for row, ok in zip(chunk, inside) if ok]
+        # Pre-existing listings are recorded, not announced.
+        SearchMatch.objects.bulk_create(
+            [SearchMatch(saved_search_id=search.pk, listing_id=listing_id, notified_at=now) for listing_id, _ in chunk],
+            ignore_conflicts=True,
+        )
+        total += len(chunk)
+    return total
+
+
+def prune_search_matches(search: SavedSearch, batch_size: int = 2000) -> int:
+    """
+    Delete an edited search's unsent matches that its criteria no longer
+    cover, so a narrowed daily search doesn't send them in the next digest.
+    Returns the number of matches removed.
+    """
+    criteria = search.criteria or {}
+    pending = (
+        SearchMatch.objects.filter(saved_search=search, notified_at__isnull=True)
+        .select_related("listing")
+        .order_by("id")
+    )
+    stale = [
+        m.pk
+        for m in pending.iterator(chunk_size=batch_size)
+        if m.listing.portal != search.portal or not listing_matches(m.listing, criteria)
+    ]
+    for i in range(0, len(stale), batch_size):
+        SearchMatch.objects.filter(pk__in=stale[i:i + batch_size]).delete()
+    return len(stale)
+
+
+def _idempotency_key(payload: dict) -> str:
+    message_id = payload.get("Message-Id", "")
+    if not message_id:
+        m = re.search(r"^Message-ID:\s*(\S+)", payload.get("headers", ""), re.I | re.M)
+        message_id = m.group(1) if m else ""
+    basis = message_id or "\n".join(payload.get(k, "") for k in ("subject", "body-plain", "text", "body-html", "html"))
+    return hashlib.sha256(basis.encode("utf-8")).hexdigest()
+
+
+def queue_inbound_email(post) -> InboundEmail:
+    """
+    Persist a webhook payload for the ingest worker with a single INSERT.
+    Retried deliveries of the same email share a key and are dropped.
+    """
+    payload = {k: post.get(k, "") for k in INBOUND_FIELDS if post.get(k)}
+    item = InboundEmail(idempotency_key=_idempotency_key(payload), payload=payload)
+    InboundEmail.objects.bulk_create([item], ignore_conflicts=True)
+    return item
+
+
+def ingest_email(payload: dict) -> list[Listing]:
+    """Upsert the listings linked from one alert email; returns the new ones."""
+    subject = payload.get("subject", "")
+    body_plain = payload.get("body-plain", "") or payload.get("text", "")
+    body_html = payload.get("body-html", "") or payload.get("html", "")
+    text = body_plain or body_html or ""
+
+    urls = set(RIGHTMOVE_RE.findall(text)) | set(ZOOPLA_RE.findall(text))
+    return upsert_listings(urls, raw_source={"subject": subject})
+
+
+def upsert_listings(urls: set[str], raw_source: dict) -> list[Listing]:
+    """
+    Insert unseen listings and bump last_seen on known ones, in a constant
+    number of queries however many URLs there are. Returns the new listings.
+    """
+    if not urls:
+        return []
+
+    now = timezone.now()
+    existing = set(Listing.objects.filter(canonical_url__in=urls).values_list("canonical_url", flat=True))
+
+    # INSERT ... ON CONFLICT (canonical_url) DO UPDATE SET last_seen, is_active - supported
+    # by both SQLite (3.24+) and Postgres.
+    Listing.objects.bulk_create(
+        [
+            Listing(
+                portal=Portal.RIGHTMOVE if "rightmove.co.uk" in url else Portal.ZOOPLA,
+                canonical_url=url,
+                first_seen=now,
+                last_seen=now,
+                raw_source=raw_source,
+                is_active=True,
+                needs_matching=True,
+            )
+            for url in sorted(urls)
+        ],
+        update_conflicts=True,
+        unique_fields=["canonical_url"],
+        # A listing seen again after expiry comes back to life.
+        update_fields=["last_seen", "is_active"],
+    )
+
+    bump_version("listings")
+
+    new_urls = urls - existing
+    if not new_urls:
+        return []
+    return list(Listing.objects.filter(canonical_url__in=new_urls).order_by("id"))
+
+
+def process_inbound_queue(batch_size: int = 50) -> int:
+    """
+    Ingest one batch of queued emails, then run matching for the listings
+    they added. Rows are claimed with SKIP LOCKED where the database supports
+    it, so several workers can drain the queue. A failed email waits an
+    exponentially growing delay (next_attempt_at) before it is claimed again.
+    Returns the number of rows claimed.
+    """
+    with write_atomic():
+        now = timezone.now()
+        batch = list(
+            InboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True, attempts__lt=INGEST_MAX_ATTEMPTS)
+            .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+            .order_by("id")[:batch_size]
+        )
+        for item in batch:
+            item.attempts += 1
+            try:
+                with transaction.atomic():
+                    ingest_email(item.payload)
+            except Exception as exc:
+                logger.exception("Inbound email %s failed: %r", item.pk, exc)
+                item.last_error = repr(exc)
+                item.next_attempt_at = timezone.now() + timedelta(
+                    seconds=INGEST_RETRY_SECONDS * 2 ** (item.attempts - 1)
+                )
+            else:
+                item.processed_at = timezone.now()
+                item.last_error = ""
+                item.next_attempt_at = None
+        if batch:
+            InboundEmail.objects.bulk_update(batch, ["attempts", "processed_at", "last_error", "next_attempt_at"])
+
+    # After the commit, and on every call: this batch's listings plus any
+    # left over by a call whose matching failed.
+    match_new_listings()
+    return len(batch)
+
+
+def match_new_listings(batch_size: int = 500) -> int:
+    """
+    Match and alert on ingested listings still flagged needs_matching, and
+    clear the flag once that succeeds. An email is marked processed as soon
+    as its listings are stored, so the flag is what carries them through a
+    failure here to the next call. Returns the number of listings matched.
+    """
+    pending = Listing.objects.filter(needs_matching=True).order_by("id")
+    total = 0
+    while batch := list(pending[:batch_size]):
+        notify_instant_matches(batch)
+        Listing.objects.filter(pk__in=[l.pk for l in batch]).update(needs_matching=False)
+        total += len(batch)
+    return total
+
+
+def deactivate_stale_listings(days: int, batch_size: int = 1000) -> int:
+    """Mark listings not seen for `days` days inactive. Returns the number retired."""
+    cutoff = timezone.now() - timedelta(days=days)
+    stale = Listing.objects.filter(is_active=True, last_seen__lt=cutoff)
+    total = 0
+    while ids := list(stale.values_list("id", flat=True)[:batch_size]):
+        total += Listing.objects.filter(id__in=ids).update(is_active=False)
+    if total:
+        bump_version("listings")
+    return total
+
+
+_ARCHIVED_FIELDS = (
+    "portal", "canonical_url", "title", "address", "postcode",
+    "price", "bedrooms", "bathrooms", "first_seen", "last_seen", "raw_source",
+)
+
 
-        for listing in listings:
-            if listing.portal != s.portal:
-                continue
-            if not listing_matches(listing, s.criteria):
-                continue
-
-            match, created = SearchMatch.objects.get_or_create(saved_search=s, listing=listing)
-            if not created:
-                continue
-
-            if not s.user.email:
-                continue
-
-            send_mail(
-                subject=f"New property match: {s.name}",
-                message=f"New listing matched:\n{listing.canonical_url}",
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[s.user.email],
-                fail_silently=True,
+def archive_inactive_listings(days: int, batch_size: int = 500) -> int:
+    """
+    Copy listings inactive for `days` days into ArchivedListing, then delete
+    them from the hot table. Shortlisted listings stay (users still link to
+    them) but their raw_source moves to the archive. Each batch is its own
+    transaction. Returns the number of rows archived.
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    candidates = (
+        Listing.objects.filter(is_active=False, last_seen__lt=cutoff)
+        .exclude(id__in=ArchivedListing.objects.values("listing_id"))
+        .order_by("id")
+    )
+    total = 0
+    while True:
+        with write_atomic():
+            batch = list(candidates[:batch_size])
+            if not batch:
+                break
+            now = timezone.now()
+            ArchivedListing.objects.bulk_create(
+                [
+                    ArchivedListing(listing_id=l.pk, archived_at=now, **{f: getattr(l, f) for f in _ARCHIVED_FIELDS})
+                    for l in batch
+                ]
             )
+            ids = [l.pk for l in batch]
+            keep = set(ShortlistItem.objects.filter(listing_id__in=ids).values_list("listing_id", flat=True))
+            Listing.objects.filter(id__in=keep).update(raw_source={})
+            Listing.objects.filter(id__in=set(ids) - keep).delete()
+        total += len(batch)
+    if total:
+        bump_version("listings")
+    return total
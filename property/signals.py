@@ -0,0 +1,30 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from config.cache import bump_version
+
+from .matching import search_changed, search_deleted
+from .models import Listing, SavedSearch, ShortlistItem
+
+
+@receiver(post_save, sender=SavedSearch)
+def saved_search_saved(sender, instance, **kwargs):
+    search_changed(instance)
+
+
+@receiver(post_delete, sender=SavedSearch)
+def saved_search_deleted(sender, instance, **kwargs):
+    search_deleted(instance.pk)
+
+
+# Bulk writes (upserts, lifecycle job) bump "listings" themselves; this
+# covers one-off edits such as the admin.
+@receiver(post_save, sender=Listing)
+def listing_saved(sender, instance, **kwargs):
+    bump_version("listings")
+
+
+@receiver(post_save, sender=ShortlistItem)
+@receiver(post_delete, sender=ShortlistItem)
+def shortlist_changed(sender, instance, **kwargs):
+    bump_version(f"shortlist:{instance.user_id}")
@@ -1,3 +1,309 @@
-from django.test import TestCase
+import csv
+import html
+import random
+import re
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from property import geo, matching, services
+from property.keywords import KeywordMatcher
+from property.models import AlertFrequency, InboundEmail, Listing, Portal, SavedSearch, SearchMatch
+
+KEYWORDS = ["garden", "garage", "den", "age", "parking", "balcony", "loft", "period"]
+
+with open(geo.CENTROIDS_CSV, newline="") as fh:
+    OUTCODES = [row["outcode"] for row in csv.DictReader(fh)]
+
+
+def random_criteria(rng) -> dict:
+    criteria = {}
+    if rng.random() < 0.7:
+        criteria["price_max"] = rng.choice([250_000, 400_000, 600_000])
+    if rng.random() < 0.3:
+        criteria["price_min"] = rng.choice([150_000, 300_000])
+    if rng.random() < 0.5:
+        criteria["beds_min"] = rng.choice([1, 2, 3])
+    if rng.random() < 0.2:
+        criteria["baths_min"] = rng.choice([1, 2])
+    if rng.random() < 0.4:
+        criteria["keywords"] = rng.sample(KEYWORDS, rng.choice([1, 2]))
+    if rng.random() < 0.4:
+        criteria["postcode"] = rng.choice(OUTCODES + ["ZZ99 9ZZ"])
+        criteria["radius_miles"] = rng.choice([0.5, 2, 5, 50])
+    return criteria
+
+
+def random_listing(rng, n: int) -> Listing:
+    extras = rng.sample(KEYWORDS, rng.choice([0, 1, 2]))
+    return Listing(
+        portal=rng.choice([Portal.RIGHTMOVE, Portal.ZOOPLA]),
+        canonical_url=f"https://www.rightmove.co.uk/properties/{n}",
+        title=f"Flat for sale {' '.join(extras)}",
+        address=f"{n} High Street",
+        # unknown values (None, unplaceable postcodes) pass every criterion
+        postcode=rng.choice([f"{rng.choice(OUTCODES)} 1AA", "", "ZZ99 9ZZ"]),
+        price=rng.choice([None, 200_000, 350_000, 500_000, 900_000]),
+        bedrooms=rng.choice([None, 1, 2, 4]),
+        bathrooms=rng.choice([None, 1, 2]),
+    )
+
+
+class MatchingTests(TestCase):
+    """The index and the keyword/radius matchers against listing_matches() on every pair."""
+
+    def setUp(self):
+        matching.invalidate_index()
+        self.addCleanup(matching.invalidate_index)
+        self.rng = random.Random(7)
+        user = User.objects.create(username="u", email="u@example.com")
+        self.searches = [
+            SavedSearch.objects.create(
+                user=user,
+                name=f"s{n}",
+                portal=self.rng.choice([Portal.RIGHTMOVE, Portal.ZOOPLA]),
+                criteria=random_criteria(self.rng),
+                alert_frequency=self.rng.choice(AlertFrequency.values),
+            )
+            for n in range(150)
+        ]
+        self.listings = [random_listing(self.rng, n) for n in range(120)]
+        for n, listing in enumerate(self.listings):
+            listing.pk = n + 1
+
+    def brute_force(self, listing) -> list[int]:
+        return sorted(
+            s.pk
+            for s in SavedSearch.objects.exclude(alert_frequency=AlertFrequency.OFF)
+            if s.portal == listing.portal and matching.listing_matches(listing, s.criteria)
+        )
+
+    def assertMatchesBruteForce(self, index):
+        result = index.match_batch(self.listings)
+        for listing in self.listings:
+            self.assertEqual(result[listing.pk], self.brute_force(listing), listing.__dict__)
+
+    def test_match_batch(self):
+        self.assertMatchesBruteForce(matching.MatchIndex.build())
+
+    def test_index_follows_edits(self):
+        index = matching.get_index()
+        for search in self.rng.sample(self.searches, 40):
+            search.criteria = random_criteria(self.rng)
+            search.alert_frequency = self.rng.choice(AlertFrequency.values)
+            search.save()
+        for search in self.rng.sample(self.searches, 20):
+            search.delete()
+        self.assertIs(matching.get_index(), index)
+        self.assertMatchesBruteForce(index)
+
+    def test_radius_index(self):
+        radius = geo.RadiusIndex()
+        circles = {}
+        for search in self.searches:
+            criteria = search.criteria
+            radius.add(search.pk, criteria.get("postcode"), criteria.get("radius_miles"))
+            if search.pk in radius:
+                circles[search.pk] = (criteria["postcode"], criteria["radius_miles"])
+        postcodes = [listing.postcode for listing in self.listings]
+        lat, lon = geo.centroids().locate(postcodes)
+
+        near = radius.within(lat, lon)
+
+        for search_id, (centre, miles) in circles.items():
+            inside = geo.within_radius(postcodes, centre, miles)
+            for i, listing_near in enumerate(near):
+                if listing_near is None:
+                    # unplaceable listings pass every circle
+                    self.assertTrue(inside[i])
+                else:
+                    self.assertEqual(search_id in listing_near, bool(inside[i]), (search_id, postcodes[i]))
+
+
+class KeywordMatcherTests(SimpleTestCase):
+    def test_churn(self):
+        rng = random.Random(3)
+        matcher = KeywordMatcher()
+        live = {}
+        for step in range(3000):
+            search_id = rng.randrange(30)
+            if rng.random() < 0.5:
+                keywords = rng.sample(KEYWORDS, rng.randint(0, 3))
+                matcher.add(search_id, keywords)
+                live[search_id] = set(keywords)
+            else:
+                matcher.remove(search_id)
+                live.pop(search_id, None)
+            live = {s: k for s, k in live.items() if k}
+
+            if step % 25 == 0:
+                text = " ".join(rng.sample(KEYWORDS, 3)).upper()
+                expected = {s for s, k in live.items() if all(kw in text.lower() for kw in k)}
+                self.assertEqual(matcher.satisfied(text), expected)
+        # keywords no search uses are dropped
+        self.assertEqual(set(matcher._searches), set().union(*live.values()))
+        self.assertTrue(all(matcher._searches.values()))
+
+
+class InboxTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("u", password="pw")
+        self.client.force_login(self.user)
+        now = timezone.now()
+        # first_seen ties force the id tie-break
+        self.listings = Listing.objects.bulk_create(
+            Listing(
+                portal=Portal.RIGHTMOVE if n % 3 else Portal.ZOOPLA,
+                canonical_url=f"https://www.rightmove.co.uk/properties/{n}",
+                first_seen=now - timedelta(minutes=n // 4),
+                bedrooms=n % 4,
+            )
+            for n in range(60)
+        )
+
+    def walk(self, query: str) -> list[str]:
+        urls = []
+        url = reverse("property:listings_inbox") + query
+        while url:
+            page = self.client.get(url).content.decode()
+            urls.extend(re.findall(r'<a href="(https://[^"]+)" target', page))
+            older = re.search(r'<a href="(\?[^"]*)">Older listings', page)
+            url = reverse("property:listings_inbox") + html.unescape(older.group(1)) if older else None
+        return urls
+
+    @mock.patch("property.views.INBOX_PAGE_SIZE", 7)
+    def test_cursor_pages_cover_the_offset_listing(self):
+        for query, qs in (
+            ("", Listing.objects.all()),
+            ("?portal=rightmove&beds_min=2", Listing.objects.filter(portal=Portal.RIGHTMOVE, bedrooms__gte=2)),
+        ):
+            expected = list(qs.order_by("-first_seen", "-id").values_list("canonical_url", flat=True))
+            self.assertEqual(self.walk(query), expected)
+
+
+@override_settings(INBOUND_EMAIL_SECRET="secret")
+class InboundEmailTests(TestCase):
+    def post(self, data, secret="secret"):
+        return self.client.post(reverse("property:inbound_email_webhook"), data, HTTP_X_INBOUND_SECRET=secret)
+
+    def test_webhook_dedup(self):
+        email = {"subject": "New", "body-plain": "https://www.rightmove.co.uk/properties/1", "Message-Id": "<a@x>"}
+        self.assertEqual(self.post(email).status_code, 202)
+        # a redelivery, even with a reworded body, is the same message
+        self.assertEqual(self.post({**email, "body-plain": "resent"}).status_code, 202)
+        self.assertEqual(self.post({"subject": "Other", "body-plain": "no id"}).status_code, 202)
+        self.assertEqual(self.post({"subject": "Other", "body-plain": "no id"}).status_code, 202)
+        self.assertEqual(self.post(email, secret="wrong").status_code, 403)
+        self.assertEqual(InboundEmail.objects.count(), 2)
+
+        self.assertEqual(services.process_inbound_queue(), 2)
+        self.assertEqual(services.process_inbound_queue(), 0)
+        self.assertEqual(Listing.objects.get().canonical_url, "https://www.rightmove.co.uk/properties/1")
+
+    def test_failed_email_backs_off(self):
+        services.queue_inbound_email({"subject": "New", "body-plain": "x"})
+        with mock.patch.object(services, "ingest_email", side_effect=ValueError("bad")):
+            with self.assertLogs("property.services", "ERROR"):
+                self.assertEqual(services.process_inbound_queue(), 1)
+            self.assertEqual(services.process_inbound_queue(), 0)
+        item = InboundEmail.objects.get()
+        self.assertEqual(item.attempts, 1)
+        self.assertGreater(item.next_attempt_at, timezone.now())
+
+        InboundEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(services.process_inbound_queue(), 1)
+        self.assertIsNotNone(InboundEmail.objects.get().processed_at)
+
+    def test_failed_matching_is_retried(self):
+        matching.invalidate_index()
+        self.addCleanup(matching.invalidate_index)
+        user = User.objects.create(username="u", email="u@example.com")
+        SavedSearch.objects.create(user=user, name="any", portal=Portal.RIGHTMOVE)
+        services.queue_inbound_email({"subject": "New", "body-plain": "https://www.rightmove.co.uk/properties/1"})
+
+        with mock.patch.object(services, "notify_instant_matches", side_effect=RuntimeError("database is locked")):
+            with self.assertRaises(RuntimeError):
+                services.process_inbound_queue()
+        self.assertIsNotNone(InboundEmail.objects.get().processed_at)
+        self.assertTrue(Listing.objects.get().needs_matching)
+
+        # the queue is empty, but the next call still matches the listing
+        self.assertEqual(services.process_inbound_queue(), 0)
+        self.assertFalse(Listing.objects.get().needs_matching)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class NotificationTests(TestCase):
+    def setUp(self):
+        matching.invalidate_index()
+        self.addCleanup(matching.invalidate_index)
+        for name in ("ok", "failing"):
+            user = User.objects.create(username=name, email=f"{name}@example.com")
+            for frequency in (AlertFrequency.INSTANT, AlertFrequency.DAILY):
+                SavedSearch.objects.create(user=user, name=name, portal=Portal.RIGHTMOVE, alert_frequency=frequency)
+        self.listing = Listing.objects.create(portal=Portal.RIGHTMOVE, canonical_url="https://www.rightmove.co.uk/properties/1")
+
+    def send_messages(self, backend, messages):
+        if messages[0].to == ["failing@example.com"]:
+            return 0
+        return self.real_send(backend, messages)
+
+    def notified(self, frequency):
+        matches = SearchMatch.objects.filter(saved_search__alert_frequency=frequency, notified_at__isnull=False)
+        return sorted(matches.values_list("saved_search__user__username", flat=True))
+
+    def test_only_sent_matches_are_marked(self):
+        self.real_send = EmailBackend.send_messages
+        with mock.patch.object(EmailBackend, "send_messages", lambda b, m: self.send_messages(b, m)):
+            with self.assertLogs("property.services", "WARNING"):
+                services.notify_instant_matches([self.listing])
+                self.assertEqual(services.send_daily_digests(), (1, 1))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(self.notified(AlertFrequency.INSTANT), ["ok"])
+        self.assertEqual(self.notified(AlertFrequency.DAILY), ["ok"])
+
+
+class SearchEditTests(TestCase):
+    def setUp(self):
+        matching.invalidate_index()
+        self.addCleanup(matching.invalidate_index)
+        self.user = User.objects.create_user("u", email="u@example.com", password="pw")
+        self.client.force_login(self.user)
+        self.search = SavedSearch.objects.create(
+            user=self.user, name="daily", portal=Portal.RIGHTMOVE, alert_frequency=AlertFrequency.DAILY
+        )
+        for n, price in enumerate([200_000, 500_000]):
+            listing = Listing.objects.create(
+                portal=Portal.RIGHTMOVE, canonical_url=f"https://www.rightmove.co.uk/properties/{n}", price=price
+            )
+            SearchMatch.objects.create(saved_search=self.search, listing=listing)
+
+    def test_narrowed_search_drops_pending_matches(self):
+        response = self.client.post(
+            reverse("property:search_edit", args=[self.search.pk]),
+            {"name": "daily", "portal": Portal.RIGHTMOVE, "alert_frequency": AlertFrequency.DAILY, "price_max": 300_000},
+        )
+        self.assertEqual(response.status_code, 302)
+        pending = SearchMatch.objects.filter(saved_search=self.search, notified_at__isnull=True)
+        self.assertEqual(list(pending.values_list("listing__price", flat=True)), [200_000])
+        self.assertEqual(services.send_daily_digests(), (1, 1))
+
+
+class EstimatedCountTests(TestCase):
+    def test_unfiltered_sqlite_list_is_estimated_from_max_id(self):
+        from config import admin as config_admin
+
+        Listing.objects.bulk_create(random_listing(random.Random(n), n) for n in range(8))
+        Listing.objects.order_by("id").first().delete()
+        max_id = Listing.objects.order_by("-id").values_list("id", flat=True)[0]
+        with mock.patch.object(config_admin, "COUNT_LIMIT", 5):
+            unfiltered = config_admin.EstimatedCountPaginator(Listing.objects.all(), 2)
+            filtered = config_admin.EstimatedCountPaginator(Listing.objects.filter(title__startswith="Flat"), 2)
+            self.assertEqual(unfiltered.count, max_id)
+            self.assertEqual(filtered.count, 5)
@@ -1,16 +1,23 @@
-import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db.models import Q
 from django.http import JsonResponse, HttpResponseForbidden
 from django.shortcuts import get_object_or_404, redirect, render
-from django.utils import timezone
+from django.template.loader import render_to_string
+from django.views.decorators.cache import cache_control
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+
+from config.cache import data_version, etag, tiered
 
 from .forms import SavedSearchForm
-from .models import Listing, Portal, SavedSearch, ShortlistItem
-from .services import notify_instant_matches
+from .models import Listing, SavedSearch, ShortlistItem
+from .services import backfill_search_matches, prune_search_matches, queue_inbound_email
 
-RIGHTMOVE_RE = re.compile(r"https?://www\.rightmove\.co\.uk/properties/\d+")
-ZOOPLA_RE = re.compile(r"https?://www\.zoopla\.co\.uk/for-sale/details/\d+")
+INBOX_PAGE_SIZE = 200
 
 @login_required
 def dashboard(request):
@@ -26,7 +33,8 @@ def search_create(request):
     if request.method == "POST":
         form = SavedSearchForm(request.POST)
         if form.is_valid():
-            form.save(user=request.user)
+            search = form.save(user=request.user)
+            backfill_search_matches(search)
             return redirect("property:search_list")
     else:
         form = SavedSearchForm()
@@ -38,7 +46,9 @@ def search_edit(request, pk):
     if request.method == "POST":
         form = SavedSearchForm(request.POST, instance=s)
         if form.is_valid():
-            form.save(user=request.user)
+            search = form.save(user=request.user)
+            prune_search_matches(search)
+            backfill_search_matches(search)
             return redirect("property:search_list")
     else:
         # For v1: just edit the model fields; criteria fields will appear blank unless you map them back.
@@ -53,9 +63,41 @@ def search_delete(request, pk):
         return redirect("property:search_list")
     return render(request, "property/search_delete.html", {"search": s})
 
+def _parse_cursor(value: str):
+    """Cursor is "<first_seen isoformat>_<id>" of the last row on the previous page."""
+    try:
+        ts, _, pk = value.rpartition("_")
+        return datetime.fromisoformat(ts), int(pk)
+    except ValueError:
+        return None
+
+
+def _inbox_versions(request):
+    return data_version("listings"), data_version(f"shortlist:{request.user.pk}")
+
+
+def _inbox_etag(request):
+    return etag(request.user.pk, request.GET.urlencode(), *_inbox_versions(request))
+
+
+def _inbox_last_modified(request):
+    return datetime.fromtimestamp(max(_inbox_versions(request)) / 1e9, tz=dt_timezone.utc)
+
+
 @login_required
+@vary_on_cookie
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_inbox_etag, last_modified_func=_inbox_last_modified)
 def listings_inbox(request):
-    qs = Listing.objects.all().order_by("-first_seen")
+    results_html = tiered("fragments").get_or_set(
+        ("inbox", request.user.pk, request.GET.urlencode(), *_inbox_versions(request)),
+        lambda: _render_inbox_results(request),
+    )
+    return render(request, "property/listings_inbox.html", {"results_html": results_html})
+
+
+def _render_inbox_results(request) -> str:
+    qs = Listing.objects.filter(is_active=True).order_by("-first_seen", "-id")
 
     portal = request.GET.get("portal")
     if portal:
@@ -73,11 +115,40 @@ def listings_inbox(request):
     if price_max:
         qs = qs.filter(price__lte=int(price_max))
 
+    # Keyset pagination: seek past the last row shown instead of OFFSET,
+    # so deep pages cost the same as the first one.
+    cursor = _parse_cursor(request.GET.get("cursor", ""))
+    if cursor:
+        first_seen, pk = cursor
+        qs = qs.filter(Q(first_seen__lt=first_seen) | Q(first_seen=first_seen, id__lt=pk))
+
+    listings = list(qs[:INBOX_PAGE_SIZE + 1])
+    params = request.GET.copy()
+    params.pop("cursor", None)
+    first_query = params.urlencode() if cursor else None
+    next_query = None
+    if len(listings) > INBOX_PAGE_SIZE:
+        listings = listings[:INBOX_PAGE_SIZE]
+        last = listings[-1]
+        params["cursor"] = f"{last.first_seen.isoformat()}_{last.pk}"
+        next_query = params.urlencode()
+
     shortlist_ids = set(
-        ShortlistItem.objects.filter(user=request.user).values_list("listing_id", flat=True)
+        ShortlistItem.objects.filter(
+            user=request.user, listing_id__in=[l.pk for l in listings]
+        ).values_list("listing_id", flat=True)
     )
 
-    return render(request, "property/listings_inbox.html", {"listings": qs[:200], "shortlist_ids": shortlist_ids})
+    return render_to_string(
+        "property/_inbox_results.html",
+        {
+            "listings": listings,
+            "shortlist_ids": shortlist_ids,
+            "first_query": first_query,
+            "next_query": next_query,
+        },
+        request=request,
+    )
 
 @login_required
 def shortlist(request):
@@ -99,36 +170,11 @@ def shortlist_remove(request, listing_id):
 def inbound_email_webhook(request):
     # simple shared-secret auth (works fine behind Mailgun/SendGrid inbound parse)
     secret = request.headers.get("X-Inbound-Secret")
-    expected = request.META.get("INBOUND_EMAIL_SECRET", "")
+    expected = settings.INBOUND_EMAIL_SECRET
     if not expected or secret != expected:
         return HttpResponseForbidden("Forbidden")
 
-    subject = request.POST.get("subject", "")
-    body_plain = request.POST.get("body-plain", "") or request.POST.get("text", "")
-    body_html = request.POST.get("body-html", "") or request.POST.get("html", "")
-    text = body_plain or body_html or ""
-
-    urls = set(RIGHTMOVE_RE.findall(text)) | set(ZOOPLA_RE.findall(text))
-    new_listings = []
-
-    for url in urls:
-        portal = Portal.RIGHTMOVE if "rightmove.co.uk" in url else Portal.ZOOPLA
-        listing, created = Listing.objects.get_or_create(
-            canonical_url=url,
-            defaults={
-                "portal": portal,
-                "first_seen": timezone.now(),
-                "last_seen": timezone.now(),
-                "raw_source": {"subject": subject},
-            },
-        )
-        if created:
-            new_listings.append(listing)
-        else:
-            listing.last_seen = timezone.now()
-            listing.save(update_fields=["last_seen"])
-
-    if new_listings:
-        notify_instant_matches(new_listings)
-
-    return JsonResponse({"ok": True, "found_urls": len(urls), "new": len(new_listings)})
+    # Only persist the payload here; the ingest worker does the parsing,
+    # upserts and matching (see process_inbound_emails).
+    item = queue_inbound_email(request.POST)
+    return JsonResponse({"ok": True, "queued": item.idempotency_key}, status=202)